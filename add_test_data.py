@@ -1,37 +1,54 @@
 from database.connection import SessionLocal
-from database.models import FamilyMember, FamilyEvent, EventType
+from database.models import EventType
+from services.families import ensure_default_family
+from services.family_repository import FamilyRepository
 from datetime import date
 
 
 def add_test_data():
     """Добавляем реальные данные семьи"""
+    # 👨‍👩‍👧 Семья по умолчанию (создается, если семей еще нет)
     db = SessionLocal()
+    try:
+        family = ensure_default_family(db)
+        if family is None:
+            print("❌ Ошибка: семья по умолчанию (DEFAULT_FAMILY_ID) не найдена.")
+            return
+        db.commit()
+        family_id = family.id
+    finally:
+        db.close()
+
+    # Записи через репозиторий: family_id, склонение имен, next_occurrence и счетчики /stats
+    repository = FamilyRepository(family_id=family_id)
 
     try:
         print("🔄 Добавляем реальные данные семьи...")
 
         # 👥 Члены семьи
         members = [
-            FamilyMember(name="Кирилл Краснов", birth_date=date(1990, 4, 11)),
-            FamilyMember(name="Екатерина Краснова", birth_date=date(1991, 6, 30)),
-            FamilyMember(name="Ксения Краснова", birth_date=date(2019, 5, 26)),
+            ("Кирилл Краснов", date(1990, 4, 11), "M"),
+            ("Екатерина Краснова", date(1991, 6, 30), "F"),
+            ("Ксения Краснова", date(2019, 5, 26), "F"),
         ]
+        for name, birth_date, gender in members:
+            if repository.find_member(name):
+                print(f"ℹ️ {name} уже есть в базе")
+                continue
+            repository.add_member(name, birth_date, None, gender)
 
         # 🎉 События
-        events = [
-            FamilyEvent(
-                title="Годовщина свадьбы Кирилла и Екатерины",
+        title = "Годовщина свадьбы Кирилла и Екатерины"
+        if repository.find_event(title):
+            print(f"ℹ️ Событие «{title}» уже есть в базе")
+        else:
+            repository.add_event(
+                title=title,
                 event_date=date(2017, 7, 27),
                 event_type=EventType.ANNIVERSARY,
                 description="Ура! Поздравляем с годовщиной свадьбы! 💖",
                 recurring=True
             )
-        ]
-
-        # 🗄️ Сохраняем в базу
-        db.add_all(members)
-        db.add_all(events)
-        db.commit()
 
         print("✅ Реальные данные добавлены!")
         print("👥 Члены семьи:")
@@ -42,10 +59,7 @@ def add_test_data():
 
     except Exception as e:
         print(f"❌ Ошибка: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
-    add_test_data()
\ No newline at end of file
+    add_test_data()
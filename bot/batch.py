@@ -0,0 +1,112 @@
+"""
+Пакетные админские команды: несколько записей одним сообщением.
+
+    /add_member
+    Иван Петров M 01.02.1960
+    Мария Петрова F 03.04.1962 05.06.2020
+
+Все строки разбираются и проверяются вместе; если хоть одна строка с
+ошибкой, ничего не записывается. Иначе все записи вставляются одним
+executemany в одной транзакции, а администратор получает один ответ.
+"""
+from datetime import datetime
+
+from database.models import EventType
+
+DATE_FORMAT = '%d.%m.%Y'
+# Типы проверяются по самому ENUM в базе, чтобы ошибка всплыла до транзакции, а не в ней
+ALLOWED_EVENT_TYPES = [event_type.name for event_type in EventType]
+
+
+def batch_lines(text: str) -> list:
+    """
+    Строки записей из текста команды (первое слово — сама команда).
+    Возвращает [] для обычной однострочной команды.
+    """
+    if not text or "\n" not in text.strip():
+        return []
+    first, _, rest = text.strip().partition("\n")
+    first_args = first.split(maxsplit=1)[1:]  # Аргументы на строке с командой тоже считаются записью
+    lines = first_args + rest.split("\n")
+    return [line.strip() for line in lines if line.strip()]
+
+
+def parse_date(value: str):
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError(f"дата «{value}» не в формате ДД.ММ.ГГГГ")
+
+
+def parse_member_line(line: str) -> dict:
+    """Имя Фамилия M/F ДД.ММ.ГГГГ [ДД.ММ.ГГГГ] → параметры FamilyMember."""
+    args = line.split()
+    if len(args) < 4 or len(args) > 5:
+        raise ValueError("ожидается: Имя Фамилия M/F ДД.ММ.ГГГГ [ДД.ММ.ГГГГ]")
+
+    gender = args[2].upper()
+    if gender not in ['M', 'F']:
+        raise ValueError("пол должен быть M или F")
+
+    birth_date = parse_date(args[3])
+    death_date = parse_date(args[4]) if len(args) == 5 else None
+    if death_date and death_date < birth_date:
+        raise ValueError("дата смерти раньше даты рождения")
+
+    return {"name": f"{args[0]} {args[1]}", "gender": gender,
+            "birth_date": birth_date, "death_date": death_date}
+
+
+def parse_event_line(line: str) -> dict:
+    """"Название" ТИП ДД.ММ.ГГГГ [Описание] → параметры FamilyEvent."""
+    args = line.split()
+    date_index = next(
+        (i for i, arg in enumerate(args) if len(arg) == 10 and arg.replace('.', '').isdigit() and arg.count('.') == 2),
+        None
+    )
+    if date_index is None:
+        raise ValueError("не найдена дата в формате ДД.ММ.ГГГГ")
+    if date_index < 2:
+        raise ValueError("перед датой нужны Название и ТИП")
+
+    event_type = args[date_index - 1].upper()
+    if event_type not in ALLOWED_EVENT_TYPES:
+        raise ValueError(f"тип {event_type} не разрешен ({', '.join(ALLOWED_EVENT_TYPES)})")
+
+    title = " ".join(args[:date_index - 1]).strip().strip('"\'')
+    if not title:
+        raise ValueError("пустое название")
+
+    return {"title": title, "event_type": event_type, "event_date": parse_date(args[date_index]),
+            "description": " ".join(args[date_index + 1:])}
+
+
+def parse_batch(lines: list, parse_line, key: str, existing: set) -> tuple:
+    """
+    Разбирает все строки. Возвращает (записи, ошибки), где ошибки — [(номер строки, текст)].
+    Повторы ключа (имени или названия) внутри пакета и с уже существующими записями — тоже ошибка.
+    """
+    rows, errors, seen = [], [], set()
+    for number, line in enumerate(lines, start=1):
+        try:
+            row = parse_line(line)
+        except ValueError as e:
+            errors.append((number, str(e)))
+            continue
+
+        if row[key] in existing:
+            errors.append((number, f"«{row[key]}» уже есть в базе"))
+        elif row[key] in seen:
+            errors.append((number, f"«{row[key]}» повторяется в сообщении"))
+        else:
+            seen.add(row[key])
+            rows.append(row)
+    return rows, errors
+
+
+def format_errors(errors: list, total: int) -> str:
+    lines = [f"❌ **Ничего не добавлено**: ошибки в {len(errors)} из {total} строк.\n"]
+    lines.extend(f"• строка {number}: {error}" for number, error in errors[:30])
+    if len(errors) > 30:
+        lines.append(f"… и еще {len(errors) - 30}")
+    return "\n".join(lines)
@@ -0,0 +1,98 @@
+"""
+HTTP-сервер календарей семей (.ics).
+
+GET /calendar/<id семьи>/<токен>.ics — календарь семьи (services/ical.py).
+Токен — HMAC от id семьи (секрет CALENDAR_SECRET, по умолчанию токен
+бота), поэтому ссылку нельзя подобрать, а хранить токены в базе не нужно.
+
+Ответ несет сильный ETag; клиент с If-None-Match получает 304 без тела.
+Файл собирается только после изменения данных семьи, так что тысячи
+календарей, опрашивающих ссылку раз в 15 минут, почти ничего не стоят.
+
+Сервер работает в том же цикле событий, что и бот (и вебхук в run.py),
+на отдельном порту CALENDAR_PORT.
+"""
+import hashlib
+import hmac
+
+from tornado.httpserver import HTTPServer
+from tornado.web import Application, RequestHandler
+
+from config import Config
+from database.sessions import session_scope
+from services.ical import FamilyCalendar
+
+
+class CalendarFeeds:
+    """Календари семей (создаются при первом запросе) и счетчики для /perf."""
+
+    def __init__(self, families, secret: str = None):
+        self.families = families  # FamilyDirectory
+        self.secret = (secret or Config.CALENDAR_SECRET or Config.BOT_TOKEN or "").encode()
+        self.calendars = {}  # id семьи -> FamilyCalendar
+        self.requests = 0
+        self.not_modified = 0
+        self.server = None
+
+    def token(self, family_id: int) -> str:
+        return hmac.new(self.secret, f"family:{family_id}".encode(), hashlib.sha256).hexdigest()[:24]
+
+    def url(self, family_id: int) -> str:
+        base = Config.CALENDAR_PUBLIC_URL or f"http://localhost:{Config.CALENDAR_PORT}"
+        return f"{base}/calendar/{family_id}/{self.token(family_id)}.ics"
+
+    def calendar(self, family_id: int, token: str) -> FamilyCalendar | None:
+        if not hmac.compare_digest(token, self.token(family_id)):
+            return None
+        calendar = self.calendars.get(family_id)
+        if calendar is None:
+            context = self.families.get(family_id)
+            if context is None:
+                return None
+            calendar = FamilyCalendar(context.repository, context.family.name)
+            self.calendars[family_id] = calendar
+        return calendar
+
+    def start(self, port: int = None):
+        """Вызывается из работающего цикла (post_init)."""
+        port = port or Config.CALENDAR_PORT
+        app = Application([
+            (r"/calendar/(\d+)/([0-9a-f]+)\.ics", CalendarHandler, {"feeds": self}),
+        ], log_function=lambda handler: None)  # Опросы календарей не засоряют лог
+        self.server = HTTPServer(app)
+        self.server.listen(port)
+        print(f"✅ Календари семей: http://0.0.0.0:{port}/calendar/<id>/<токен>.ics")
+
+    def stop(self):
+        if self.server:
+            self.server.stop()
+
+    def report(self) -> str:
+        generations = sum(calendar.generations for calendar in self.calendars.values())
+        return (f"запросов={self.requests}, 304={self.not_modified}, календарей={len(self.calendars)}, "
+                f"сборок файла={generations}")
+
+
+class CalendarHandler(RequestHandler):
+    def initialize(self, feeds: CalendarFeeds):
+        self.feeds = feeds
+
+    def get(self, family_id: str, token: str):
+        self.feeds.requests += 1
+        calendar = self.feeds.calendar(int(family_id), token)
+        if calendar is None:
+            self.set_status(404)
+            return
+
+        with session_scope("http:calendar"):
+            body, etag = calendar.render()
+        self.set_header("ETag", etag)
+        self.set_header("Cache-Control", "no-cache")  # Можно хранить, но перед показом — сверить ETag
+        if self.check_etag_header():
+            self.feeds.not_modified += 1
+            self.set_status(304)
+            return
+
+        self.set_header("Content-Type", "text/calendar; charset=utf-8")
+        self.set_header("Content-Disposition", f'inline; filename="family-{family_id}.ics"')
+        self.write(body)
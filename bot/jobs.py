@@ -0,0 +1,241 @@
+"""
+Задачи планировщика.
+
+Задачи хранятся в базе (SQLAlchemyJobStore, таблица apscheduler_jobs), поэтому
+ссылаются на функции этого модуля по имени ("bot.jobs:daily_reminder"), а не
+на методы бота; бот при запуске регистрирует себя через bind().
+
+Задачи добавляются после запуска планировщика и только если их еще нет в
+базе (register_jobs): так сохраненное время следующего запуска не
+перезаписывается при каждом старте, и запуск, пропущенный за время
+перезапуска, выполняется (misfire_grace_time, coalesce).
+
+Ежедневная рассылка и дайджесты отмечаются в job_runs. Если бот
+перезапускался дольше SCHEDULER_MISFIRE_GRACE_SECONDS или цикл событий был
+занят в NOTIFICATION_TIME, при старте рассылка за сегодня (а по понедельникам
+и 1-го числа — дайджест) догоняется (catch_up_daily_reminder,
+catch_up_digests), а повторный запуск в тот же день пропускается. Опоздание каждого запуска относительно расписания
+измеряется FireLagMonitor и видно в логах и в /perf.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from config import Config
+from database.connection import SessionLocal
+from database.models import JobRun
+
+DAILY_REMINDER = "daily_reminder"
+WEEKLY_DIGEST = "weekly_digest"
+MONTHLY_DIGEST = "monthly_digest"
+VALIDATE_FILE_IDS = "validate_file_ids"
+SAVE_WARM_SNAPSHOT = "save_warm_snapshot"
+
+_bot = None
+_daily_lock = asyncio.Lock()
+_digest_lock = asyncio.Lock()
+
+
+def bind(bot):
+    """Регистрирует экземпляр FamilyBot, через который выполняются задачи."""
+    global _bot
+    _bot = bot
+
+
+# ----------------------------------------------------
+# --- ОТМЕТКИ О ЗАПУСКАХ ---
+# ----------------------------------------------------
+
+def last_run_on(name: str) -> date | None:
+    db = SessionLocal()
+    try:
+        run = db.get(JobRun, name)
+        return run.last_run_on if run else None
+    finally:
+        db.close()
+
+
+def mark_run(name: str, day: date):
+    db = SessionLocal()
+    try:
+        run = db.get(JobRun, name) or JobRun(name=name)
+        run.last_run_on = day
+        run.last_run_at = datetime.utcnow()
+        db.add(run)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ----------------------------------------------------
+# --- ЗАДАЧИ ---
+# ----------------------------------------------------
+
+async def run_daily_reminder(reason: str) -> bool:
+    """Отправляет рассылку за сегодня, если она еще не отправлена. True — отправлена сейчас."""
+    async with _daily_lock:
+        today = date.today()
+        if last_run_on(DAILY_REMINDER) == today:
+            print(f"ℹ️ Рассылка за {today.strftime('%d.%m.%Y')} уже отправлена ({reason}: пропускаем).")
+            return False
+        print(f"⏰ Ежедневная рассылка ({reason}).")
+        await _bot.send_daily_reminder()
+        mark_run(DAILY_REMINDER, today)
+        return True
+
+
+async def daily_reminder():
+    await run_daily_reminder("по расписанию")
+
+
+async def run_digest(period: str) -> bool:
+    """Рассылка дайджеста периода (не больше одной за день — при повторном запуске пропускается)."""
+    name = f"digest_{period}"
+    async with _digest_lock:
+        today = date.today()
+        if last_run_on(name) == today:
+            print(f"ℹ️ Дайджест ({period}) за {today.strftime('%d.%m.%Y')} уже отправлен: пропускаем.")
+            return False
+        await _bot.send_digests(period)
+        mark_run(name, today)
+        return True
+
+
+async def weekly_digest():
+    await run_digest("weekly")
+
+
+async def monthly_digest():
+    await run_digest("monthly")
+
+
+async def validate_file_ids():
+    await _bot.validate_file_ids()
+
+
+async def save_warm_snapshot():
+    await _bot.save_warm_snapshot()
+
+
+def notification_time() -> tuple:
+    hour, minute = map(int, Config.NOTIFICATION_TIME.split(':'))
+    return hour, minute
+
+
+def register_jobs(scheduler, warm_snapshot: bool = False):
+    """
+    Добавляет задачи в уже запущенный планировщик. Существующая в базе задача
+    не заменяется (иначе ее next_run_time пересчитывается от текущего момента
+    и пропущенный запуск теряется) — только расписание обновляется, если
+    изменились NOTIFICATION_TIME или FILE_ID_VALIDATION_TIME.
+    """
+    hour, minute = notification_time()
+    validation_hour, validation_minute = map(int, Config.FILE_ID_VALIDATION_TIME.split(':'))
+    specs = [
+        (DAILY_REMINDER, "bot.jobs:daily_reminder", CronTrigger(hour=hour, minute=minute, timezone="UTC")),
+        # 🗓️ Дайджесты: по понедельникам и 1-го числа, в то же время, что и ежедневная рассылка
+        (WEEKLY_DIGEST, "bot.jobs:weekly_digest",
+         CronTrigger(day_of_week="mon", hour=hour, minute=minute, timezone="UTC")),
+        (MONTHLY_DIGEST, "bot.jobs:monthly_digest", CronTrigger(day=1, hour=hour, minute=minute, timezone="UTC")),
+        # 🌙 Ночная проверка всех file_id (вне горячего пути рассылки)
+        (VALIDATE_FILE_IDS, "bot.jobs:validate_file_ids",
+         CronTrigger(hour=validation_hour, minute=validation_minute, timezone="UTC")),
+    ]
+    if warm_snapshot:
+        # 🔥 Периодический снимок горячего состояния (на случай аварийной остановки)
+        specs.append((SAVE_WARM_SNAPSHOT, "bot.jobs:save_warm_snapshot",
+                      IntervalTrigger(minutes=Config.WARM_SNAPSHOT_INTERVAL_MINUTES, timezone="UTC")))
+    elif scheduler.get_job(SAVE_WARM_SNAPSHOT):
+        scheduler.remove_job(SAVE_WARM_SNAPSHOT)
+
+    for job_id, func, trigger in specs:
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(func, trigger, id=job_id)
+        elif str(job.trigger) != str(trigger):
+            print(f"🔁 Расписание задачи {job_id} изменено: {job.trigger} -> {trigger}")
+            scheduler.reschedule_job(job_id, trigger=trigger)
+
+
+def _scheduled_today(now: datetime) -> datetime | None:
+    """Сегодняшнее время рассылки, если оно прошло не более NOTIFICATION_CATCHUP_HOURS назад."""
+    hour, minute = notification_time()
+    scheduled = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if scheduled <= now < scheduled + timedelta(hours=Config.NOTIFICATION_CATCHUP_HOURS):
+        return scheduled
+    return None
+
+
+async def catch_up_daily_reminder(now: datetime = None) -> bool:
+    """
+    При старте: если сегодняшнее время рассылки уже прошло (не более
+    NOTIFICATION_CATCHUP_HOURS назад), а рассылки не было — отправляет ее.
+    """
+    if _scheduled_today(now or datetime.now(timezone.utc)) is None:
+        return False
+    return await run_daily_reminder(f"догоняем пропущенную в {Config.NOTIFICATION_TIME} UTC")
+
+
+async def catch_up_digests(now: datetime = None) -> list:
+    """
+    При старте: то же для дайджестов — еженедельный по понедельникам,
+    ежемесячный 1-го числа. Возвращает периоды, отправленные сейчас.
+    """
+    now = now or datetime.now(timezone.utc)
+    if _scheduled_today(now) is None:
+        return []
+    due = [period for period, is_due in (("weekly", now.weekday() == 0), ("monthly", now.day == 1)) if is_due]
+    sent = []
+    for period in due:
+        print(f"⏰ Дайджест ({period}): догоняем пропущенный в {Config.NOTIFICATION_TIME} UTC.")
+        if await run_digest(period):
+            sent.append(period)
+    return sent
+
+
+# ----------------------------------------------------
+# --- ОПОЗДАНИЕ ЗАПУСКОВ ---
+# ----------------------------------------------------
+
+class FireLagMonitor:
+    """Опоздание запуска задач относительно расписания (насколько занят цикл событий)."""
+
+    def __init__(self, warn_seconds: float = None):
+        self.warn_seconds = Config.JOB_LAG_WARN_SECONDS if warn_seconds is None else warn_seconds
+        self.jobs = {}  # id задачи -> {"runs", "last", "max", "total", "missed"}
+
+    def install(self, scheduler):
+        scheduler.add_listener(self.on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+
+    def _job_stats(self, job_id: str) -> dict:
+        return self.jobs.setdefault(job_id, {"runs": 0, "last": 0.0, "max": 0.0, "total": 0.0, "missed": 0})
+
+    def on_event(self, event):
+        stats = self._job_stats(event.job_id)
+        if event.code == EVENT_JOB_MISSED:
+            stats["missed"] += 1
+            print(f"⚠️ Задача {event.job_id} пропущена: опоздание больше "
+                  f"{Config.SCHEDULER_MISFIRE_GRACE_SECONDS}с (запланирована на {event.scheduled_run_time}).")
+            return
+
+        # При coalesce несколько пропущенных запусков сливаются в один — считаем от последнего
+        lag = (datetime.now(timezone.utc) - event.scheduled_run_times[-1]).total_seconds()
+        stats["runs"] += 1
+        stats["last"] = lag
+        stats["max"] = max(stats["max"], lag)
+        stats["total"] += lag
+        if lag >= self.warn_seconds:
+            print(f"⚠️ Задача {event.job_id} запущена с опозданием {lag:.2f}с.")
+
+    def report(self) -> list:
+        lines = []
+        for job_id, stats in sorted(self.jobs.items()):
+            average = stats["total"] / stats["runs"] if stats["runs"] else 0.0
+            lines.append(
+                f"{job_id}: запусков={stats['runs']}, опоздание посл.={stats['last'] * 1000:.0f}ms, "
+                f"сред.={average * 1000:.0f}ms, макс.={stats['max'] * 1000:.0f}ms, пропущено={stats['missed']}"
+            )
+        return lines
@@ -2,19 +2,41 @@ import sys
 import os
 from datetime import date, datetime
 import secrets
-import asyncio
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from telegram.constants import ParseMode
-from telegram.request import HTTPXRequest
 
 # 🎯 Добавляем корневую папку проекта в пути Python
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # --- ИМПОРТЫ МОДЕЛЕЙ И БАЗЫ ДАННЫХ (КРИТИЧЕСКИ ВАЖНО) ---
-from database.connection import SessionLocal, engine
+from database.connection import SessionLocal, engine, replica_engine
+from database.routing import format_routing
+from database.profiling import profiler
+from database.sessions import session_scope, leak_detector
+from database.schema import ensure_schema
+from services.tracing import tracer, instrument_engine, TRACING_ENABLED
+from bot.telegram_request import build_requests
 from database.models import Base, FamilyMember, FamilyEvent
-from services.notification_service import NotificationService
+from services.notification_service import NotificationService, pluralize_days
+from services.notification_engine import NotificationEngine, TelegramSink
+from services.file_id_registry import FileIdRegistry
+from services.families import FamilyDirectory, FamilyNotConfigured, ensure_default_family
+from services.family_repository import FamilyRepository
+from services.family_graph import GENERATION_NAMES
+from services.family_stats import MONTH_NAMES
+from services.warm_snapshot import WarmSnapshot
+from services.advance_reminders import AdvanceReminders
+from services.digests import DigestService, PERIOD_NAMES, WEEKLY, MONTHLY
+from services.loop_monitor import LoopMonitor
+from services.declension import name_forms_many, shutdown_executor
+from services.occurrences import ONCE, normalize_rule, describe_rule
+from bot import jobs
+from bot.calendar_server import CalendarFeeds
+from bot.throttling import CommandThrottle
+from bot.batch import batch_lines, parse_batch, parse_member_line, parse_event_line, format_errors
+from database.models import RelationType
 from config import Config
 
 
@@ -45,21 +67,30 @@ def pluralize_years(age):
 # --- 🚀 ИНИЦИАЛИЗАЦИЯ БАЗЫ ДАННЫХ ---
 
 
-# 1. ГАРАНТИРУЕМ СОЗДАНИЕ ТАБЛИЦ.
-Base.metadata.create_all(bind=engine)
+# 1. ПРОВЕРЯЕМ СХЕМУ: миграции применяются заранее (alembic upgrade head), см. database/schema.py
+ensure_schema(engine, Base.metadata)
+
+# 🔭 Спаны на SQL-запросы (только при включенной трассировке)
+if TRACING_ENABLED:
+    instrument_engine(engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine)
 
 
 def seed_family():
     """Добавляет начальные данные, только если база ПУСТА."""
     db = SessionLocal()
     try:
-        if db.query(FamilyMember).count() == 0:
+        family = ensure_default_family(db)
+        db.commit()
+        if family is not None and db.query(FamilyMember).count() == 0:
             initial_members = [
                 ("Кирилл Краснов", date(1990, 4, 11)),
             ]
+            # Через репозиторий: счетчики /stats (family_stats) и data_version обновляются вместе с записью
+            repository = FamilyRepository(family_id=family.id)
             for name, bday in initial_members:
-                db.add(FamilyMember(name=name, birth_date=bday, gender='M'))
-            db.commit()
+                repository.add_member(name, bday, None, 'M')
             print("✅ Семья добавлена в базу (инициализация).")
         else:
             print("ℹ️ Семья уже существует")
@@ -76,30 +107,140 @@ seed_family()
 
 class FamilyBot:
     def __init__(self):
-        # ❌ УДАЛЕНО: Исправления таймаута Bad Gateway
-        self.request_config = HTTPXRequest(read_timeout=35.0, pool_timeout=30)
+        # 🔌 Отдельные пулы: long polling (getUpdates) не занимает соединения рассылки.
+        # Размеры пулов, keep-alive, HTTP/2 и таймауты по методам — TELEGRAM_* в config.py
+        self.api_request, self.updates_request = build_requests()
 
-        # 2. Устанавливаем Polling timeout на 30 секунд.
-        # Это предотвратит превышение тайм-аутов прокси-серверов.
-        self.application = ApplicationBuilder() \
+        builder = ApplicationBuilder() \
             .token(Config.BOT_TOKEN) \
-            .request(self.request_config) \
-            .build()
+            .request(self.api_request) \
+            .get_updates_request(self.updates_request)
+        if Config.TELEGRAM_API_URL:
+            # Локальный Bot API (или фейковый сервер для нагрузочных тестов)
+            builder = builder \
+                .base_url(f"{Config.TELEGRAM_API_URL}/bot") \
+                .base_file_url(f"{Config.TELEGRAM_API_URL}/file/bot")
+        self.application = builder.build()
+
+        # 🖼️ Реестр file_id: испорченные фото заменяются текстом без лишних запросов
+        self.file_registry = FileIdRegistry()
+
+        # 👨‍👩‍👧 Семьи: у каждой свой репозиторий с кэшем чтений и свои вехи (10 000 дней, юбилеи).
+        # Хендлер работает с семьей своего чата — см. self.repository / self.milestones
+        self.families = FamilyDirectory()
+        # Сервис нужен только для форматирования: события берутся из репозитория
+        self.notification_service = NotificationService(db=None)
+        # ⏰ Напоминания заранее (/remind): все подписки в одном колесе таймеров, не в планировщике
+        self.advance_reminders = AdvanceReminders(self.families, self.notification_service, self.application.bot)
+        # 🗓️ Дайджесты на неделю / месяц: один раз на семью, затем во все ее подписанные чаты
+        self.digests = DigestService(self.families, self.notification_service, self.application.bot)
+        # 📅 Календари семей (.ics) с ETag: пересобираются только после изменений данных
+        self.calendar_feeds = CalendarFeeds(self.families)
+        # 🚦 Лимит команд на пользователя и чат; одинаковые команды в чате выполняются один раз
+        self.throttle = CommandThrottle(Config.THROTTLE_USER_LIMIT, Config.THROTTLE_CHAT_LIMIT,
+                                        Config.THROTTLE_WINDOW_SECONDS)
+        # ⏱️ Опоздание задач планировщика относительно расписания
+        self.fire_lag = jobs.FireLagMonitor()
+        # 🩺 Задержка цикла событий и стек того, что его блокирует
+        self.loop_monitor = LoopMonitor(Config.LOOP_MONITOR_INTERVAL, Config.LOOP_LAG_WARN_MS, Config.LOOP_DEBUG)
+        if Config.LOOP_DEBUG:
+            self.loop_monitor.install_sql_detector(engine)
+            if replica_engine is not None:
+                self.loop_monitor.install_sql_detector(replica_engine)
+        # 🔥 Снимок горячего состояния: при перезапуске кэши заполняются из файла, а не из базы
+        self.warm_snapshot = None
+        if Config.WARM_SNAPSHOT_PATH:
+            self.warm_snapshot = WarmSnapshot(Config.WARM_SNAPSHOT_PATH, self.families, self.notification_service)
+            self.warm_snapshot.restore()
 
         self.setup_handlers()
 
+    @property
+    def repository(self):
+        """Репозиторий семьи текущего обновления (или задачи)."""
+        return self.families.current().repository
+
+    @property
+    def milestones(self):
+        return self.families.current().milestones
+
     # 🎯 ФУНКЦИЯ: Проверяет права администратора
     def is_admin_chat(self, chat_id):
         """Проверяет, совпадает ли chat_id с ADMIN_CHAT_ID из Config."""
         return str(chat_id) == str(Config.ADMIN_CHAT_ID)
 
+    def instrument(self, name, callback, throttle=False, coalesce=False):
+        """
+        Оборачивает хендлер: спан на все обновление (services/tracing.py),
+        а все SQL-запросы внутри привязываются к его имени (database/profiling.py).
+        Хендлер видит только семью своего чата (services/families.py), а все
+        сессии, которые он не закрыл, закрываются по окончании обновления
+        (database/sessions.py).
+
+        С throttle=True перед хендлером — лимит частоты (bot/throttling.py):
+        лишняя команда получает готовый короткий ответ. Лимит стоит только на
+        публичных чтениях и рассылках; записи администратора (/add_member,
+        фото-ответы и т.п.) не ограничиваются. С coalesce=True одинаковые команды
+        (имя + аргументы), пришедшие в чат, пока первая еще выполняется,
+        ждут ее результата вместо повторного выполнения.
+        """
+        async def wrapper(update, context):
+            user_id = update.effective_user.id if update.effective_user else None
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            if throttle and not self.throttle.allow(user_id, chat_id):
+                reply = self.throttle.throttled_reply(user_id, chat_id)
+                if reply and update.effective_message:
+                    await update.effective_message.reply_text(reply)
+                return None
+            if coalesce:
+                key = (name, chat_id, tuple(context.args or ()))
+                return await self.throttle.coalesce(key, lambda: handle(update, context))
+            return await handle(update, context)
+
+        async def handle(update, context):
+            attributes = {"telegram.update_id": update.update_id, "telegram.handler": name}
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            family = self.families.for_chat(chat_id)
+            if update.effective_chat:
+                attributes["telegram.chat_id"] = chat_id
+            if family:
+                attributes["family.id"] = family.family.id
+            if update.effective_message and update.effective_message.date:
+                # Сколько обновление ждало до начала обработки
+                received_at = update.effective_message.date.timestamp()
+                attributes["telegram.update_age_ms"] = round((datetime.now().timestamp() - received_at) * 1000)
+
+            with tracer.start_as_current_span("telegram.update", attributes=attributes):
+                with tracer.start_as_current_span(f"handler.{name}"):
+                    with profiler.scope(f"update:{name}"), session_scope(f"update:{name}"), \
+                            self.families.use(family):
+                        try:
+                            return await callback(update, context)
+                        except FamilyNotConfigured as e:
+                            # Семью по умолчанию удалили, пока бот работал: отвечаем, а не падаем
+                            print(f"❌ {e}")
+                            if update.effective_message:
+                                await update.effective_message.reply_text(
+                                    "⚠️ Семья для этого чата не настроена. Обратитесь к администратору.")
+                            return None
+
+        return wrapper
+
     def setup_handlers(self):
         # ----------------------------------------------------
         # 1. ОБЩИЕ КОМАНДЫ (Работают везде)
         # ----------------------------------------------------
-        self.application.add_handler(CommandHandler("start", self.start))
-        self.application.add_handler(CommandHandler("list", self.list_members))
-        self.application.add_handler(CommandHandler("today", self.today))
+        self.application.add_handler(CommandHandler("start", self.instrument("start", self.start)))
+        # Тяжелые команды только читают данные: идут параллельно (block=False), одинаковые — склеиваются
+        for command, callback in (("list", self.list_members), ("today", self.today),
+                                  ("tree", self.tree), ("relatives", self.relatives)):
+            self.application.add_handler(CommandHandler(
+                command, self.instrument(command, callback, throttle=True, coalesce=True), block=False
+            ))
+        self.application.add_handler(CommandHandler("remind", self.instrument("remind", self.remind)))
+        self.application.add_handler(CommandHandler("calendar", self.instrument("calendar", self.calendar, throttle=True)))
+        self.application.add_handler(CommandHandler("stats", self.instrument("stats", self.family_stats, throttle=True)))
+        self.application.add_handler(CommandHandler("digest", self.instrument("digest", self.digest)))
 
         # ----------------------------------------------------
         # 2. ТЕХНИЧЕСКИЕ КОМАНДЫ (ТОЛЬКО для ADMIN_CHAT_ID)
@@ -111,31 +252,33 @@ class FamilyBot:
         admin_filter = filters.Chat(chat_id=admin_chat_id)
 
         # 2. Применяем фильтр ко всем командам управления:
-        self.application.add_handler(
-            CommandHandler("add_member", self.add_member, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("remove_member", self.remove_member, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("add_event", self.add_event, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("set_photo", self.set_photo_command, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("set_event_photo", self.set_event_photo_command, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("file_id", self.file_id_command, filters=admin_filter)
-        )
-        self.application.add_handler(
-            CommandHandler("test_notify", self.test_notify, filters=admin_filter)
-        )
+        admin_commands = [
+            ("add_member", self.add_member),
+            ("remove_member", self.remove_member),
+            ("set_declension", self.set_declension),
+            ("add_event", self.add_event),
+            ("set_event_rule", self.set_event_rule),
+            ("add_relation", self.add_relation),
+            ("set_photo", self.set_photo_command),
+            ("set_event_photo", self.set_event_photo_command),
+            ("file_id", self.file_id_command),
+            ("perf", self.perf_command),
+            ("families", self.families_command),
+            ("new_family", self.new_family),
+            ("use_family", self.use_family),
+        ]
+        for command, callback in admin_commands:
+            self.application.add_handler(
+                CommandHandler(command, self.instrument(command, callback), filters=admin_filter)
+            )
+        self.application.add_handler(CommandHandler(
+            "test_notify", self.instrument("test_notify", self.test_notify, throttle=True, coalesce=True),
+            filters=admin_filter, block=False
+        ))
 
         # Блокируем обработку фото-ответов:
         self.application.add_handler(MessageHandler(
-            filters.PHOTO & filters.REPLY & admin_filter, self.handle_photo_reply
+            filters.PHOTO & filters.REPLY & admin_filter, self.instrument("photo_reply", self.handle_photo_reply)
         ))
 
     async def set_commands(self, application):
@@ -144,6 +287,12 @@ class FamilyBot:
             ("start", "👋 Приветствие и цели бота"),
             ("today", "📅 События на сегодня"),
             ("list", "👥 Показать всех членов семьи"),
+            ("tree", "🌳 Семейное дерево: /tree Имя"),
+            ("relatives", "🧬 Родственники: /relatives Имя"),
+            ("remind", "⏰ Напоминать заранее: /remind 3"),
+            ("calendar", "📅 Даты семьи в календаре телефона"),
+            ("stats", "📊 Статистика семьи"),
+            ("digest", "🗓️ Дайджест дат на неделю или месяц"),
         ]
         await self.application.bot.set_my_commands(commands)
         print("✅ Меню команд Telegram успешно установлено.")
@@ -245,7 +394,7 @@ class FamilyBot:
         if not original_message: return
 
         photo_file_id = update.message.photo[-1].file_id
-        db = SessionLocal()
+        photo_unique_id = update.message.photo[-1].file_unique_id
 
         try:
             if original_message.startswith('/set_photo'):
@@ -256,11 +405,11 @@ class FamilyBot:
                                                            parse_mode=ParseMode.MARKDOWN)
 
                 name_to_find = " ".join(args).strip()
-                member = db.query(FamilyMember).filter(FamilyMember.name == name_to_find).first()
+                member = self.repository.set_member_photo(name_to_find, photo_file_id)
 
                 if member:
-                    member.photo_file_id = photo_file_id
-                    db.commit()
+                    # Фото только что получено от Telegram — значит, file_id рабочий
+                    self.file_registry.record_success(photo_file_id, photo_unique_id)
                     await update.message.reply_text(
                         f"📸 Фотография для **{member.name}** успешно сохранена и привязана!",
                         parse_mode=ParseMode.MARKDOWN)
@@ -277,16 +426,12 @@ class FamilyBot:
 
                 title_to_find = " ".join(args).strip().strip('"\'')  # Учитываем кавычки
 
-                event = db.query(FamilyEvent).filter(FamilyEvent.title == title_to_find).first()
-
-                if event:
-                    # Добавляем ID в массив photo_ids, если его нет
-                    if event.photo_ids is None:
-                        event.photo_ids = []
+                result = self.repository.add_event_photo(title_to_find, photo_file_id)
 
-                    if photo_file_id not in event.photo_ids:
-                        event.photo_ids.append(photo_file_id)
-                        db.commit()
+                if result:
+                    event, added = result
+                    if added:
+                        self.file_registry.record_success(photo_file_id, photo_unique_id)
                         await update.message.reply_text(
                             f"📸 Фотография успешно добавлена к событию **\"{event.title}\"**!",
                             parse_mode=ParseMode.MARKDOWN)
@@ -302,10 +447,9 @@ class FamilyBot:
                 return
 
         except Exception as e:
-            db.rollback()
             await update.message.reply_text(f"❌ Произошла ошибка при сохранении фото: {e}")
         finally:
-            db.close()
+            self.file_registry.flush()
 
     async def remove_member(self, update, context):
         """Удаляет члена семьи из базы данных по имени и фамилии."""
@@ -315,7 +459,6 @@ class FamilyBot:
                 parse_mode=ParseMode.MARKDOWN)
 
         args = context.args
-        db = SessionLocal()
 
         if len(args) < 2:
             return await update.message.reply_text(
@@ -325,33 +468,69 @@ class FamilyBot:
         name_to_remove = " ".join(args).strip()
 
         try:
-            member = db.query(FamilyMember).filter(FamilyMember.name == name_to_remove).first()
+            member = self.repository.remove_member(name_to_remove)
             if member:
-                db.delete(member)
-                db.commit()
                 await update.message.reply_text(f"🗑️ **{member.name}** успешно удален(а) из семьи.",
                                                 parse_mode=ParseMode.MARKDOWN)
             else:
                 await update.message.reply_text(f"❌ Член семьи с именем **{name_to_remove}** не найден в базе.",
                                                 parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
-            db.rollback()
             await update.message.reply_text(f"❌ Произошла ошибка при удалении: {e}")
-        finally:
-            db.close()
+
+    async def set_declension(self, update, context):
+        """
+        Исправляет склонение имени, если pymorphy3 ошибся.
+        Формат: /set_declension Имя Фамилия | Родительный | Дательный | Творительный
+        Вернуть автоматическое склонение: /set_declension Имя Фамилия | auto
+        """
+        text = " ".join(context.args)
+        parts = [part.strip() for part in text.split("|")]
+
+        if len(parts) == 2 and parts[1].lower() == "auto":
+            forms = None
+        elif len(parts) == 4 and all(parts):
+            forms = {"name_genitive": parts[1], "name_dative": parts[2], "name_instrumental": parts[3]}
+        else:
+            return await update.message.reply_text(
+                "❌ **Неверный формат команды!**\n\n"
+                "`/set_declension Имя Фамилия | Родительный | Дательный | Творительный`\n"
+                "Пример: `/set_declension Юлия Фоминых | Юлии Фоминых | Юлии Фоминых | Юлией Фоминых`\n\n"
+                "Вернуть автоматическое: `/set_declension Имя Фамилия | auto`",
+                parse_mode=ParseMode.MARKDOWN
+            )
+
+        try:
+            member = self.repository.set_member_declension(parts[0], forms)
+            if member is None:
+                return await update.message.reply_text(f"❌ Член семьи **{parts[0]}** не найден.",
+                                                       parse_mode=ParseMode.MARKDOWN)
+            await update.message.reply_text(
+                f"🔤 Склонение **{member.name}**:\n"
+                f"Родительный (кого?): {member.name_genitive}\n"
+                f"Дательный (кому?): {member.name_dative}\n"
+                f"Творительный (кем?): {member.name_instrumental}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        except Exception as e:
+            await update.message.reply_text(f"❌ Произошла ошибка при сохранении склонения: {e}")
 
     async def add_member(self, update, context):
         """
         Добавляет нового члена семьи в базу данных.
         Формат: /add_member Имя Фамилия M/F ДД.ММ.ГГГГ [ДД.ММ.ГГГГ]
+        Несколько человек сразу — по одному на строку (см. bot/batch.py).
         """
         if not self.is_admin_chat(update.message.chat_id):
             return await update.message.reply_text(
                 "❌ **Доступ запрещен!** Только администратор может добавлять членов семьи.",
                 parse_mode=ParseMode.MARKDOWN)
 
+        lines = batch_lines(update.message.text)
+        if lines:
+            return await self.add_members_batch(update, lines)
+
         args = context.args
-        db = SessionLocal()
 
         # 🎯 Ожидаем 4 или 5 аргументов (Имя, Фамилия, Пол, ДР, [ДС])
         if len(args) < 4 or len(args) > 5:
@@ -385,15 +564,9 @@ class FamilyBot:
             birth_date = datetime.strptime(birth_date_str, '%d.%m.%Y').date()
             if death_date_str: death_date = datetime.strptime(death_date_str, '%d.%m.%Y').date()
 
-            # Добавляем пол в модель
-            new_member = FamilyMember(
-                name=name,
-                birth_date=birth_date,
-                death_date=death_date,
-                gender=gender  # <--- ПЕРЕДАЕМ ПОЛ
-            )
-            db.add(new_member)
-            db.commit()
+            # Добавляем пол в модель; склонение — в пуле, не в цикле событий
+            forms, = await name_forms_many([(name, gender)])
+            member = self.repository.add_member(name, birth_date, death_date, gender, forms)
 
             status = "🎉 **(Живой)**" if death_date is None else "🕯️ **(Ушедший)**"
             death_info = f"\nДата смерти: {death_date.strftime('%d.%m.%Y')}" if death_date else ""
@@ -401,7 +574,9 @@ class FamilyBot:
             await update.message.reply_text(
                 f"{status} **{name}** успешно добавлен(а) в семью!\n"
                 f"Пол: **{gender}**\n"
-                f"Дата рождения: {birth_date.strftime('%d.%m.%Y')}{death_info}",
+                f"Дата рождения: {birth_date.strftime('%d.%m.%Y')}{death_info}\n"
+                f"Склонение: {member.name_genitive} / {member.name_dative} / {member.name_instrumental} "
+                f"(исправить: /set\\_declension)",
                 parse_mode=ParseMode.MARKDOWN
             )
 
@@ -410,22 +585,23 @@ class FamilyBot:
                 "❌ **Ошибка:** Неправильный формат даты. Дата должна быть в формате **ДД.ММ.ГГГГ**.",
                 parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
-            db.rollback()
             await update.message.reply_text(f"❌ Произошла ошибка при сохранении: {e}")
-        finally:
-            db.close()
 
     async def add_event(self, update, context):
         """
         Добавляет новое семейное событие.
         Формат: /add_event "Название события" ТИП ДД.ММ.ГГГГ [Описание]
+        Несколько событий сразу — по одному на строку (см. bot/batch.py).
         """
         if not self.is_admin_chat(update.message.chat_id):
             return await update.message.reply_text(
                 "❌ **Доступ запрещен!** Только администратор может добавлять события.", parse_mode=ParseMode.MARKDOWN)
 
+        lines = batch_lines(update.message.text)
+        if lines:
+            return await self.add_events_batch(update, lines)
+
         args = context.args
-        db = SessionLocal()
 
         # Ожидаем минимум 3 аргумента: Название, ТИП и Дата.
         if len(args) < 3:
@@ -489,16 +665,7 @@ class FamilyBot:
         try:
             event_date = datetime.strptime(event_date_str, '%d.%m.%Y').date()
 
-            # 🎯 ИСПРАВЛЕНИЕ: Используем event_date, event_type И добавляем photo_ids=[]
-            new_event = FamilyEvent(
-                title=title,
-                event_date=event_date,
-                event_type=event_type,
-                description=description,
-                photo_ids=[]  # Инициализируем пустым массивом для возможности дальнейшего добавления фото
-            )
-            db.add(new_event)
-            db.commit()
+            self.repository.add_event(title, event_date, event_type, description)
 
             description_info = f"\nОписание: _{description}_" if description else ""
 
@@ -513,20 +680,95 @@ class FamilyBot:
                 "❌ **Ошибка:** Неправильный формат даты. Дата должна быть в формате **ДД.ММ.ГГГГ**.",
                 parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
-            db.rollback()
             await update.message.reply_text(f"❌ Произошла ошибка при сохранении события: {e}")
-        finally:
-            db.close()
+
+    async def add_members_batch(self, update, lines: list):
+        """Пакетный /add_member: все строки проверяются вместе и пишутся одной транзакцией."""
+        existing = {member.name for member in self.repository.list_members()}
+        rows, errors = parse_batch(lines, parse_member_line, "name", existing)
+        if errors:
+            return await update.message.reply_text(format_errors(errors, len(lines)), parse_mode=ParseMode.MARKDOWN)
+
+        try:
+            # Все имена пакета склоняются одной задачей в пуле, а не в цикле событий
+            forms = await name_forms_many([(row["name"], row.get("gender")) for row in rows])
+            rows = [dict(row, **row_forms) for row, row_forms in zip(rows, forms)]
+            members = self.repository.add_members_bulk(rows)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при сохранении (ничего не добавлено): {e}")
+
+        names = "\n".join(f"• {member.name} ({member.birth_date.strftime('%d.%m.%Y')})" for member in members)
+        await update.message.reply_text(
+            f"🎉 **Добавлено членов семьи: {len(members)}**\n\n{names}",
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+    async def add_events_batch(self, update, lines: list):
+        """Пакетный /add_event: все строки проверяются вместе и пишутся одной транзакцией."""
+        existing = {event.title for event in self.repository.list_events()}
+        rows, errors = parse_batch(lines, parse_event_line, "title", existing)
+        if errors:
+            return await update.message.reply_text(format_errors(errors, len(lines)), parse_mode=ParseMode.MARKDOWN)
+
+        try:
+            events = self.repository.add_events_bulk(rows)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при сохранении (ничего не добавлено): {e}")
+
+        titles = "\n".join(f"• {event.title} ({event.event_date.strftime('%d.%m.%Y')})" for event in events)
+        await update.message.reply_text(
+            f"🗓️ **Добавлено событий: {len(events)}**\n\n{titles}",
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+    async def set_event_rule(self, update, context):
+        """
+        Задает правило повторения события.
+        Формат: /set_event_rule Название события ПРАВИЛО
+        ПРАВИЛО: YEARLY, ONCE, FREQ=YEARLY;INTERVAL=5 или FREQ=YEARLY;BYMONTH=5;BYDAY=-1SU
+        """
+        args = context.args
+        if len(args) < 2:
+            return await update.message.reply_text(
+                "❌ **Неверный формат команды!**\n\n"
+                "Используйте формат:\n"
+                "`/set_event_rule Название события ПРАВИЛО`\n\n"
+                "**ПРАВИЛО**: `YEARLY` (ежегодно), `ONCE` (однократно), "
+                "`FREQ=YEARLY;INTERVAL=5` (раз в 5 лет), "
+                "`FREQ=YEARLY;BYMONTH=5;BYDAY=-1SU` (последнее воскресенье мая).",
+                parse_mode=ParseMode.MARKDOWN
+            )
+
+        title = " ".join(args[:-1]).strip().strip('"\'')
+        try:
+            rule = normalize_rule(args[-1])
+        except ValueError as e:
+            return await update.message.reply_text(f"❌ Неверное правило: {e}")
+
+        try:
+            recurring = rule != ONCE
+            event = self.repository.set_event_rule(title, rule, recurring)
+            if event is None:
+                return await update.message.reply_text(f"❌ Событие **{title}** не найдено.",
+                                                       parse_mode=ParseMode.MARKDOWN)
+
+            next_info = (f"Ближайшая дата: **{event.next_occurrence.strftime('%d.%m.%Y')}**"
+                         if event.next_occurrence else "Больше не повторится.")
+            await update.message.reply_text(
+                f"🔁 **{title}**: {describe_rule(rule, recurring)}.\n{next_info}",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        except Exception as e:
+            await update.message.reply_text(f"❌ Произошла ошибка при сохранении правила: {e}")
 
     async def list_members(self, update, context):
         """Выводит список всех членов семьи с их общим количеством."""
-        db = SessionLocal()
         try:
-            service = NotificationService(db)
+            service = self.notification_service
 
-            # ✅ ДОБАВЛЕНО: Получаем общее количество членов семьи
-            member_count = db.query(FamilyMember).count()
-            members = db.query(FamilyMember).all()
+            # Список берется из кэша репозитория; количество — его длина (без COUNT(*))
+            members = self.repository.list_members()
+            member_count = len(members)
 
             if not members:
                 await update.message.reply_text("👥 В базе пока нет членов семьи")
@@ -551,11 +793,356 @@ class FamilyBot:
 
         except Exception as e:
             await update.message.reply_text(f"❌ Ошибка при получении данных: {e}")
-        finally:
-            db.close()
+
+    async def family_stats(self, update, context):
+        """
+        /stats: сколько в семье человек, живых и ушедших, возрасты, самые насыщенные
+        месяцы и ближайшие вехи. Счетчики — из таблицы family_stats (одна короткая
+        выборка, не зависит от размера семьи), вехи — из MilestoneIndex.
+        """
+        family = self.families.current().family
+        stats = self.repository.family_stats()
+        if not stats.members and not stats.events:
+            return await update.message.reply_text("📊 В семье пока нет ни людей, ни событий.")
+
+        lines = [
+            f"📊 **Семья «{family.name}»**",
+            "",
+            f"👥 Членов семьи: **{stats.members}** (с нами: {stats.living}, светлая память: {stats.deceased})",
+            f"🎉 Событий: **{stats.events}**",
+        ]
+        age_groups = stats.age_groups()
+        if age_groups:
+            lines.append("🎂 Возраст: " + ", ".join(f"{label} — {count}" for label, count in age_groups))
+        busiest = stats.busiest_months()
+        if busiest:
+            lines.append("📆 Больше всего дат: " + ", ".join(f"{MONTH_NAMES[month]} ({count})"
+                                                          for month, count in busiest))
+
+        today = date.today()
+        upcoming = []
+        for milestone in self.milestones.upcoming(today, Config.MILESTONE_HORIZON_DAYS):
+            brief = self.notification_service.format_milestone_brief(milestone)
+            if brief and brief[0] >= today:
+                upcoming.append(brief)
+        if upcoming:
+            lines.append("")
+            lines.append("🌟 Ближайшие вехи:")
+            lines.extend(f"• {day.strftime('%d.%m.%Y')} — {text}" for day, text in sorted(upcoming)[:5])
+
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+    async def perf_command(self, update, context):
+        """Админская команда /perf [N]: самые медленные SQL-запросы и статистика кэша."""
+        if not self.is_admin_chat(update.message.chat_id):
+            return await update.message.reply_text("❌ **Доступ запрещен!** Эта команда только для администратора.",
+                                                   parse_mode=ParseMode.MARKDOWN)
+
+        top_n = int(context.args[0]) if context.args and context.args[0].isdigit() else 10
+        cache = self.repository.stats()
+
+        lines = [
+            "⚙️ Производительность бота",
+            "",
+            f"👨‍👩‍👧 Семья: {self.families.current().family.name}, загружено семей: {len(self.families.contexts)}",
+            f"🧠 Кэш: записей={cache['entries']}, попаданий={cache['hits']}, промахов={cache['misses']}, "
+            f"доля попаданий={cache['hit_ratio']:.0%}, сбросов={cache['invalidations']}",
+            "🔀 Маршрутизация БД: " + format_routing(cache["routing"]),
+        ]
+        lines.extend(f"⏱️ {line}" for line in self.fire_lag.report())
+        lines.append(f"🩺 Цикл событий: {self.loop_monitor.report()}")
+        lines.append(f"🚰 Соединения с БД: {leak_detector.report()}")
+        lines.append(f"⏰ Напоминания заранее: {self.advance_reminders.report()}")
+        lines.append(f"🗓️ Дайджесты: {self.digests.report()}")
+        lines.append(f"📅 Календари: {self.calendar_feeds.report()}")
+        lines.append(f"🚦 Команды: {self.throttle.report()}")
+        lines.extend(f"🔌 Bot API {request.report()}" for request in (self.api_request, self.updates_request))
+
+        if not profiler.enabled:
+            lines.append("🐢 Профилирование SQL выключено (DB_PROFILING=1 для включения).")
+        else:
+            lines.append(
+                f"🐢 SQL с запуска: запросов={profiler.total_statements}, "
+                f"время={profiler.total_time * 1000:.0f}ms. Самые медленные:"
+            )
+            for i, (duration, statement, scope_name) in enumerate(profiler.top(top_n), start=1):
+                lines.append(f"{i}. {duration * 1000:.1f}ms [{scope_name}] {statement[:300]}")
+
+        # Без Markdown: SQL содержит символы разметки
+        await update.message.reply_text("\n".join(lines)[:4000])
+
+    # --- СЕМЬИ ---
+
+    async def families_command(self, update, context):
+        """Админская команда /families: все семьи и их чаты."""
+        current = self.families.current().family
+        lines = ["👨‍👩‍👧 **Семьи:**", ""]
+        for family in self.families.list_families():
+            chat = f"чат `{family.chat_id}`" if family.chat_id is not None else "без чата"
+            marker = " ⬅️ выбрана" if family.id == current.id else ""
+            lines.append(f"• `{family.id}` — {family.name} ({chat}){marker}")
+        lines.append("")
+        lines.append("Выбрать семью для команд администратора: `/use_family ID`")
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+    async def new_family(self, update, context):
+        """
+        Создает семью. Формат: /new_family Название [chat_id]
+        chat_id — чат семьи: команды из него видят только эту семью, туда же идет рассылка.
+        """
+        args = list(context.args)
+        chat_id = None
+        if len(args) > 1 and args[-1].lstrip('-').isdigit():
+            chat_id = int(args.pop())
+        name = " ".join(args).strip()
+        if not name:
+            return await update.message.reply_text("❌ Используйте: `/new_family Название [chat_id]`",
+                                                   parse_mode=ParseMode.MARKDOWN)
+        if chat_id is not None and chat_id in self.families.by_chat:
+            return await update.message.reply_text(f"❌ Чат `{chat_id}` уже привязан к другой семье.",
+                                                   parse_mode=ParseMode.MARKDOWN)
+        try:
+            family = self.families.create_family(name, chat_id)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при создании семьи: {e}")
+
+        await update.message.reply_text(
+            f"✅ Семья **{family.name}** создана (ID `{family.id}`). "
+            f"Чтобы добавлять в нее людей и события: `/use_family {family.id}`",
+            parse_mode=ParseMode.MARKDOWN)
+
+    async def use_family(self, update, context):
+        """Админская команда /use_family ID: с какой семьей работают команды в чате администратора."""
+        if not context.args or not context.args[0].isdigit():
+            return await update.message.reply_text("❌ Используйте: `/use_family ID` (список — /families)",
+                                                   parse_mode=ParseMode.MARKDOWN)
+        family = self.families.select_admin_family(int(context.args[0]))
+        if family is None:
+            return await update.message.reply_text(f"❌ Семья с ID `{context.args[0]}` не найдена.",
+                                                   parse_mode=ParseMode.MARKDOWN)
+        await update.message.reply_text(f"✅ Теперь команды администратора работают с семьей **{family.name}**.",
+                                        parse_mode=ParseMode.MARKDOWN)
+
+    # --- СЕМЕЙНОЕ ДЕРЕВО ---
+
+    async def add_relation(self, update, context):
+        """
+        Добавляет родственную связь.
+        Формат: /add_relation Имя Фамилия parent|spouse Имя Фамилия [ДД.ММ.ГГГГ]
+        parent — первый человек является родителем второго; для spouse можно указать дату свадьбы.
+        """
+        if not self.is_admin_chat(update.message.chat_id):
+            return await update.message.reply_text(
+                "❌ **Доступ запрещен!** Только администратор может добавлять связи.", parse_mode=ParseMode.MARKDOWN)
+
+        usage = (
+            "❌ **Неверный формат команды!**\n\n"
+            "`/add_relation Имя Фамилия parent Имя Фамилия` — первый является родителем второго\n"
+            "`/add_relation Имя Фамилия spouse Имя Фамилия [ДД.ММ.ГГГГ]` — супруги (и дата свадьбы)"
+        )
+        args = list(context.args)
+        kinds = {"parent": RelationType.PARENT, "spouse": RelationType.SPOUSE}
+        kind_index = next((i for i, arg in enumerate(args) if arg.lower() in kinds), None)
+        if kind_index is None or kind_index == 0 or kind_index == len(args) - 1:
+            return await update.message.reply_text(usage, parse_mode=ParseMode.MARKDOWN)
+
+        relation_type = kinds[args[kind_index].lower()]
+        first_name = " ".join(args[:kind_index])
+        rest = args[kind_index + 1:]
+
+        since_date = None
+        if relation_type == RelationType.SPOUSE and len(rest) > 1 and rest[-1].count('.') == 2:
+            try:
+                since_date = datetime.strptime(rest[-1], '%d.%m.%Y').date()
+                rest = rest[:-1]
+            except ValueError:
+                return await update.message.reply_text(
+                    "❌ **Ошибка:** Дата свадьбы должна быть в формате **ДД.ММ.ГГГГ**.", parse_mode=ParseMode.MARKDOWN)
+        second_name = " ".join(rest)
+
+        graph = self.repository.family_graph()
+        first, second = graph.find(first_name), graph.find(second_name)
+        for name, member in ((first_name, first), (second_name, second)):
+            if member is None:
+                return await update.message.reply_text(f"❌ Член семьи **{name}** не найден.",
+                                                       parse_mode=ParseMode.MARKDOWN)
+        if first.id == second.id:
+            return await update.message.reply_text("❌ Нельзя связать человека с самим собой.")
+
+        if relation_type == RelationType.PARENT and graph.is_ancestor(second.id, first.id):
+            return await update.message.reply_text(
+                f"❌ **{second.name}** уже является предком **{first.name}** — получится цикл.",
+                parse_mode=ParseMode.MARKDOWN)
+
+        member_id, relative_id = first.id, second.id
+        if relation_type == RelationType.SPOUSE:
+            # Супружеская связь симметрична: храним в одном направлении
+            member_id, relative_id = sorted((first.id, second.id))
+
+        try:
+            added = self.repository.add_relationship(member_id, relative_id, relation_type, since_date)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при сохранении связи: {e}")
+
+        if not added:
+            return await update.message.reply_text("⚠️ Такая связь уже есть.")
+
+        if relation_type == RelationType.PARENT:
+            text = f"🌳 **{first.name}** — родитель **{second.name}**."
+        else:
+            wedding = f" (свадьба {since_date.strftime('%d.%m.%Y')})" if since_date else ""
+            text = f"💍 **{first.name}** и **{second.name}** — супруги{wedding}."
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+    async def tree(self, update, context):
+        """Обработчик /tree Имя: рисует поддерево потомков."""
+        if not context.args:
+            return await update.message.reply_text("🌳 Используйте: `/tree Имя Фамилия`", parse_mode=ParseMode.MARKDOWN)
+
+        name = " ".join(context.args)
+        graph = self.repository.family_graph()
+        member = graph.find(name)
+        if member is None:
+            return await update.message.reply_text(f"❌ Член семьи **{name}** не найден.", parse_mode=ParseMode.MARKDOWN)
+
+        # Без Markdown: в дереве псевдографика и произвольные имена
+        await update.message.reply_text(graph.render_tree(member.id)[:4000])
+
+    async def relatives(self, update, context):
+        """Обработчик /relatives Имя: все родственники по поколениям."""
+        if not context.args:
+            return await update.message.reply_text("🧬 Используйте: `/relatives Имя Фамилия`",
+                                                   parse_mode=ParseMode.MARKDOWN)
+
+        name = " ".join(context.args)
+        graph = self.repository.family_graph()
+        member = graph.find(name)
+        if member is None:
+            return await update.message.reply_text(f"❌ Член семьи **{name}** не найден.", parse_mode=ParseMode.MARKDOWN)
+
+        generations = graph.generations(member.id)
+        if not generations:
+            return await update.message.reply_text(f"🧬 Для {member.name} пока не указано ни одной связи.")
+
+        lines = [f"🧬 Родственники: {member.name}", ""]
+        for offset in sorted(generations):
+            title = GENERATION_NAMES.get(offset, f"Поколение {offset:+d}")
+            names = sorted(graph.members[relative_id].name for relative_id in generations[offset])
+            lines.append(f"{title}: {', '.join(names)}")
+        await update.message.reply_text("\n".join(lines)[:4000])
 
     # --- ЛОГИКА УВЕДОМЛЕНИЙ И ПЛАНИРОВЩИК ---
 
+    async def calendar(self, update, context):
+        """Обработчик /calendar: ссылка на календарь семьи этого чата (.ics)."""
+        if not Config.CALENDAR_PORT:
+            return await update.message.reply_text("📅 Календарь пока не включен (CALENDAR_PORT).")
+
+        family = self.families.current().family
+        url = self.calendar_feeds.url(family.id)
+        await update.message.reply_text(
+            f"📅 Календарь семьи {family.name}:\n{url}\n\n"
+            "Добавьте его как подписку на календарь (iPhone: Настройки → Календарь → Учетные записи → "
+            "Новая → Другое → Подписной календарь; Google Календарь: «Добавить по URL»). "
+            "Дни рождения, годовщины и события появятся сами и будут обновляться."
+        )
+
+    async def remind(self, update, context):
+        """
+        Напоминания заранее для этого чата.
+        /remind — список; /remind 3 [ЧЧ:ММ] — за 3 дня (время UTC); /remind off 3 — отключить.
+        """
+        chat_id = update.effective_chat.id
+        args = list(context.args)
+        usage = ("⏰ Используйте: `/remind 3` — напоминать за 3 дня, `/remind 7 08:30` — за неделю в 08:30 UTC, "
+                 "`/remind off 3` — отключить.")
+
+        if not args:
+            subscriptions = self.advance_reminders.for_chat(chat_id)
+            if not subscriptions:
+                return await update.message.reply_text("⏰ Напоминаний заранее нет.\n" + usage,
+                                                       parse_mode=ParseMode.MARKDOWN)
+            lines = [f"• за {pluralize_days(subscription.days_before)} в "
+                     f"{subscription.fire_time or Config.NOTIFICATION_TIME} UTC" for subscription in subscriptions]
+            return await update.message.reply_text("⏰ **Напоминания заранее:**\n" + "\n".join(lines),
+                                                   parse_mode=ParseMode.MARKDOWN)
+
+        turn_off = args[0].lower() == "off"
+        if turn_off:
+            args = args[1:]
+        if not args or not args[0].isdigit() or not 1 <= int(args[0]) <= Config.REMINDER_MAX_DAYS:
+            return await update.message.reply_text(
+                usage + f"\nЧисло дней — от 1 до {Config.REMINDER_MAX_DAYS}.", parse_mode=ParseMode.MARKDOWN)
+        days_before = int(args[0])
+
+        if turn_off:
+            removed = self.advance_reminders.unsubscribe(chat_id, days_before)
+            text = f"✅ Напоминание за {pluralize_days(days_before)} отключено." if removed \
+                else f"⚠️ Напоминания за {pluralize_days(days_before)} не было."
+            return await update.message.reply_text(text)
+
+        fire_time = None
+        if len(args) > 1:
+            try:
+                fire_time = datetime.strptime(args[1], '%H:%M').strftime('%H:%M')
+            except ValueError:
+                return await update.message.reply_text("❌ Время должно быть в формате **ЧЧ:ММ**.",
+                                                       parse_mode=ParseMode.MARKDOWN)
+
+        family = self.families.current().family
+        try:
+            self.advance_reminders.subscribe(family.id, chat_id, days_before, fire_time)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при сохранении напоминания: {e}")
+        await update.message.reply_text(
+            f"✅ Буду напоминать за **{pluralize_days(days_before)}** о датах семьи **{family.name}** "
+            f"(в {fire_time or Config.NOTIFICATION_TIME} UTC).",
+            parse_mode=ParseMode.MARKDOWN)
+
+    async def digest(self, update, context):
+        """
+        Дайджест дат семьи для этого чата.
+        /digest — подписки; /digest week | month — подписаться; /digest off week | month — отписаться.
+        """
+        chat_id = update.effective_chat.id
+        args = [arg.lower() for arg in context.args]
+        usage = ("🗓️ Используйте: `/digest week` — даты на неделю по понедельникам, "
+                 "`/digest month` — даты на месяц 1-го числа, `/digest off week` — отключить.")
+        periods = {"week": WEEKLY, "weekly": WEEKLY, "неделя": WEEKLY, "month": MONTHLY, "monthly": MONTHLY,
+                   "месяц": MONTHLY}
+
+        if not args:
+            subscriptions = self.digests.for_chat(chat_id)
+            if not subscriptions:
+                return await update.message.reply_text("🗓️ Дайджестов нет.\n" + usage, parse_mode=ParseMode.MARKDOWN)
+            lines = [f"• {PERIOD_NAMES[subscription.period]}" for subscription in subscriptions]
+            return await update.message.reply_text("🗓️ **Дайджесты:**\n" + "\n".join(lines),
+                                                   parse_mode=ParseMode.MARKDOWN)
+
+        turn_off = args[0] == "off"
+        if turn_off:
+            args = args[1:]
+        period = periods.get(args[0]) if args else None
+        if period is None:
+            return await update.message.reply_text(usage, parse_mode=ParseMode.MARKDOWN)
+
+        if turn_off:
+            removed = self.digests.unsubscribe(chat_id, period)
+            text = f"✅ {PERIOD_NAMES[period].capitalize()} дайджест отключен." if removed \
+                else f"⚠️ {PERIOD_NAMES[period].capitalize()} дайджест не был включен."
+            return await update.message.reply_text(text)
+
+        family = self.families.current().family
+        try:
+            self.digests.subscribe(family.id, chat_id, period)
+        except Exception as e:
+            return await update.message.reply_text(f"❌ Произошла ошибка при сохранении подписки: {e}")
+        when = "по понедельникам" if period == WEEKLY else "1-го числа каждого месяца"
+        await update.message.reply_text(
+            f"✅ {PERIOD_NAMES[period].capitalize()} дайджест дат семьи **{family.name}** — {when} "
+            f"в {Config.NOTIFICATION_TIME} UTC.",
+            parse_mode=ParseMode.MARKDOWN)
+
     async def today(self, update, context):
         """Обработчик команды /today. Немедленно запускает отправку событий."""
         await self.send_today_events(update.message.chat_id)
@@ -565,91 +1152,15 @@ class FamilyBot:
         await self.send_today_events(update.message.chat_id)
 
     async def send_today_events(self, chat_id):
-        db = SessionLocal()
+        """Отправляет события на сегодня в чат через единый конвейер уведомлений."""
         try:
-            service = NotificationService(db)
-            birthdays, events, death_anniversaries = service.get_today_events()
-
-            # Логирование для сервера (чисто)
-            if birthdays or events or death_anniversaries:
-                print(
-                    f"INFO: Обнаружены события на сегодня: ДР={len(birthdays)}, События={len(events)}, Смерти={len(death_anniversaries)}")
-
-            # Проверяем все три списка
-            if not birthdays and not events and not death_anniversaries:
-                await self.application.bot.send_message(
-                    chat_id=chat_id,
-                    text="📅 Сегодня нет знаменательных дат"
-                )
-                return
-
-            # --- 1. Отправка дней рождения (Birthdays) ---
-            for member in birthdays:
-                # 🟢 ШАГ 1: ОТПРАВКА АНИМАЦИИ (ТОРТ)
-                try:
-                    await self.application.bot.send_message(
-                        chat_id=chat_id,
-                        text="🎂",  # Это запускает полноэкранную анимацию!
-                    )
-                except Exception as e:
-                    print(f"❌ Предупреждение: Не удалось отправить эмодзи-анимацию: {e}")
-
-                # 🟢 ШАГ 2: ОТПРАВКА ИНФОРМАЦИОННОГО СООБЩЕНИЯ
-                message = service.format_birthday_message(member)
-                if member.photo_file_id:
-                    await self.application.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=member.photo_file_id,
-                        caption=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    await self.application.bot.send_message(
-                        chat_id=chat_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                await asyncio.sleep(0.5)
-
-            # --- 2. Отправка других событий (Events) ---
-            for event in events:
-                message = service.format_event_message(event)
-                photo_id = service.get_event_photo_id(event)
-
-                if isinstance(photo_id, str) and photo_id.strip():
-                    await self.application.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=photo_id,
-                        caption=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    await self.application.bot.send_message(
-                        chat_id=chat_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                await asyncio.sleep(0.5)
-
-            # --- 3. Отправка годовщин смерти (Death Anniversaries) ---
-            for member in death_anniversaries:
-                # message генерируется в service и содержит Её/Его
-                message = service.format_death_anniversary_message(member)
-
-                if member.photo_file_id:
-                    await self.application.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=member.photo_file_id,
-                        caption=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    await self.application.bot.send_message(
-                        chat_id=chat_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                await asyncio.sleep(0.5)
+            pipeline = NotificationEngine(
+                self.notification_service,
+                registry=self.file_registry,
+                source=self.repository,
+                milestones=self.milestones
+            )
+            await pipeline.run(TelegramSink(self.application.bot, chat_id))
 
         except Exception as e:
             print(f"❌ Ошибка при отправке уведомления в чат {chat_id}: {e}")
@@ -660,43 +1171,114 @@ class FamilyBot:
                 )
             except Exception:
                 pass
-        finally:
-            db.close()
 
     def schedule_daily_notifications(self):
-        """Настраивает ежедневное уведомление в 9:00 UTC с помощью AsyncIOScheduler."""
-        scheduler = AsyncIOScheduler()
-
-        scheduler.add_job(
-            self.send_daily_reminder,
-            'cron',
-            hour=9,
-            minute=0
+        """
+        Настраивает планировщик: ежедневная рассылка в NOTIFICATION_TIME (UTC), ночная
+        проверка file_id и снимок состояния. Задачи хранятся в базе (переживают
+        перезапуск), пропущенные запуски сливаются в один и выполняются, если
+        опоздание не больше SCHEDULER_MISFIRE_GRACE_SECONDS.
+        """
+        scheduler = AsyncIOScheduler(
+            jobstores={"default": SQLAlchemyJobStore(engine=engine)},
+            job_defaults={
+                "coalesce": True,
+                "misfire_grace_time": Config.SCHEDULER_MISFIRE_GRACE_SECONDS,
+                "max_instances": 1,
+            },
+            timezone="UTC",
         )
+        self.fire_lag.install(scheduler)
+        # Сами задачи добавляются после start() (jobs.register_jobs): add_job с replace_existing
+        # до запуска перезаписал бы сохраненный next_run_time, и пропущенный запуск бы потерялся
         print("✅ Планировщик ежедневных уведомлений настроен.")
         return scheduler
 
     async def send_daily_reminder(self):
-        """Обертка для send_today_events для использования в планировщике."""
-        target_chat_id = Config.ADMIN_CHAT_ID
-        if target_chat_id:
-            print(f"⏰ Отправка ежедневного уведомления в чат {target_chat_id}...")
-            await self.send_today_events(target_chat_id)
-        else:
-            print("❌ ADMIN_CHAT_ID не установлен, ежедневное уведомление пропущено.")
+        """Ежедневная рассылка: каждой семье — в ее чат, только ее события."""
+        for family in self.families.list_families():
+            target_chat_id = self.families.notification_chat(family)
+            if not target_chat_id:
+                print(f"❌ У семьи {family.name} нет чата, ежедневное уведомление пропущено.")
+                continue
+
+            print(f"⏰ Отправка ежедневного уведомления семье {family.name} в чат {target_chat_id}...")
+            with self.families.use(self.families.get(family.id)):
+                with tracer.start_as_current_span("job.daily_reminder", attributes={"family.id": family.id}), \
+                        profiler.scope("job:daily_reminder"), session_scope("job:daily_reminder"):
+                    await self.send_today_events(target_chat_id)
+                stats = self.repository.stats()
+            print(f"🧠 Кэш репозитория семьи {family.name}: попаданий={stats['hits']}, промахов={stats['misses']}, "
+                  f"доля попаданий={stats['hit_ratio']:.0%}")
+
+    async def send_digests(self, period: str):
+        """Рассылка дайджеста (weekly / monthly) всем подписанным чатам одним проходом."""
+        with tracer.start_as_current_span(f"job.digest_{period}"), profiler.scope(f"job:digest_{period}"):
+            sent = await self.digests.run(period)
+        print(f"🗓️ Дайджест ({period}) отправлен: сообщений {sent}.")
+
+    async def validate_file_ids(self):
+        """Ночная проверка всех сохраненных file_id через Telegram getFile."""
+        try:
+            with profiler.scope("job:validate_file_ids"), session_scope("job:validate_file_ids"):
+                await self.file_registry.validate_all(self.application.bot)
+        except Exception as e:
+            print(f"❌ Ошибка ночной проверки file_id: {e}")
+
+    async def save_warm_snapshot(self):
+        """Пишет снимок горячего состояния (по таймеру и при остановке бота)."""
+        if not self.warm_snapshot:
+            return
+        try:
+            size = self.warm_snapshot.save()
+            print(f"💾 Снимок состояния сохранен: {Config.WARM_SNAPSHOT_PATH} ({size / 1024:.1f} КБ)")
+        except Exception as e:
+            print(f"❌ Ошибка сохранения снимка состояния: {e}")
 
     # --- ЗАПУСК БОТА ---
 
+    async def on_startup(self, application):
+        """post_init: меню команд, запуск планировщика в работающем цикле и догоняющая рассылка."""
+        await self.set_commands(application)
+        self.loop_monitor.start()
+        leak_detector.start()
+        self.advance_reminders.load()
+        self.advance_reminders.start()
+        if Config.CALENDAR_PORT:
+            self.calendar_feeds.start()
+
+        self.scheduler.start()
+        jobs.register_jobs(self.scheduler, warm_snapshot=bool(self.warm_snapshot))
+        print("✅ Планировщик ежедневных уведомлений запущен.")
+
+        try:
+            await jobs.catch_up_daily_reminder()
+        except Exception as e:
+            print(f"❌ Ошибка догоняющей рассылки: {e}")
+        try:
+            await jobs.catch_up_digests()
+        except Exception as e:
+            print(f"❌ Ошибка догоняющего дайджеста: {e}")
+
+    async def on_shutdown(self, application):
+        """post_shutdown: останавливаем планировщик и сохраняем снимок состояния."""
+        self.loop_monitor.stop()
+        leak_detector.stop()
+        self.advance_reminders.stop()
+        self.calendar_feeds.stop()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        await self.save_warm_snapshot()
+        shutdown_executor()
+
     def run(self):
         """Запускаем бота через Long Polling и активируем планировщик."""
 
-        scheduler = self.schedule_daily_notifications()
+        jobs.bind(self)
+        self.scheduler = self.schedule_daily_notifications()
 
-        self.application.post_init = self.set_commands
-
-        self.application.job_queue.scheduler = scheduler
-        self.application.job_queue.scheduler.start()
-        print("✅ Планировщик ежедневных уведомлений запущен.")
+        self.application.post_init = self.on_startup
+        self.application.post_shutdown = self.on_shutdown
 
         print("📡 Запуск бота через Long Polling...")
         self.application.run_polling()
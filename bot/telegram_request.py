@@ -0,0 +1,166 @@
+"""
+HTTP-клиенты Bot API.
+
+Long polling (getUpdates) и все остальные вызовы (sendMessage, sendPhoto, ...)
+ходят через разные пулы соединений: getUpdates держит соединение до 30 секунд,
+и раньше рассылка в 09:00 стояла в очереди за ним в общем маленьком пуле.
+
+TracedHTTPXRequest оборачивает каждый вызов в спан bot_api.<метод>, применяет
+таймауты по методам (загрузка фото дольше текста) и считает, сколько вызовы
+ждали свободного соединения в пуле.
+"""
+import asyncio
+import time
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest, BaseRequest
+
+from config import Config
+from services.tracing import span
+
+
+def parse_method_timeouts(value: str) -> dict:
+    """"sendPhoto=60,sendMediaGroup=90" -> {"sendPhoto": 60.0, "sendMediaGroup": 90.0}."""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        method, _, seconds = item.partition("=")
+        timeouts[method.strip()] = float(seconds)
+    return timeouts
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (ставится с python-telegram-bot[http2])
+    except ImportError:
+        return False
+    return True
+
+
+class PoolWaitStats:
+    """Ожидание свободного соединения в пуле: число вызовов, сколько из них ждали, сумма и максимум."""
+
+    def __init__(self):
+        self.requests = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds: float):
+        self.requests += 1
+        if seconds > 0.001:
+            self.waited += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def report(self) -> str:
+        return (f"вызовов={self.requests}, ждали пул={self.waited}, макс. ожидание={self.max_wait * 1000:.0f}ms, "
+                f"всего={self.total_wait:.1f}с, таймаутов пула={self.timeouts}")
+
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest, который оборачивает каждый вызов Bot API в спан bot_api.<метод>."""
+
+    def __init__(self, connection_pool_size: int = 1, keepalive_expiry: float = 5.0,
+                 method_timeouts: dict = None, name: str = "api", **kwargs):
+        if kwargs.get("http_version", "1.1") != "1.1" and not http2_available():
+            print(f"⚠️ HTTP/2 для пула «{name}» недоступен (нет пакета h2) — используется HTTP/1.1.")
+            kwargs["http_version"] = "1.1"
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+
+        # Keep-alive: HTTPXRequest не дает его настроить — пересобираем клиент с нашими лимитами
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=connection_pool_size,
+            max_keepalive_connections=connection_pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client = self._build_client()
+
+        self.name = name
+        self.pool_size = connection_pool_size
+        self.method_timeouts = method_timeouts or {}
+        # Очередь к пулу — наша: по ней видно ожидание, а пул httpx никогда не переполнен
+        self._slots = asyncio.Semaphore(connection_pool_size)
+        self.pool_wait = PoolWaitStats()
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        endpoint = url.rsplit("/", 1)[-1]
+        method_timeout = self.method_timeouts.get(endpoint)
+        if method_timeout is not None:
+            # Таймаут метода — только если вызывающий код не задал свой
+            if read_timeout is BaseRequest.DEFAULT_NONE:
+                read_timeout = method_timeout
+            if write_timeout is BaseRequest.DEFAULT_NONE:
+                write_timeout = method_timeout
+        wait_limit = self._client.timeout.pool if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout
+
+        with span(f"bot_api.{endpoint}", **{"http.method": method, "http.pool": self.name}) as api_span:
+            started = time.perf_counter()
+            try:
+                if self._slots.locked():
+                    await asyncio.wait_for(self._slots.acquire(), wait_limit)
+                else:
+                    await self._slots.acquire()  # Свободное соединение есть — без лишней задачи wait_for
+            except asyncio.TimeoutError:
+                self.pool_wait.timeouts += 1
+                raise TimedOut(
+                    f"Pool timeout: все {self.pool_size} соединений пула «{self.name}» заняты, "
+                    f"запрос {endpoint} не отправлен."
+                ) from None
+            waited = time.perf_counter() - started
+            self.pool_wait.record(waited)
+            api_span.set_attribute("http.pool_wait_ms", round(waited * 1000, 1))
+            try:
+                code, payload = await super().do_request(
+                    url,
+                    method,
+                    request_data=request_data,
+                    read_timeout=read_timeout,
+                    write_timeout=write_timeout,
+                    connect_timeout=connect_timeout,
+                    pool_timeout=pool_timeout,
+                )
+            finally:
+                self._slots.release()
+            api_span.set_attribute("http.status_code", code)
+            return code, payload
+
+    def report(self) -> str:
+        return f"{self.name} (пул {self.pool_size}, HTTP/{self.http_version}): {self.pool_wait.report()}"
+
+
+def build_requests() -> tuple:
+    """(клиент для вызовов API, клиент для getUpdates) по настройкам TELEGRAM_* из Config."""
+    http_version = "2" if Config.TELEGRAM_HTTP2 else "1.1"
+    api_request = TracedHTTPXRequest(
+        name="api",
+        connection_pool_size=Config.TELEGRAM_POOL_SIZE,
+        keepalive_expiry=Config.TELEGRAM_KEEPALIVE_SECONDS,
+        method_timeouts=parse_method_timeouts(Config.TELEGRAM_METHOD_TIMEOUTS),
+        read_timeout=Config.TELEGRAM_READ_TIMEOUT,
+        write_timeout=Config.TELEGRAM_READ_TIMEOUT,
+        connect_timeout=Config.TELEGRAM_CONNECT_TIMEOUT,
+        pool_timeout=Config.TELEGRAM_POOL_TIMEOUT,
+        http_version=http_version,
+    )
+    # Long polling: одно соединение; Bot.get_updates сам прибавляет timeout опроса к read_timeout
+    updates_request = TracedHTTPXRequest(
+        name="updates",
+        connection_pool_size=1,
+        keepalive_expiry=Config.TELEGRAM_KEEPALIVE_SECONDS,
+        read_timeout=Config.TELEGRAM_READ_TIMEOUT,
+        connect_timeout=Config.TELEGRAM_CONNECT_TIMEOUT,
+        pool_timeout=Config.TELEGRAM_POOL_TIMEOUT,
+        http_version=http_version,
+    )
+    return api_request, updates_request
@@ -0,0 +1,121 @@
+"""
+Ограничение частоты команд и склейка одинаковых запросов.
+
+- Скользящее окно на пользователя и на чат: не больше THROTTLE_USER_LIMIT
+  команд от одного человека и THROTTLE_CHAT_LIMIT команд в одном чате за
+  THROTTLE_WINDOW_SECONDS. Ограничиваются только публичные чтения и
+  рассылки (/today, /list, /tree, /relatives, /stats, /calendar,
+  /test_notify) — записи администратора проходят без лимита. Лишняя команда не трогает ни базу, ни Bot API,
+  кроме одного короткого ответа (не чаще раза за окно на пользователя).
+- Склейка: если в чате уже выполняется такая же команда с теми же
+  аргументами (например, /today), повторная не запускает вторую выборку и
+  вторую отправку фото, а дожидается первой и получает ее результат.
+
+Все хранится в памяти процесса — бот работает в одном экземпляре.
+"""
+import asyncio
+import time
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    """Не больше limit событий на ключ за последние window секунд."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.hits = {}  # ключ -> deque времен последних событий
+        self._last_prune = 0.0
+
+    def allow(self, key, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self._prune(now)
+        hits = self.hits.setdefault(key, deque())
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return False
+        hits.append(now)
+        return True
+
+    def retry_after(self, key, now: float = None) -> float:
+        """Через сколько секунд освободится место в окне."""
+        now = time.monotonic() if now is None else now
+        hits = self.hits.get(key)
+        if not hits or len(hits) < self.limit:
+            return 0.0
+        return max(0.0, hits[0] + self.window - now)
+
+    def _prune(self, now: float):
+        # Раз в окно выбрасываем ключи без свежих событий, чтобы словарь не рос бесконечно
+        if now - self._last_prune < self.window:
+            return
+        self._last_prune = now
+        for key in [key for key, hits in self.hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self.hits[key]
+
+
+class CommandThrottle:
+    def __init__(self, user_limit: int, chat_limit: int, window: float):
+        self.users = SlidingWindowLimiter(user_limit, window)
+        self.chats = SlidingWindowLimiter(chat_limit, window)
+        self.window = window
+        self.inflight = {}   # (команда, чат, аргументы) -> Future с результатом выполняющейся команды
+        self.notified = {}   # пользователь -> когда ему последний раз ответили «слишком часто»
+        self.allowed = 0
+        self.throttled = 0
+        self.coalesced = 0
+
+    def allow(self, user_id, chat_id, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        # Сначала пользователь: его лишние команды не съедают лимит чата
+        if user_id is not None and not self.users.allow(user_id, now):
+            self.throttled += 1
+            return False
+        if chat_id is not None and not self.chats.allow(chat_id, now):
+            self.throttled += 1
+            return False
+        self.allowed += 1
+        return True
+
+    def throttled_reply(self, user_id, chat_id, now: float = None) -> str | None:
+        """Готовый текст ответа на лишнюю команду или None, если пользователю уже отвечали в этом окне."""
+        now = time.monotonic() if now is None else now
+        if now - self.notified.get(user_id, -self.window) < self.window:
+            return None
+        self.notified[user_id] = now
+        if len(self.notified) > 10000:
+            self.notified = {user: at for user, at in self.notified.items() if now - at < self.window}
+        wait = max(self.users.retry_after(user_id, now), self.chats.retry_after(chat_id, now))
+        return f"⏳ Слишком много команд. Попробуйте через {max(1, round(wait))} с."
+
+    async def coalesce(self, key, factory):
+        """
+        Выполняет factory() один раз на ключ: пока первый вызов не закончился,
+        следующие с тем же ключом ждут его и получают тот же результат (или ошибку).
+        """
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Ошибка уже поднята у первого вызова — не логировать ее как «не полученную»
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.inflight[key]
+
+    def report(self) -> str:
+        return (f"пропущено={self.allowed}, отклонено={self.throttled}, склеено={self.coalesced}, "
+                f"выполняется={len(self.inflight)}")
@@ -12,11 +12,89 @@ class Config:
     # 🗄️ URL базы данных из .env
     DATABASE_URL = os.getenv("DATABASE_URL")
 
+    # 🌐 Адрес Bot API (пусто — api.telegram.org). Для локального Bot API или loadtest/fake_bot_api.py
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+
+    # 🔌 Пулы соединений с Bot API: getUpdates — отдельное соединение, остальные вызовы — пул TELEGRAM_POOL_SIZE.
+    # Таймауты в секундах; TELEGRAM_METHOD_TIMEOUTS — свои таймауты методов ("sendPhoto=60,sendMediaGroup=90")
+    TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "16"))
+    TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "30"))
+    TELEGRAM_KEEPALIVE_SECONDS = float(os.getenv("TELEGRAM_KEEPALIVE_SECONDS", "60"))
+    TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2") == "1"
+    TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "10"))
+    TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "10"))
+    TELEGRAM_METHOD_TIMEOUTS = os.getenv("TELEGRAM_METHOD_TIMEOUTS", "sendPhoto=60,sendMediaGroup=90,sendDocument=90")
+
     # 👤 ID администратора для уведомлений
     ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")
 
+    # 👨‍👩‍👧 Семья по умолчанию: ее видят чаты без своей семьи и администратор до /use_family
+    DEFAULT_FAMILY_ID = int(os.getenv("DEFAULT_FAMILY_ID", "1"))
+
     # ⏰ Время отправки уведомлений (9:00 утра)
     NOTIFICATION_TIME =  "09:00"
+    # 🕰️ Планировщик: допустимое опоздание запуска задачи (сек.)
+    SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "3600"))
+    # Сколько часов после NOTIFICATION_TIME при старте бота догоняется пропущенная рассылка
+    NOTIFICATION_CATCHUP_HOURS = float(os.getenv("NOTIFICATION_CATCHUP_HOURS", "12"))
+    # С какого опоздания запуска задачи (сек.) писать предупреждение в лог
+    JOB_LAG_WARN_SECONDS = float(os.getenv("JOB_LAG_WARN_SECONDS", "1"))
+
+    # ⏰ Напоминания заранее (/remind): шаг колеса таймеров (сек.) и максимум дней заранее
+    REMINDER_TICK_SECONDS = float(os.getenv("REMINDER_TICK_SECONDS", "30"))
+    REMINDER_MAX_DAYS = int(os.getenv("REMINDER_MAX_DAYS", "60"))
+    # Пауза между напоминаниями одного тика (сек.): 1000 подписок на одно время уходят примерно за минуту
+    REMINDER_SEND_DELAY = float(os.getenv("REMINDER_SEND_DELAY", "0.05"))
+
+    # 📨 Отправка уведомлений: сколько сообщений в пачке и пауза между пачками (сек.)
+    NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "1"))
+    NOTIFICATION_SEND_DELAY = float(os.getenv("NOTIFICATION_SEND_DELAY", "0.5"))
+
+    # 🗓️ Дайджесты (/digest): пауза между сообщениями при рассылке (сек.)
+    DIGEST_SEND_DELAY = float(os.getenv("DIGEST_SEND_DELAY", "0.1"))
+
+    # 🖼️ После скольких ошибок Telegram file_id считается испорченным (отправляем текст без фото)
+    FILE_ID_MAX_FAILURES = int(os.getenv("FILE_ID_MAX_FAILURES", "1"))
+    # 🌙 Время ночной проверки всех file_id (ЧЧ:ММ UTC)
+    FILE_ID_VALIDATION_TIME = os.getenv("FILE_ID_VALIDATION_TIME", "03:00")
+
+    # 🧠 Кэш чтений из базы: время жизни записи (сек.) и максимум записей
+    CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+
+    # 🌟 Вехи (10 000 дней, юбилеи): горизонт расчета и за сколько дней предупреждать о юбилее
+    MILESTONE_HORIZON_DAYS = int(os.getenv("MILESTONE_HORIZON_DAYS", "400"))
+    MILESTONE_NOTICE_DAYS = int(os.getenv("MILESTONE_NOTICE_DAYS", "7"))
+
+    # 🔤 Где склонять имена (pymorphy3): "thread" (пул потоков), "process" (пул процессов) или "inline"
+    MORPHOLOGY_EXECUTOR = os.getenv("MORPHOLOGY_EXECUTOR", "thread").lower()
+    MORPHOLOGY_WORKERS = int(os.getenv("MORPHOLOGY_WORKERS", "2"))
+
+    # 📅 Календари семей (.ics): порт HTTP-сервера (0 — выключен), внешний адрес для ссылок и секрет ссылок
+    CALENDAR_PORT = int(os.getenv("CALENDAR_PORT", "0"))
+    CALENDAR_PUBLIC_URL = os.getenv("CALENDAR_PUBLIC_URL", "").rstrip("/")
+    CALENDAR_SECRET = os.getenv("CALENDAR_SECRET")
+
+    # 🚦 Ограничение частоты тяжелых команд чтения (/today, /list, /stats, ...): не больше N
+    # команд от пользователя / в чате за окно (сек.). Записи администратора не ограничиваются
+    THROTTLE_USER_LIMIT = int(os.getenv("THROTTLE_USER_LIMIT", "5"))
+    THROTTLE_CHAT_LIMIT = int(os.getenv("THROTTLE_CHAT_LIMIT", "20"))
+    THROTTLE_WINDOW_SECONDS = float(os.getenv("THROTTLE_WINDOW_SECONDS", "60"))
+
+    # 🔭 Трассировка обновлений: "" (выключена), "console" или "file"
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+    TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+
+    # 🩺 Монитор цикла событий: период замеров (сек.), порог задержки (мс) и отладочный режим
+    # (asyncio debug + сообщения о синхронных SQL-запросах в потоке цикла)
+    LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "200"))
+    LOOP_DEBUG = os.getenv("LOOP_DEBUG") == "1"
+
+    # 🔥 Снимок горячего состояния для быстрого перезапуска (пусто — выключен) и период его записи (мин.)
+    WARM_SNAPSHOT_PATH = os.getenv("WARM_SNAPSHOT_PATH", "warm_snapshot.bin")
+    WARM_SNAPSHOT_INTERVAL_MINUTES = int(os.getenv("WARM_SNAPSHOT_INTERVAL_MINUTES", "15"))
+
     # 📸 ID ФОТОГРАФИИ для приветствия в команде /start
     # Вставьте сюда ID, полученный через команду /file_id
     GREETING_PHOTO_ID = 'AgACAgIAAxkBAAIBEmki_F_A1RzIwZ9i3Cc8L10TWSK6AAKvC2sbu_EYSdCjHZXUbZG2AQADAgADeQADNgQ'
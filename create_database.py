@@ -1,13 +1,14 @@
 from database.connection import engine, Base
 from database.models import FamilyMember, FamilyEvent
+from database.schema import ensure_schema
 
 
 def create_tables():
     """Создает все таблицы в базе данных"""
     print("🔄 Создание таблиц в базе данных...")
 
-    # 🎯 Создаем все таблицы из моделей
-    Base.metadata.create_all(bind=engine)
+    # 🎯 Пустая база — таблицы из моделей и отметка alembic head; иначе — проверка миграций
+    ensure_schema(engine, Base.metadata)
 
     print("✅ Таблицы успешно созданы!")
     print("📊 Созданные таблицы:")
@@ -15,9 +15,39 @@ if not DATABASE_URL:
 	raise ValueError("FATAL ERROR: DATABASE_URL не найдена в окружении.")
 
 # 2. Используем считанную переменную для создания движка.
-engine = create_engine(DATABASE_URL, connect_args={"sslmode": "require"})
+#    sslmode можно переопределить (например, disable для локальных Postgres).
+DATABASE_SSLMODE = os.getenv('DATABASE_SSLMODE', 'require')
+engine = create_engine(DATABASE_URL, connect_args={"sslmode": DATABASE_SSLMODE})
+
+# 3. Необязательная реплика для чтения (см. database/routing.py)
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+replica_engine = create_engine(DATABASE_REPLICA_URL, connect_args={"sslmode": DATABASE_SSLMODE}) \
+	if DATABASE_REPLICA_URL else None
+
+# 4. Профилирование SQL (только при DB_PROFILING=1)
+from database.profiling import profiler, install as install_profiler
+if profiler.enabled:
+	install_profiler(engine)
+	if replica_engine is not None:
+		install_profiler(replica_engine)
+
+# 5. Поиск соединений, удерживаемых дольше SESSION_LEAK_SECONDS (см. database/sessions.py)
+from database.sessions import leak_detector
+leak_detector.install(engine)
+if replica_engine is not None:
+	leak_detector.install(replica_engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) \
+	if replica_engine is not None else None
+
+# 6. Чтения — на реплику, записи (и чтения сразу после них) — в основную базу
+from database.routing import SessionRouter
+router = SessionRouter(
+	SessionLocal,
+	ReplicaSessionLocal,
+	read_after_write_seconds=float(os.getenv('READ_AFTER_WRITE_SECONDS', '5')),
+)
 Base = declarative_base()
 
 def get_db():
@@ -1,6 +1,6 @@
 # Файл: database/models.py
 
-from sqlalchemy import Column, Integer, String, Date, Text, Boolean, JSON, Enum, func
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Text, Boolean, JSON, Enum, ForeignKey, Index, UniqueConstraint, func, extract
 from sqlalchemy.orm import Mapped, mapped_column 
 from datetime import date, datetime 
 import enum
@@ -15,11 +15,26 @@ class EventType(enum.Enum):
     OTHER = "other"       # Другое событие
 
 
+class Family(Base):
+    """Семья: все члены семьи и события принадлежат одной семье (один бот — много семей)"""
+    __tablename__ = 'families'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+    # Чат семьи: команды из него видят только эту семью, сюда же идет ежедневная рассылка
+    chat_id: Mapped[int | None] = mapped_column(BigInteger, unique=True, nullable=True)
+    created_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"Family(id={self.id!r}, name={self.name!r})"
+
+
 class FamilyMember(Base):
     """Модель для хранения членов семьи"""
     __tablename__ = 'family_members'
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey('families.id', ondelete='CASCADE'))
     name: Mapped[str] = mapped_column(String(100))
     birth_date: Mapped[date] = mapped_column(Date)
     
@@ -31,6 +46,13 @@ class FamilyMember(Base):
     # 🎯 НОВОЕ ПОЛЕ: Пол (M/F)
     gender = Column(String(1), nullable=True, default='M')
 
+    # 🔤 Формы имени (вычисляются при добавлении, см. services/declension.py)
+    name_genitive: Mapped[str | None] = mapped_column(String(150), nullable=True)
+    name_dative: Mapped[str | None] = mapped_column(String(150), nullable=True)
+    name_instrumental: Mapped[str | None] = mapped_column(String(150), nullable=True)
+    # Формы исправлены администратором вручную (/set_declension) — не пересчитывать
+    name_forms_manual: Mapped[bool] = mapped_column(Boolean, default=False)
+
     def __repr__(self) -> str:
         return f"FamilyMember(id={self.id!r}, name={self.name!r})"
 
@@ -40,6 +62,7 @@ class FamilyEvent(Base):
     __tablename__ = "family_events"
 
     id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey('families.id', ondelete='CASCADE'), nullable=False)
     title = Column(String(200), nullable=False)  # Название события
     event_date = Column(Date, nullable=False)  # Дата события
     
@@ -57,3 +80,133 @@ class FamilyEvent(Base):
     photo_ids = Column(JSON)  # Список ID фото (ВОЗВРАЩЕНО)
     recurring = Column(Boolean, default=True)  # Повторять ежегодно (ВОЗВРАЩЕНО)
     created_at = Column(Date, default=func.now())  # Дата создания записи (ВОЗВРАЩЕНО)
+
+    # 🔁 Правило повторения (подмножество RRULE, см. services/occurrences.py); пусто — ежегодно/однократно по recurring
+    recurrence_rule = Column(String(100), nullable=True)
+    # 📅 Ближайшая дата события (материализована при записи, по ней ищутся события на день)
+    next_occurrence = Column(Date, nullable=True, index=True)
+
+
+# Индексы начинаются с family_id: запросы одной семьи не читают чужие строки
+Index('ix_family_members_family_birthday', FamilyMember.family_id,
+      extract('month', FamilyMember.birth_date), extract('day', FamilyMember.birth_date))
+Index('ix_family_members_family_death_day', FamilyMember.family_id,
+      extract('month', FamilyMember.death_date), extract('day', FamilyMember.death_date))
+Index('ix_family_members_family_name', FamilyMember.family_id, FamilyMember.name)
+Index('ix_family_events_family_next_occurrence', FamilyEvent.family_id, FamilyEvent.next_occurrence)
+Index('ix_family_events_family_title', FamilyEvent.family_id, FamilyEvent.title)
+
+
+class TelegramFile(Base):
+    """Реестр file_id Telegram: успешные отправки и ошибки по каждой фотографии"""
+    __tablename__ = 'telegram_files'
+
+    file_id: Mapped[str] = mapped_column(String, primary_key=True)
+    # Постоянный идентификатор файла (не меняется между ботами и со временем)
+    file_unique_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    last_success_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_failure_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    failure_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"TelegramFile(file_id={self.file_id!r}, failures={self.failure_count!r})"
+
+
+class RelationType(enum.Enum):
+    """Типы родственных связей"""
+    PARENT = "parent"  # member — родитель relative
+    SPOUSE = "spouse"  # member и relative — супруги
+
+
+class FamilyRelationship(Base):
+    """Связь между двумя членами семьи (ребро семейного дерева)"""
+    __tablename__ = 'family_relationships'
+    __table_args__ = (
+        UniqueConstraint('member_id', 'relative_id', 'relation_type', name='uq_family_relationship'),
+        Index('ix_family_relationships_relative_id', 'relative_id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    member_id: Mapped[int] = mapped_column(ForeignKey('family_members.id', ondelete='CASCADE'))
+    relative_id: Mapped[int] = mapped_column(ForeignKey('family_members.id', ondelete='CASCADE'))
+    # Храним строкой ('parent'/'spouse'), чтобы не заводить новый ENUM в Postgres
+    relation_type: Mapped[str] = mapped_column(String(10))
+    # Для супругов — дата свадьбы (если известна)
+    since_date: Mapped[date | None] = mapped_column(Date, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"FamilyRelationship({self.member_id!r} -{self.relation_type}-> {self.relative_id!r})"
+
+
+class DataVersion(Base):
+    """Счетчик изменений данных: увеличивается при каждой записи через FamilyRepository"""
+    __tablename__ = 'data_versions'
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return f"DataVersion({self.name!r}={self.version!r})"
+
+
+class JobRun(Base):
+    """Последний запуск задачи планировщика (чтобы догонять пропущенные рассылки после перезапуска)"""
+    __tablename__ = 'job_runs'
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    last_run_on: Mapped[date | None] = mapped_column(Date, nullable=True)
+    last_run_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"JobRun({self.name!r}, {self.last_run_on!r})"
+
+
+class ReminderSubscription(Base):
+    """Подписка чата на напоминания заранее (за days_before дней) о событиях своей семьи"""
+    __tablename__ = 'reminder_subscriptions'
+    __table_args__ = (UniqueConstraint('chat_id', 'days_before', name='uq_reminder_chat_days'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey('families.id', ondelete='CASCADE'), index=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    days_before: Mapped[int] = mapped_column(Integer)
+    # Время отправки ЧЧ:ММ (UTC); пусто — NOTIFICATION_TIME
+    fire_time: Mapped[str | None] = mapped_column(String(5), nullable=True)
+    created_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"ReminderSubscription(chat_id={self.chat_id!r}, days_before={self.days_before!r})"
+
+
+class DigestSubscription(Base):
+    """Подписка чата на дайджест дат своей семьи: period — "weekly" (по понедельникам) или "monthly" (1-го числа)"""
+    __tablename__ = 'digest_subscriptions'
+    __table_args__ = (UniqueConstraint('chat_id', 'period', name='uq_digest_chat_period'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    family_id: Mapped[int] = mapped_column(ForeignKey('families.id', ondelete='CASCADE'), index=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    period: Mapped[str] = mapped_column(String(10))
+    created_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"DigestSubscription(chat_id={self.chat_id!r}, period={self.period!r})"
+
+
+class FamilyStat(Base):
+    """
+    Счетчик статистики семьи (services/family_stats.py): bucket — вид счетчика
+    ("living", "birth_year", "birthday_month", ...), key — год или месяц (0, если не нужен).
+    Обновляется в той же транзакции, что и запись члена семьи или события.
+    """
+    __tablename__ = 'family_stats'
+
+    family_id: Mapped[int] = mapped_column(ForeignKey('families.id', ondelete='CASCADE'), primary_key=True)
+    bucket: Mapped[str] = mapped_column(String(20), primary_key=True)
+    key: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return f"FamilyStat({self.family_id!r}, {self.bucket!r}, {self.key!r}={self.count!r})"
@@ -0,0 +1,120 @@
+"""
+Профилирование SQL-запросов.
+
+Включается переменной окружения DB_PROFILING=1. Каждый запрос
+привязывается к текущей «области» — обновлению Telegram или задаче
+планировщика: сколько запросов выполнено, сколько времени заняли и какой
+был самым медленным. Самые медленные запросы с момента запуска хранятся
+для админской команды /perf.
+"""
+import heapq
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+
+@dataclass
+class ScopeStats:
+    """Статистика запросов в рамках одного обновления или задачи."""
+    name: str
+    statements: int = 0
+    total_time: float = 0.0
+    slowest_time: float = 0.0
+    slowest_statement: str | None = None
+
+
+_current_scope: ContextVar[ScopeStats | None] = ContextVar("db_profile_scope", default=None)
+
+
+class QueryProfiler:
+    def __init__(self, enabled: bool, warn_ms: float, warn_statements: int, keep_top: int):
+        self.enabled = enabled
+        self.warn_ms = warn_ms
+        self.warn_statements = warn_statements
+        self.keep_top = keep_top
+        self._slowest = []  # min-heap (время, номер, запрос, область)
+        self._counter = 0
+        self.total_statements = 0
+        self.total_time = 0.0
+
+    def record(self, statement: str, duration: float):
+        """Учитывает один выполненный запрос."""
+        scope = _current_scope.get()
+        scope_name = scope.name if scope else "вне обновления"
+
+        self.total_statements += 1
+        self.total_time += duration
+
+        if scope is not None:
+            scope.statements += 1
+            scope.total_time += duration
+            if duration > scope.slowest_time:
+                scope.slowest_time = duration
+                scope.slowest_statement = statement
+
+        self._counter += 1
+        entry = (duration, self._counter, " ".join(statement.split()), scope_name)
+        if len(self._slowest) < self.keep_top:
+            heapq.heappush(self._slowest, entry)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @contextmanager
+    def scope(self, name: str):
+        """Привязывает все запросы внутри блока к области name."""
+        if not self.enabled:
+            yield None
+            return
+
+        stats = ScopeStats(name=name)
+        token = _current_scope.set(stats)
+        try:
+            yield stats
+        finally:
+            _current_scope.reset(token)
+            self._report(stats)
+
+    def _report(self, stats: ScopeStats):
+        total_ms = stats.total_time * 1000
+        if total_ms >= self.warn_ms or stats.statements >= self.warn_statements:
+            slowest = " ".join((stats.slowest_statement or "").split())[:200]
+            print(
+                f"⚠️ SQL [{stats.name}]: запросов={stats.statements}, время={total_ms:.1f}ms, "
+                f"самый медленный={stats.slowest_time * 1000:.1f}ms: {slowest}"
+            )
+
+    def top(self, n: int = None) -> list:
+        """Самые медленные запросы с момента запуска: [(время, запрос, область)]."""
+        entries = sorted(self._slowest, reverse=True)[:n or self.keep_top]
+        return [(duration, statement, scope_name) for duration, _, statement, scope_name in entries]
+
+
+profiler = QueryProfiler(
+    enabled=os.getenv("DB_PROFILING") == "1",
+    warn_ms=float(os.getenv("DB_PROFILING_WARN_MS", "200")),
+    warn_statements=int(os.getenv("DB_PROFILING_WARN_STATEMENTS", "20")),
+    keep_top=int(os.getenv("DB_PROFILING_TOP_N", "20")),
+)
+
+
+def install(engine):
+    """Подключает профилировщик к событиям SQLAlchemy для engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start_time"].pop()
+        profiler.record(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # Запрос упал — убираем его время старта, чтобы стек не рос
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
@@ -0,0 +1,65 @@
+"""
+Маршрутизация сессий между основной базой и репликой для чтения.
+
+Чтения (события на сегодня, список членов семьи, поиск, ближайшие даты)
+идут на реплику, если она задана (DATABASE_REPLICA_URL). Записи всегда идут
+в основную базу, и в течение READ_AFTER_WRITE_SECONDS после записи чтения
+тоже читаются из основной — так администратор сразу видит свои изменения,
+даже если реплика отстает. Каждое решение учитывается в счетчиках для /perf.
+"""
+import time
+from collections import Counter
+
+# Причины выбора базы (ключи счетчиков)
+ROUTE_REPLICA = "replica"
+ROUTE_PRIMARY_NO_REPLICA = "primary:no_replica"
+ROUTE_PRIMARY_AFTER_WRITE = "primary:after_write"
+ROUTE_PRIMARY_WRITE = "primary:write"
+
+
+class SessionRouter:
+    def __init__(self, primary_factory, replica_factory=None, read_after_write_seconds: float = 5.0):
+        self.primary_factory = primary_factory
+        self.replica_factory = replica_factory
+        self.read_after_write_seconds = read_after_write_seconds
+        self.decisions = Counter()
+        self._last_write_at = None
+
+    @property
+    def has_replica(self) -> bool:
+        return self.replica_factory is not None
+
+    def _recently_written(self) -> bool:
+        return (self._last_write_at is not None
+                and time.monotonic() - self._last_write_at < self.read_after_write_seconds)
+
+    def read_session(self):
+        """Сессия только для чтения: реплика, если она есть и не было свежей записи."""
+        if not self.has_replica:
+            route = ROUTE_PRIMARY_NO_REPLICA
+        elif self._recently_written():
+            route = ROUTE_PRIMARY_AFTER_WRITE
+        else:
+            route = ROUTE_REPLICA
+        self.decisions[route] += 1
+        return self.replica_factory() if route == ROUTE_REPLICA else self.primary_factory()
+
+    def write_session(self):
+        """Сессия для записи (и для чтений, после которых будет запись) — всегда основная база."""
+        self.decisions[ROUTE_PRIMARY_WRITE] += 1
+        return self.primary_factory()
+
+    def note_write(self):
+        """Отмечает успешную запись: ближайшие чтения пойдут в основную базу."""
+        self._last_write_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"has_replica": self.has_replica, **self.decisions}
+
+
+def format_routing(stats: dict) -> str:
+    """Одна строка для /perf: куда ушли чтения и записи."""
+    if not stats.get("has_replica"):
+        return f"реплика не задана, сессий={stats.get(ROUTE_PRIMARY_NO_REPLICA, 0) + stats.get(ROUTE_PRIMARY_WRITE, 0)}"
+    return (f"реплика={stats.get(ROUTE_REPLICA, 0)}, основная после записи={stats.get(ROUTE_PRIMARY_AFTER_WRITE, 0)}, "
+            f"основная на запись={stats.get(ROUTE_PRIMARY_WRITE, 0)}")
@@ -0,0 +1,56 @@
+"""
+Проверка схемы при старте бота.
+
+Схемой управляет Alembic (migrations/versions). Раньше бот при импорте
+вызывал Base.metadata.create_all — это молча создавало новые таблицы, но не
+новые колонки и индексы, а на большой таблице могло взять блокировку в
+самый час рассылки. Теперь:
+
+- пустая база (первый запуск, локальная разработка) — create_all и
+  alembic stamp head: таблицы сразу в последнем состоянии;
+- иначе только сверяем ревизию базы с последней ревизией в репозитории и
+  предупреждаем, если миграции не применены. Применяются они отдельно,
+  до запуска бота: `alembic upgrade head` (preDeployCommand в railway.toml).
+"""
+import os
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def alembic_config() -> AlembicConfig:
+    config = AlembicConfig(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(engine) -> str | None:
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def ensure_schema(engine, metadata) -> str:
+    """Создает схему в пустой базе или проверяет, что миграции применены. Возвращает статус для лога."""
+    if "family_members" not in inspect(engine).get_table_names():
+        metadata.create_all(bind=engine)
+        command.stamp(alembic_config(), "head")
+        status = f"создана с нуля, ревизия {head_revision()}"
+        print(f"✅ Схема базы {status}.")
+        return status
+
+    current, head = current_revision(engine), head_revision()
+    if current != head:
+        status = f"ревизия базы {current or 'не задана'}, последняя {head}"
+        print(f"⚠️ Схема базы отстает ({status}). Выполните: alembic upgrade head")
+        return status
+    print(f"✅ Схема базы актуальна (ревизия {head}).")
+    return f"ревизия {head}"
@@ -0,0 +1,149 @@
+"""
+Жизненный цикл сессий и поиск утечек соединений.
+
+- session_scope(name) оборачивает каждое обновление Telegram и задачу
+  планировщика. Все сессии, начавшие транзакцию внутри области, к ее концу
+  должны быть закрыты; забытые сессии откатываются и закрываются
+  автоматически (с сообщением, какой хендлер их оставил), поэтому ранний
+  return в хендлере не может унести соединение из пула.
+- ConnectionLeakDetector следит за соединениями, выданными пулом, и сообщает
+  о каждом, которое удерживается дольше SESSION_LEAK_SECONDS: кем (хендлер
+  или задача) и где (строка кода проекта) оно было взято. При выдаче
+  соединения запоминается только кадр стека (sys._getframe) — строка кода
+  ищется по нему лишь для соединения, которое оказалось утечкой.
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_scope_name: ContextVar[str | None] = ContextVar("session_scope_name", default=None)
+_scope_sessions: ContextVar[list | None] = ContextVar("session_scope_sessions", default=None)
+
+
+@event.listens_for(Session, "after_begin")
+def _register_session(session, transaction, connection):
+    """Запоминает сессию, взявшую соединение, в текущей области."""
+    sessions = _scope_sessions.get()
+    if sessions is not None and session not in sessions:
+        sessions.append(session)
+
+
+def current_scope_name() -> str:
+    return _scope_name.get() or f"вне обновления ({threading.current_thread().name})"
+
+
+@contextmanager
+def session_scope(name: str):
+    """Область обновления или задачи: по выходу все ее сессии гарантированно закрыты."""
+    sessions = []
+    name_token = _scope_name.set(name)
+    sessions_token = _scope_sessions.set(sessions)
+    try:
+        yield
+    finally:
+        _scope_sessions.reset(sessions_token)
+        _scope_name.reset(name_token)
+        leaked = [session for session in sessions if session.in_transaction()]
+        for session in leaked:
+            session.rollback()
+            session.close()
+        if leaked:
+            leak_detector.unclosed_sessions += len(leaked)
+            print(f"⚠️ [{name}] не закрыл сессий: {len(leaked)} — откатили и вернули соединения в пул.")
+
+
+def call_site(frame) -> str:
+    """Ближайшая к кадру frame строка кода проекта (без библиотек и этого модуля)."""
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(PROJECT_ROOT) and "site-packages" not in filename
+                and not filename.endswith("sessions.py")):
+            return f"{filename[len(PROJECT_ROOT) + 1:]}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class ConnectionLeakDetector:
+    def __init__(self, threshold_seconds: float):
+        self.threshold_seconds = threshold_seconds
+        self.checked_out = {}  # id(dbapi-соединения) -> [взято в, область, кадр стека, сообщено?]
+        self.engines = []
+        self.checkouts = 0
+        self.leaks = 0
+        self.unclosed_sessions = 0
+        self.max_held = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def install(self, engine):
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        self.engines.append(engine)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        # Каждая выдача — только ссылка на кадр; разбор стека — в check(), и только для утечек
+        entry = [time.monotonic(), current_scope_name(), sys._getframe(1), False]
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out[id(dbapi_connection)] = entry
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            entry = self.checked_out.pop(id(dbapi_connection), None)
+        if entry:
+            self.max_held = max(self.max_held, time.monotonic() - entry[0])
+
+    def check(self) -> list:
+        """Соединения, удерживаемые дольше порога (каждое сообщается один раз)."""
+        now = time.monotonic()
+        found = []
+        with self._lock:
+            for entry in self.checked_out.values():
+                held = now - entry[0]
+                if held >= self.threshold_seconds and not entry[3]:
+                    entry[3] = True
+                    self.leaks += 1
+                    found.append((held, entry[1], entry[2]))
+        found = [(held, scope_name, call_site(frame)) for held, scope_name, frame in found]
+        for held, scope_name, site in found:
+            print(f"🚰 Соединение с базой удерживается {held:.1f}с: [{scope_name}] {site}")
+        return found
+
+    def start(self):
+        if self.threshold_seconds <= 0:
+            return
+        threading.Thread(target=self._run, name="db-leak-detector", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(max(1.0, self.threshold_seconds / 2)):
+            self.check()
+
+    def stats(self) -> dict:
+        return {
+            "checked_out": len(self.checked_out),
+            "checkouts": self.checkouts,
+            "leaks": self.leaks,
+            "unclosed_sessions": self.unclosed_sessions,
+            "max_held_ms": self.max_held * 1000,
+            "pools": [engine.pool.status() for engine in self.engines],
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"выдано сейчас={stats['checked_out']}, всего выдач={stats['checkouts']}, "
+                f"утечек={stats['leaks']}, незакрытых сессий={stats['unclosed_sessions']}, "
+                f"макс. удержание={stats['max_held_ms']:.0f}ms")
+
+
+leak_detector = ConnectionLeakDetector(float(os.getenv("SESSION_LEAK_SECONDS", "10")))
@@ -0,0 +1,259 @@
+"""
+Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+Реализует getUpdates (long polling), sendMessage, sendPhoto, sendMediaGroup,
+setMyCommands и служебные методы, которые вызывает python-telegram-bot при
+запуске (getMe, deleteWebhook, getFile). Поддерживает:
+- задержку ответа (--latency-ms 20:80 — случайно в диапазоне);
+- долю ответов 429 с retry_after (--rate-limit 0.05 --retry-after 1);
+- долю ошибок 400 (--error-rate 0.01; для sendPhoto — «wrong file identifier»).
+
+Служебные адреса для генератора нагрузки:
+    POST /fake/updates  — JSON-список обновлений (update_id проставляется сервером)
+    GET  /fake/stats    — счетчики по методам
+    POST /fake/reset    — сброс счетчиков
+
+Запуск отдельно:
+    python -m loadtest.fake_bot_api --port 8081 --latency-ms 20:80 --rate-limit 0.02
+и затем бот с TELEGRAM_API_URL=http://127.0.0.1:8081.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from tornado.web import Application, RequestHandler
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendMediaGroup"}
+
+
+def parse_params(request) -> dict:
+    """Параметры запроса: python-telegram-bot шлет форму, где не-строки закодированы в JSON."""
+    if request.headers.get("Content-Type", "").startswith("application/json") and request.body:
+        return json.loads(request.body)
+
+    params = {}
+    for name, values in request.arguments.items():
+        value = values[-1].decode("utf-8")
+        try:
+            params[name] = json.loads(value) if value[:1] in "[{-0123456789tfn" else value
+        except ValueError:
+            params[name] = value
+    return params
+
+
+class FakeBotApi:
+    """Состояние фейкового сервера: очередь обновлений, чаты и счетчики."""
+
+    def __init__(self, latency_ms=(0.0, 0.0), rate_limit: float = 0.0, retry_after: int = 1,
+                 error_rate: float = 0.0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.updates = []  # [(update_id, update)]
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.new_updates = asyncio.Condition()
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.errors = Counter()
+        self.sent_messages = 0
+
+    # --- ОБНОВЛЕНИЯ ---
+
+    async def push_updates(self, updates: list) -> list:
+        ids = []
+        async with self.new_updates:
+            for update in updates:
+                update = dict(update, update_id=self.next_update_id)
+                self.updates.append((self.next_update_id, update))
+                ids.append(self.next_update_id)
+                self.next_update_id += 1
+            self.new_updates.notify_all()
+        return ids
+
+    async def get_updates(self, offset: int = 0, limit: int = 100, timeout: float = 0) -> list:
+        # offset подтверждает все обновления до него — как у настоящего Bot API
+        self.updates = [(update_id, update) for update_id, update in self.updates if update_id >= (offset or 0)]
+        if not self.updates and timeout:
+            async with self.new_updates:
+                try:
+                    await asyncio.wait_for(self.new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return [update for _, update in self.updates[:limit or 100]]
+
+    # --- ОТВЕТЫ ---
+
+    def message(self, chat_id, **fields) -> dict:
+        message = {
+            "message_id": self.next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            **fields,
+        }
+        self.next_message_id += 1
+        self.sent_messages += 1
+        return message
+
+    @staticmethod
+    def photo_sizes(file_id: str) -> list:
+        return [{"file_id": file_id, "file_unique_id": f"u{abs(hash(file_id))}", "width": 320, "height": 320}]
+
+    async def call(self, method: str, params: dict) -> tuple:
+        """Возвращает (HTTP-код, тело ответа Bot API)."""
+        self.calls[method] += 1
+        if method == "getUpdates":
+            result = await self.get_updates(int(params.get("offset", 0)), int(params.get("limit", 100)),
+                                            float(params.get("timeout", 0)))
+            return 200, {"ok": True, "result": result}
+
+        low, high = self.latency_ms
+        if high:
+            await asyncio.sleep(self.random.uniform(low, high) / 1000)
+
+        if method in SEND_METHODS:
+            if self.random.random() < self.rate_limit:
+                self.rate_limited[method] += 1
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}
+            if self.random.random() < self.error_rate:
+                self.errors[method] += 1
+                description = ("Bad Request: wrong file identifier/HTTP URL specified"
+                               if method == "sendPhoto" else "Bad Request: fake error")
+                return 400, {"ok": False, "error_code": 400, "description": description}
+
+        return 200, {"ok": True, "result": self.result_for(method, params)}
+
+    def result_for(self, method: str, params: dict):
+        chat_id = params.get("chat_id", 0)
+        if method == "getMe":
+            return {"id": 100000, "is_bot": True, "first_name": "FakeFamilyBot", "username": "fake_family_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if method == "sendMessage":
+            return self.message(chat_id, text=params.get("text", ""))
+        if method == "sendPhoto":
+            return self.message(chat_id, photo=self.photo_sizes(str(params.get("photo"))),
+                                caption=params.get("caption"))
+        if method == "sendMediaGroup":
+            return [self.message(chat_id, photo=self.photo_sizes(str(item.get("media"))))
+                    for item in params.get("media", [])]
+        if method == "getFile":
+            file_id = params.get("file_id")
+            return {"file_id": file_id, "file_unique_id": f"u{abs(hash(file_id))}",
+                    "file_size": 1024, "file_path": "photos/fake.jpg"}
+        # setMyCommands, deleteWebhook и прочие методы без содержательного ответа
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "errors": dict(self.errors),
+            "sent_messages": self.sent_messages,
+            "pending_updates": len(self.updates),
+        }
+
+
+# ----------------------------------------------------
+# --- HTTP ---
+# ----------------------------------------------------
+
+class BotMethodHandler(RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    async def post(self, token, method):
+        code, body = await self.api.call(method, parse_params(self.request))
+        self.set_status(code)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body, ensure_ascii=False))
+
+    get = post
+
+
+class ControlHandler(RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    async def post(self, action):
+        if action == "updates":
+            ids = await self.api.push_updates(json.loads(self.request.body))
+            return self.finish({"update_ids": ids})
+        if action == "reset":
+            self.api.reset()
+            return self.finish({"ok": True})
+        self.send_error(404)
+
+    def get(self, action):
+        if action == "stats":
+            return self.finish(self.api.stats())
+        self.send_error(404)
+
+
+def make_app(api: FakeBotApi) -> Application:
+    return Application([
+        (r"/fake/(\w+)", ControlHandler, {"api": api}),
+        (r"/bot([^/]+)/(\w+)", BotMethodHandler, {"api": api}),
+    ], log_function=lambda handler: None)  # 429/400 здесь — норма, их считает /fake/stats
+
+
+def start_in_thread(api: FakeBotApi, port: int = 0) -> str:
+    """Запускает сервер в отдельном потоке со своим циклом событий и возвращает его адрес."""
+    started = threading.Event()
+    address = {}
+
+    def serve():
+        from tornado.netutil import bind_sockets
+        from tornado.httpserver import HTTPServer
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        sockets = bind_sockets(port, "127.0.0.1")
+        server = HTTPServer(make_app(api))
+        server.add_sockets(sockets)
+        address["url"] = f"http://127.0.0.1:{sockets[0].getsockname()[1]}"
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name="fake-bot-api", daemon=True).start()
+    started.wait()
+    return address["url"]
+
+
+def parse_latency(value: str) -> tuple:
+    low, _, high = value.partition(":")
+    return float(low), float(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фейковый Telegram Bot API для нагрузочных тестов")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=parse_latency, default=(0.0, 0.0), help="задержка, например 20:80")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429 (сек.)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 400")
+    args = parser.parse_args()
+
+    async def serve():
+        api = FakeBotApi(args.latency_ms, args.rate_limit, args.retry_after, args.error_rate)
+        make_app(api).listen(args.port, "127.0.0.1")
+        print(f"✅ Фейковый Bot API слушает http://127.0.0.1:{args.port}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Генератор нагрузки: прогоняет тысячи синтетических обновлений /today, /list и
+/add_member через настоящий FamilyBot (ApplicationBuilder → фейковый Bot API)
+и печатает пропускную способность и перцентили задержки.
+
+Задержка обновления — от момента, когда оно попало в очередь getUpdates, до
+конца его обработки всеми хендлерами (включая все ответы в Bot API).
+
+    python -m loadtest.generate_load --updates 5000 --rate 200 --latency-ms 20:80 --rate-limit 0.01
+    python -m loadtest.generate_load --api-url http://127.0.0.1:8081 --notify-runs 20
+
+❗ /add_member пишет в базу из DATABASE_URL. Запускайте на отдельной базе;
+добавленные «Нагрузка* Тестовый» удаляются в конце (если не указан --keep-data).
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from loadtest.fake_bot_api import FakeBotApi, start_in_thread, parse_latency
+
+LOAD_SURNAME = "Тестовый"
+
+
+def parse_mix(value: str) -> dict:
+    """today=5,list=4,add_member=1 → веса команд."""
+    mix = {}
+    for part in value.split(","):
+        command, _, weight = part.partition("=")
+        mix[command.strip()] = float(weight or 1)
+    return mix
+
+
+def make_update(number: int, command: str, admin_chat_id: int) -> dict:
+    """Синтетическое обновление с командой (как его прислал бы Telegram)."""
+    if command == "add_member":
+        chat_id = admin_chat_id
+        text = f"/add_member Нагрузка{number} {LOAD_SURNAME} {random.choice('MF')} 01.01.{1950 + number % 70}"
+    else:
+        chat_id = 10_000_000 + number % 500  # Разные пользователи
+        text = f"/{command}"
+
+    command_length = len(text.split()[0])
+    return {
+        "message": {
+            "message_id": number,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": command_length}],
+        }
+    }
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def format_latencies(title: str, values: list) -> str:
+    ms = [value * 1000 for value in values]
+    return (f"{title}: p50={percentile(ms, 50):.1f}ms p90={percentile(ms, 90):.1f}ms "
+            f"p99={percentile(ms, 99):.1f}ms max={max(ms, default=0):.1f}ms")
+
+
+class LoadRun:
+    """Отправляет обновления в фейковый API и отмечает, когда бот закончил каждое."""
+
+    def __init__(self, api_url: str, total: int):
+        self.api_url = api_url
+        self.total = total
+        self.pushed_at = {}    # update_id -> время постановки в очередь
+        self.latencies = {}    # update_id -> задержка
+        self.commands = {}     # update_id -> команда
+        self.done = asyncio.Event()
+
+    async def on_update_processed(self, update, context):
+        """TypeHandler в последней группе: выполняется после всех хендлеров обновления."""
+        pushed_at = self.pushed_at.get(update.update_id)
+        if pushed_at is not None and update.update_id not in self.latencies:
+            self.latencies[update.update_id] = time.perf_counter() - pushed_at
+            if len(self.latencies) >= self.total:
+                self.done.set()
+
+    async def push(self, client: httpx.AsyncClient, updates: list, commands: list):
+        pushed_at = time.perf_counter()
+        response = await client.post(f"{self.api_url}/fake/updates", json=updates)
+        for update_id, command in zip(response.json()["update_ids"], commands):
+            self.pushed_at[update_id] = pushed_at
+            self.commands[update_id] = command
+
+    async def feed(self, mix: dict, rate: float, admin_chat_id: int):
+        """Подает обновления с постоянной частотой rate в секунду (0 — все сразу)."""
+        commands = random.choices(list(mix), weights=list(mix.values()), k=self.total)
+        async with httpx.AsyncClient() as client:
+            if not rate:
+                updates = [make_update(number, command, admin_chat_id) for number, command in enumerate(commands)]
+                return await self.push(client, updates, commands)
+
+            started = time.perf_counter()
+            sent = 0
+            while sent < self.total:
+                due = min(self.total, int((time.perf_counter() - started) * rate) + 1)
+                if due > sent:
+                    chunk = commands[sent:due]
+                    updates = [make_update(sent + offset, command, admin_chat_id)
+                               for offset, command in enumerate(chunk)]
+                    await self.push(client, updates, chunk)
+                    sent = due
+                await asyncio.sleep(0.01)
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            f"📊 Обработано {len(self.latencies)} из {self.total} обновлений за {elapsed:.1f}с "
+            f"({len(self.latencies) / elapsed:.1f} обн./с)",
+            format_latencies("Все", list(self.latencies.values())),
+        ]
+        for command in sorted(set(self.commands.values())):
+            values = [latency for update_id, latency in self.latencies.items()
+                      if self.commands[update_id] == command]
+            lines.append(format_latencies(f"/{command} ({len(values)})", values))
+        return "\n".join(lines)
+
+
+async def run_notifications(bot, runs: int, chat_id: int):
+    """Несколько прогонов конвейера уведомлений (как /today) с замером времени."""
+    from services.notification_engine import NotificationEngine, TelegramSink
+
+    durations = []
+    for _ in range(runs):
+        engine = NotificationEngine(bot.notification_service, registry=bot.file_registry,
+                                    source=bot.repository, milestones=bot.milestones)
+        started = time.perf_counter()
+        await engine.run(TelegramSink(bot.application.bot, chat_id))
+        durations.append(time.perf_counter() - started)
+    print(format_latencies(f"📨 Рассылка ({runs} прогонов)", durations))
+
+
+def cleanup():
+    from database.connection import SessionLocal
+    from database.models import FamilyMember
+
+    db = SessionLocal()
+    try:
+        removed = db.query(FamilyMember).filter(
+            FamilyMember.name.like(f"Нагрузка% {LOAD_SURNAME}")
+        ).delete(synchronize_session=False)
+        db.commit()
+        print(f"🧹 Удалено тестовых членов семьи: {removed}")
+    finally:
+        db.close()
+
+
+async def main_async(args):
+    if args.api_url:
+        api_url = args.api_url.rstrip("/")
+    else:
+        api = FakeBotApi(args.latency_ms, args.rate_limit, args.retry_after, args.error_rate, seed=args.seed)
+        api_url = start_in_thread(api)
+        print(f"✅ Фейковый Bot API запущен: {api_url}")
+
+    # Бот должен смотреть на фейковый API; токен и админ — любые
+    from config import Config
+    Config.TELEGRAM_API_URL = api_url
+    Config.BOT_TOKEN = Config.BOT_TOKEN or "123456:LOADTEST"
+    Config.ADMIN_CHAT_ID = Config.ADMIN_CHAT_ID or "1"
+    from bot.main import FamilyBot
+
+    bot = FamilyBot()
+    load = LoadRun(api_url, args.updates)
+    bot.application.add_handler(TypeHandler(Update, load.on_update_processed), group=1000)
+
+    application = bot.application
+    await application.initialize()
+    await bot.set_commands(application)
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    try:
+        started = time.perf_counter()
+        await load.feed(parse_mix(args.mix), args.rate, int(Config.ADMIN_CHAT_ID))
+        try:
+            await asyncio.wait_for(load.done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Не все обновления обработаны за {args.timeout}с")
+        print(load.report(time.perf_counter() - started))
+
+        if args.notify_runs:
+            await run_notifications(bot, args.notify_runs, int(Config.ADMIN_CHAT_ID))
+
+        async with httpx.AsyncClient() as client:
+            stats = (await client.get(f"{api_url}/fake/stats")).json()
+        print(f"🌐 Вызовы Bot API: {stats['calls']}")
+        print(f"   429: {stats['rate_limited']}, ошибки: {stats['errors']}")
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        if not args.keep_data:
+            cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест FamilyBot на фейковом Bot API")
+    parser.add_argument("--updates", type=int, default=2000, help="сколько обновлений отправить")
+    parser.add_argument("--mix", default="today=5,list=4,add_member=1", help="веса команд")
+    parser.add_argument("--rate", type=float, default=0, help="обновлений в секунду (0 — все сразу)")
+    parser.add_argument("--timeout", type=float, default=600, help="сколько ждать обработки (сек.)")
+    parser.add_argument("--notify-runs", type=int, default=0, help="прогонов рассылки после обновлений")
+    parser.add_argument("--api-url", help="уже запущенный fake_bot_api (иначе запускается в потоке)")
+    parser.add_argument("--latency-ms", type=parse_latency, default=(0.0, 0.0), help="задержка, например 20:80")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 400")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--keep-data", action="store_true", help="не удалять добавленных членов семьи")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
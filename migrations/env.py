@@ -14,8 +14,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Alembic config
 config = context.config
 
-# Логирование
-if config.config_file_name is not None:
+# Логирование (не при вызове из бота — см. database/schema.py, иначе fileConfig отключит логгеры бота)
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
 # ✅ Подключаем метаданные моделей
@@ -0,0 +1,227 @@
+"""
+Помощники для миграций больших таблиц без долгих блокировок.
+
+Миграции выполняются на работающей базе, в том числе около 09:00, когда
+рассылка читает family_members и family_events. Поэтому:
+
+- индексы создаются CREATE INDEX CONCURRENTLY (вне транзакции миграции,
+  таблица остается доступной для записи);
+- новые колонки сначала добавляются nullable и без DEFAULT с вычислением —
+  это мгновенное изменение каталога, а не перезапись таблицы;
+- заполнение (backfill) идет пачками по первичному ключу, каждая пачка —
+  своя короткая транзакция, с паузой между пачками;
+- NOT NULL включается через CHECK ... NOT VALID + VALIDATE (проверка без
+  эксклюзивной блокировки), после чего SET NOT NULL не сканирует таблицу;
+- каждое DDL выполняется с lock_timeout: если блокировку не удалось взять
+  быстро, миграция падает, а не выстраивает очередь из запросов бота.
+
+На других СУБД (SQLite для локальной разработки) помощники выполняют
+обычные операции.
+"""
+import time
+from contextlib import contextmanager
+
+from alembic import op
+import sqlalchemy as sa
+
+LOCK_TIMEOUT = "3s"
+BATCH_SIZE = 1000
+BATCH_PAUSE_SECONDS = 0.05
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+@contextmanager
+def lock_timeout(timeout: str = LOCK_TIMEOUT):
+    """Ограничивает ожидание блокировки для DDL внутри блока (только PostgreSQL)."""
+    if is_postgres():
+        op.execute(f"SET lock_timeout = '{timeout}'")
+    try:
+        yield
+    finally:
+        if is_postgres():
+            op.execute("RESET lock_timeout")
+
+
+@contextmanager
+def outside_transaction():
+    """Блок вне транзакции миграции: каждая команда фиксируется сразу."""
+    with op.get_context().autocommit_block():
+        yield
+
+
+def has_column(table: str, column: str) -> bool:
+    return column in {info["name"] for info in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+# ----------------------------------------------------
+# --- ИНДЕКСЫ ---
+# ----------------------------------------------------
+
+def create_index_concurrently(name: str, table: str, columns: list, unique: bool = False, **kwargs):
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS. Не блокирует запись в таблицу.
+    Если построение прервалось, остается невалидный индекс — он удаляется и строится заново.
+    """
+    if not is_postgres():
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True, **kwargs)
+        return
+
+    with outside_transaction():
+        invalid = op.get_bind().execute(sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True,
+                        if_not_exists=True, **kwargs)
+
+
+def drop_index_concurrently(name: str, table: str):
+    if not is_postgres():
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with outside_transaction():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+# ----------------------------------------------------
+# --- КОЛОНКИ ---
+# ----------------------------------------------------
+
+def add_nullable_column(table: str, column: sa.Column):
+    """Добавляет колонку без перезаписи таблицы: только nullable и без вычисляемого DEFAULT."""
+    if not column.nullable:
+        raise ValueError(f"{table}.{column.name}: сначала добавьте колонку nullable, заполните ее, "
+                         f"затем включите NOT NULL через set_not_null()")
+    if has_column(table, column.name):
+        return
+    with lock_timeout():
+        op.add_column(table, column)
+
+
+def set_not_null(table: str, column: str):
+    """
+    Включает NOT NULL без долгой эксклюзивной блокировки: CHECK NOT VALID,
+    VALIDATE (сканирование без блокировки записи), затем SET NOT NULL по
+    уже проверенному ограничению.
+    """
+    if not is_postgres():
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(column, nullable=False)
+        return
+
+    constraint = f"{table}_{column}_not_null"
+    with outside_transaction():
+        with lock_timeout():
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK ({column} IS NOT NULL) NOT VALID")
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+        with lock_timeout():
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+
+
+# ----------------------------------------------------
+# --- ЗАПОЛНЕНИЕ ПАЧКАМИ ---
+# ----------------------------------------------------
+
+def backfill(table: str, set_clause: str, where: str, params: dict = None,
+             batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE_SECONDS) -> int:
+    """
+    UPDATE table SET set_clause WHERE where — пачками по batch_size строк,
+    каждая пачка в своей транзакции. where должно перестать выполняться для
+    обновленных строк (например, «колонка IS NULL»), иначе цикл не закончится.
+    """
+    total = 0
+    statement = sa.text(
+        f"UPDATE {table} SET {set_clause} WHERE id IN "
+        f"(SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT :batch_size)"
+    )
+    with outside_transaction():
+        while True:
+            updated = op.get_bind().execute(statement, {**(params or {}), "batch_size": batch_size}).rowcount
+            total += updated
+            if updated < batch_size:
+                break
+            time.sleep(pause)
+    print(f"  {table}: заполнено строк {total}")
+    return total
+
+
+def backfill_rows(table: str, columns: list, compute, where: str = "1 = 1", types: dict = None,
+                  batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE_SECONDS) -> int:
+    """
+    Заполнение, вычисляемое в Python (например, склонение имен): строки читаются
+    пачками по возрастанию id (keyset), compute(row) возвращает словарь новых
+    значений (или None — пропустить), пачка пишется одним executemany.
+    types — типы колонок для чтения ({"event_date": sa.Date()}), если драйвер
+    сам их не приводит (SQLite).
+    """
+    select = sa.text(
+        f"SELECT {', '.join(['id'] + columns)} FROM {table} "
+        f"WHERE id > :last_id AND ({where}) ORDER BY id LIMIT :batch_size"
+    ).columns(**(types or {}))
+    total = 0
+    last_id = 0
+    with outside_transaction():
+        while True:
+            rows = op.get_bind().execute(select, {"last_id": last_id, "batch_size": batch_size}).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            updates = []
+            for row in rows:
+                values = compute(row)
+                if values:
+                    updates.append({"id": row["id"], **values})
+            if updates:
+                set_clause = ", ".join(f"{name} = :{name}" for name in updates[0] if name != "id")
+                op.get_bind().execute(sa.text(f"UPDATE {table} SET {set_clause} WHERE id = :id"), updates)
+                total += len(updates)
+            time.sleep(pause)
+    print(f"  {table}: заполнено строк {total}")
+    return total
+
+
+# ----------------------------------------------------
+# --- СЧЕТЧИКИ СТАТИСТИКИ (family_stats) ---
+# ----------------------------------------------------
+
+def recount_family_stats():
+    """
+    Пересчитывает счетчики /stats всех семей с нуля: удаляет family_stats и
+    заполняет одним GROUP BY на счетчик (только чтение family_members и
+    family_events — запись в них не блокируется). Удаление и вставка — в
+    транзакции миграции, /stats не увидит пустых счетчиков. Дальше счетчики
+    ведет FamilyRepository (services/family_stats.py).
+    """
+    stats = sa.table('family_stats', sa.column('family_id', sa.Integer()), sa.column('bucket', sa.String()),
+                     sa.column('key', sa.Integer()), sa.column('count', sa.Integer()))
+    members = sa.table('family_members', sa.column('family_id', sa.Integer()),
+                       sa.column('birth_date', sa.Date()), sa.column('death_date', sa.Date()))
+    events = sa.table('family_events', sa.column('family_id', sa.Integer()), sa.column('event_date', sa.Date()))
+
+    def part(name: str, column):
+        return sa.cast(sa.extract(name, column), sa.Integer())
+
+    counters = [
+        ('living', members, None, members.c.death_date.is_(None)),
+        ('deceased', members, None, members.c.death_date.isnot(None)),
+        ('birth_year', members, part('year', members.c.birth_date), members.c.death_date.is_(None)),
+        ('birthday_month', members, part('month', members.c.birth_date), sa.true()),
+        ('memorial_month', members, part('month', members.c.death_date), members.c.death_date.isnot(None)),
+        ('events', events, None, sa.true()),
+        ('event_month', events, part('month', events.c.event_date), sa.true()),
+    ]
+    connection = op.get_bind()
+    connection.execute(stats.delete())
+    for bucket, table, key, where in counters:
+        # Счетчики без ключа (key = 0) группируются только по семье: константу в GROUP BY PostgreSQL не примет
+        group_by = [table.c.family_id] if key is None else [table.c.family_id, key]
+        select = sa.select(table.c.family_id, sa.literal(bucket), sa.literal(0) if key is None else key,
+                           sa.func.count()).where(where).group_by(*group_by)
+        connection.execute(stats.insert().from_select(['family_id', 'bucket', 'key', 'count'], select))
@@ -0,0 +1,37 @@
+"""Add telegram_files registry
+
+Revision ID: 2725c426b95d
+Revises: 637e2fe1e15b
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2725c426b95d'
+down_revision: Union[str, Sequence[str], None] = '637e2fe1e15b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'telegram_files',
+        sa.Column('file_id', sa.String(), nullable=False),
+        sa.Column('file_unique_id', sa.String(length=64), nullable=True),
+        sa.Column('last_success_at', sa.DateTime(), nullable=True),
+        sa.Column('last_failure_at', sa.DateTime(), nullable=True),
+        sa.Column('failure_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('file_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('telegram_files')
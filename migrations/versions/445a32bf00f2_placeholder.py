@@ -1,12 +1,70 @@
-"""placeholder for lost migration"""
+"""Initial schema: family_members and family_events
 
-revision = '445a32bf00f2'
-down_revision = None
-branch_labels = None
-depends_on = None
+Revision ID: 445a32bf00f2
+Revises:
+Create Date: 2025-12-04 05:00:00.000000
 
-def upgrade():
-    pass
+Исходная ревизия была утеряна, а таблицы создавались через create_all при
+старте бота. Ревизия восстановлена по тогдашним моделям и идемпотентна:
+на базе, где таблицы уже есть, она ничего не делает.
+"""
+from typing import Sequence, Union
 
-def downgrade():
-    pass
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '445a32bf00f2'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EVENT_TYPES = ('BIRTHDAY', 'ANNIVERSARY', 'MEMORIAL', 'OTHER')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    tables = set(sa.inspect(connection).get_table_names())
+
+    if 'family_members' not in tables:
+        op.create_table(
+            'family_members',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('birth_date', sa.Date(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+    if 'family_events' not in tables:
+        if connection.dialect.name == 'postgresql':
+            # Тип eventtypev2 мог остаться от прошлых попыток — создаем только если его нет
+            event_type = postgresql.ENUM(*EVENT_TYPES, name='eventtypev2')
+            event_type.create(connection, checkfirst=True)
+            event_type = postgresql.ENUM(*EVENT_TYPES, name='eventtypev2', create_type=False)
+        else:
+            event_type = sa.Enum(*EVENT_TYPES, name='eventtypev2')
+        op.create_table(
+            'family_events',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('event_date', sa.Date(), nullable=False),
+            sa.Column('event_type', event_type, nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('photo_ids', sa.JSON(), nullable=True),
+            sa.Column('recurring', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.Date(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_family_events_id', 'family_events', ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_family_events_id', table_name='family_events')
+    op.drop_table('family_events')
+    op.drop_table('family_members')
+    if op.get_bind().dialect.name == 'postgresql':
+        postgresql.ENUM(name='eventtypev2').drop(op.get_bind(), checkfirst=True)
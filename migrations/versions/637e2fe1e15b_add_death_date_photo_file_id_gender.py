@@ -10,6 +10,8 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 
+from migrations.helpers import add_nullable_column
+
 
 # revision identifiers, used by Alembic.
 revision: str = '637e2fe1e15b'
@@ -20,13 +22,15 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # Колонки могли уже появиться через create_all — add_nullable_column их пропустит.
+    # Все три nullable и без server_default: добавление не перезаписывает таблицу.
+    add_nullable_column('family_members', sa.Column('death_date', sa.Date(), nullable=True))
+    add_nullable_column('family_members', sa.Column('photo_file_id', sa.String(), nullable=True))
+    add_nullable_column('family_members', sa.Column('gender', sa.String(length=1), nullable=True))
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_column('family_members', 'gender')
+    op.drop_column('family_members', 'photo_file_id')
+    op.drop_column('family_members', 'death_date')
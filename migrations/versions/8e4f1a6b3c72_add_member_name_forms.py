@@ -0,0 +1,44 @@
+"""Add precomputed name forms to family_members
+
+Revision ID: 8e4f1a6b3c72
+Revises: 5d2e7b0c4f19
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_nullable_column, backfill_rows
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f1a6b3c72'
+down_revision: Union[str, Sequence[str], None] = '5d2e7b0c4f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    add_nullable_column('family_members', sa.Column('name_genitive', sa.String(length=150), nullable=True))
+    add_nullable_column('family_members', sa.Column('name_dative', sa.String(length=150), nullable=True))
+    add_nullable_column('family_members', sa.Column('name_instrumental', sa.String(length=150), nullable=True))
+    # Константный DEFAULT в PostgreSQL 11+ не перезаписывает таблицу — NOT NULL сразу безопасен
+    op.add_column('family_members', sa.Column('name_forms_manual', sa.Boolean(), nullable=False,
+                                              server_default=sa.false()))
+
+    # Склоняем уже существующих членов семьи (тем же кодом, что и при добавлении) — пачками
+    from services.declension import name_forms
+
+    backfill_rows('family_members', ['name', 'gender'], lambda row: name_forms(row["name"], row["gender"]),
+                  where="name_genitive IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('family_members', 'name_forms_manual')
+    op.drop_column('family_members', 'name_instrumental')
+    op.drop_column('family_members', 'name_dative')
+    op.drop_column('family_members', 'name_genitive')
@@ -0,0 +1,41 @@
+"""Add family_relationships
+
+Revision ID: 9b1e4c7d2a60
+Revises: 2725c426b95d
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e4c7d2a60'
+down_revision: Union[str, Sequence[str], None] = '2725c426b95d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'family_relationships',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('member_id', sa.Integer(), nullable=False),
+        sa.Column('relative_id', sa.Integer(), nullable=False),
+        sa.Column('relation_type', sa.String(length=10), nullable=False),
+        sa.Column('since_date', sa.Date(), nullable=True),
+        sa.ForeignKeyConstraint(['member_id'], ['family_members.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['relative_id'], ['family_members.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('member_id', 'relative_id', 'relation_type', name='uq_family_relationship'),
+    )
+    op.create_index('ix_family_relationships_relative_id', 'family_relationships', ['relative_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_family_relationships_relative_id', table_name='family_relationships')
+    op.drop_table('family_relationships')
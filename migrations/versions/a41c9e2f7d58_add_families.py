@@ -0,0 +1,80 @@
+"""Add families and family_id on members and events
+
+Revision ID: a41c9e2f7d58
+Revises: e7a3c5d9b214
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_nullable_column, backfill, create_index_concurrently, drop_index_concurrently, \
+    is_postgres, lock_timeout, set_not_null
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c9e2f7d58'
+down_revision: Union[str, Sequence[str], None] = 'e7a3c5d9b214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'families',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id'),
+    )
+
+    # Все существующие данные — одна семья, ее чат — чат администратора
+    admin_chat_id = os.getenv("ADMIN_CHAT_ID")
+    op.get_bind().execute(
+        sa.text("INSERT INTO families (id, name, chat_id, created_at) VALUES (1, :name, :chat_id, CURRENT_TIMESTAMP)"),
+        {"name": "Наша семья", "chat_id": int(admin_chat_id) if admin_chat_id else None}
+    )
+    if is_postgres():
+        op.execute("SELECT setval(pg_get_serial_sequence('families', 'id'), 1)")
+
+    # Колонка nullable -> заполнение пачками -> NOT NULL через проверенный CHECK -> FK NOT VALID + VALIDATE
+    for table in ('family_members', 'family_events'):
+        add_nullable_column(table, sa.Column('family_id', sa.Integer(), nullable=True))
+        backfill(table, "family_id = 1", "family_id IS NULL")
+        set_not_null(table, 'family_id')
+        if is_postgres():
+            with op.get_context().autocommit_block():
+                with lock_timeout():
+                    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_family_id FOREIGN KEY (family_id) "
+                               f"REFERENCES families (id) ON DELETE CASCADE NOT VALID")
+                op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT fk_{table}_family_id")
+
+    create_index_concurrently('ix_family_members_family_birthday', 'family_members', [
+        'family_id', sa.extract('month', sa.column('birth_date')), sa.extract('day', sa.column('birth_date'))
+    ])
+    create_index_concurrently('ix_family_members_family_death_day', 'family_members', [
+        'family_id', sa.extract('month', sa.column('death_date')), sa.extract('day', sa.column('death_date'))
+    ])
+    create_index_concurrently('ix_family_members_family_name', 'family_members', ['family_id', 'name'])
+    create_index_concurrently('ix_family_events_family_next_occurrence', 'family_events',
+                              ['family_id', 'next_occurrence'])
+    create_index_concurrently('ix_family_events_family_title', 'family_events', ['family_id', 'title'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_family_events_family_title', 'family_events')
+    drop_index_concurrently('ix_family_events_family_next_occurrence', 'family_events')
+    drop_index_concurrently('ix_family_members_family_name', 'family_members')
+    drop_index_concurrently('ix_family_members_family_death_day', 'family_members')
+    drop_index_concurrently('ix_family_members_family_birthday', 'family_members')
+    for table in ('family_events', 'family_members'):
+        op.drop_constraint(f'fk_{table}_family_id', table, type_='foreignkey')
+        op.drop_column(table, 'family_id')
+    op.drop_table('families')
@@ -0,0 +1,31 @@
+"""Recount family_stats counters
+
+Revision ID: a9c4e2b7d6f1
+Revises: f3a7d1c5e8b4
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import recount_family_stats
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e2b7d6f1'
+down_revision: Union[str, Sequence[str], None] = 'f3a7d1c5e8b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # seed_family добавлял первого члена семьи мимо FamilyRepository, и счетчики отставали
+    # на одного человека. Пересчитываем все семьи заново
+    recount_family_stats()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Пересчет не меняет схему — откатывать нечего
@@ -0,0 +1,41 @@
+"""Add reminder_subscriptions
+
+Revision ID: b5f0d3a8c961
+Revises: a41c9e2f7d58
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f0d3a8c961'
+down_revision: Union[str, Sequence[str], None] = 'a41c9e2f7d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'reminder_subscriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('family_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('days_before', sa.Integer(), nullable=False),
+        sa.Column('fire_time', sa.String(length=5), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['family_id'], ['families.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id', 'days_before', name='uq_reminder_chat_days'),
+    )
+    op.create_index(op.f('ix_reminder_subscriptions_family_id'), 'reminder_subscriptions', ['family_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reminder_subscriptions_family_id'), table_name='reminder_subscriptions')
+    op.drop_table('reminder_subscriptions')
@@ -0,0 +1,58 @@
+"""Add recurrence_rule and next_occurrence to family_events
+
+Revision ID: c3f8a91d5e27
+Revises: 9b1e4c7d2a60
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_nullable_column, backfill_rows, create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a91d5e27'
+down_revision: Union[str, Sequence[str], None] = '9b1e4c7d2a60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _next_anniversary(event_date: date, today: date) -> date:
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = event_date.replace(year=year)
+        except ValueError:  # 29 февраля
+            candidate = event_date.replace(year=year, day=28)
+        if candidate >= today:
+            return candidate
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    add_nullable_column('family_events', sa.Column('recurrence_rule', sa.String(length=100), nullable=True))
+    add_nullable_column('family_events', sa.Column('next_occurrence', sa.Date(), nullable=True))
+
+    # Заполняем ближайшую дату для существующих событий (правил у них еще нет) — пачками
+    today = date.today()
+
+    def compute(row):
+        if row["recurring"] is False:
+            next_date = row["event_date"] if row["event_date"] >= today else None
+        else:
+            next_date = max(_next_anniversary(row["event_date"], today), row["event_date"])
+        return {"next_occurrence": next_date} if next_date else None
+
+    backfill_rows('family_events', ['event_date', 'recurring'], compute, where="event_date IS NOT NULL",
+                  types={"event_date": sa.Date(), "recurring": sa.Boolean()})
+    create_index_concurrently('ix_family_events_next_occurrence', 'family_events', ['next_occurrence'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_family_events_next_occurrence', 'family_events')
+    op.drop_column('family_events', 'next_occurrence')
+    op.drop_column('family_events', 'recurrence_rule')
@@ -0,0 +1,41 @@
+"""Add family_stats counters
+
+Revision ID: d2c6e4f8a1b3
+Revises: b5f0d3a8c961
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import recount_family_stats
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2c6e4f8a1b3'
+down_revision: Union[str, Sequence[str], None] = 'b5f0d3a8c961'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'family_stats',
+        sa.Column('family_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.String(length=20), nullable=False),
+        sa.Column('key', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['family_id'], ['families.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('family_id', 'bucket', 'key'),
+    )
+
+    # Начальные значения — один GROUP BY на счетчик; дальше их ведет FamilyRepository
+    recount_family_stats()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('family_stats')
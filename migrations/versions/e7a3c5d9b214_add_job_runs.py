@@ -0,0 +1,35 @@
+"""Add job_runs
+
+Revision ID: e7a3c5d9b214
+Revises: 8e4f1a6b3c72
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c5d9b214'
+down_revision: Union[str, Sequence[str], None] = '8e4f1a6b3c72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job_runs',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('last_run_on', sa.Date(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Таблицу apscheduler_jobs создает сам SQLAlchemyJobStore при запуске планировщика
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('job_runs')
@@ -0,0 +1,40 @@
+"""Add digest_subscriptions
+
+Revision ID: f3a7d1c5e8b4
+Revises: d2c6e4f8a1b3
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a7d1c5e8b4'
+down_revision: Union[str, Sequence[str], None] = 'd2c6e4f8a1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'digest_subscriptions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('family_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('period', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['family_id'], ['families.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chat_id', 'period', name='uq_digest_chat_period'),
+    )
+    op.create_index(op.f('ix_digest_subscriptions_family_id'), 'digest_subscriptions', ['family_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_digest_subscriptions_family_id'), table_name='digest_subscriptions')
+    op.drop_table('digest_subscriptions')
@@ -0,0 +1,194 @@
+"""
+Напоминания заранее: «за 3 дня», «за неделю» до дней рождения и событий.
+
+Подписка — чат и число дней (таблица reminder_subscriptions, команда
+/remind). Все подписки лежат в одном колесе таймеров (services/timing_wheel.py),
+а не в отдельных задачах планировщика: одна фоновая задача раз в тик
+(REMINDER_TICK_SECONDS) продвигает колесо и отправляет сработавшие
+напоминания, после чего подписка снова ставится на следующий день. Даты на
+день напоминания берутся из кэша репозитория семьи (events_on), поэтому
+подписки одной семьи на один день не добавляют запросов к базе.
+
+Напоминания одного тика уходят с паузой REMINDER_SEND_DELAY, а на RetryAfter
+(лимит Bot API) отправка повторяется один раз через указанное Telegram время —
+так же, как рассылка дайджестов (services/digests.py).
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter
+
+from config import Config
+from database.connection import SessionLocal
+from database.models import ReminderSubscription
+from database.sessions import session_scope
+from services.timing_wheel import TimingWheel
+
+
+@dataclass(frozen=True)
+class SubscriptionSnapshot:
+    """Отсоединенная копия ReminderSubscription."""
+    id: int
+    family_id: int
+    chat_id: int
+    days_before: int
+    fire_time: str | None
+
+    @classmethod
+    def from_row(cls, row: ReminderSubscription) -> "SubscriptionSnapshot":
+        return cls(id=row.id, family_id=row.family_id, chat_id=row.chat_id,
+                   days_before=row.days_before, fire_time=row.fire_time)
+
+
+def next_fire_at(subscription: SubscriptionSnapshot, now: datetime) -> datetime:
+    """Ближайшее время отправки подписки (UTC), строго позже now."""
+    hour, minute = map(int, (subscription.fire_time or Config.NOTIFICATION_TIME).split(':'))
+    fire_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return fire_at if fire_at > now else fire_at + timedelta(days=1)
+
+
+class AdvanceReminders:
+    def __init__(self, families, notification_service, bot=None, tick_seconds: float = None,
+                 send_delay: float = None):
+        self.families = families  # FamilyDirectory
+        self.notification_service = notification_service
+        self.bot = bot
+        self.wheel = TimingWheel(tick_seconds or Config.REMINDER_TICK_SECONDS)
+        self.send_delay = Config.REMINDER_SEND_DELAY if send_delay is None else send_delay
+        self.subscriptions = {}  # id -> SubscriptionSnapshot (удаленные отсюда пропускаются колесом)
+        self.next_fire = {}      # id -> время ближайшей отправки; таймеры с другим временем устарели
+        self.fired = 0
+        self.sent = 0
+        self.failed = 0
+        self.max_lag = 0.0
+        self._task = None
+
+    # --- ПОДПИСКИ ---
+
+    def load(self, now: datetime = None):
+        """Читает все подписки и ставит их в колесо (при старте бота)."""
+        db = SessionLocal()
+        try:
+            rows = db.query(ReminderSubscription).all()
+            subscriptions = [SubscriptionSnapshot.from_row(row) for row in rows]
+        finally:
+            db.close()
+        for subscription in subscriptions:
+            self._schedule(subscription, now)
+        print(f"✅ Напоминания заранее: подписок {len(subscriptions)}.")
+
+    def _schedule(self, subscription: SubscriptionSnapshot, now: datetime = None):
+        self.subscriptions[subscription.id] = subscription
+        fire_at = next_fire_at(subscription, now or datetime.now(timezone.utc)).timestamp()
+        self.next_fire[subscription.id] = fire_at
+        self.wheel.schedule(fire_at, (subscription.id, fire_at))
+
+    def for_chat(self, chat_id: int) -> list:
+        return sorted((subscription for subscription in self.subscriptions.values() if subscription.chat_id == chat_id),
+                      key=lambda subscription: subscription.days_before)
+
+    def subscribe(self, family_id: int, chat_id: int, days_before: int, fire_time: str | None = None):
+        """Создает или меняет подписку чата на напоминание за days_before дней."""
+        db = SessionLocal()
+        try:
+            row = db.query(ReminderSubscription).filter(
+                ReminderSubscription.chat_id == chat_id,
+                ReminderSubscription.days_before == days_before
+            ).first() or ReminderSubscription(chat_id=chat_id, days_before=days_before)
+            row.family_id = family_id
+            row.fire_time = fire_time
+            db.add(row)
+            db.commit()
+            subscription = SubscriptionSnapshot.from_row(row)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        # Старый таймер этой подписки (если был) сработает вхолостую: сверяется с next_fire
+        self._schedule(subscription)
+        return subscription
+
+    def unsubscribe(self, chat_id: int, days_before: int) -> bool:
+        db = SessionLocal()
+        try:
+            removed = db.query(ReminderSubscription).filter(
+                ReminderSubscription.chat_id == chat_id,
+                ReminderSubscription.days_before == days_before
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        for subscription in self.for_chat(chat_id):
+            if subscription.days_before == days_before:
+                del self.subscriptions[subscription.id]
+                self.next_fire.pop(subscription.id, None)
+        return bool(removed)
+
+    # --- ОТПРАВКА ---
+
+    def start(self):
+        """Вызывается из работающего цикла (post_init)."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.wheel.seconds_until_next_tick()))
+            for subscription_id, scheduled_at in self.wheel.advance():
+                try:
+                    await self.fire(subscription_id, scheduled_at)
+                except Exception as e:
+                    print(f"❌ Ошибка напоминания заранее (подписка {subscription_id}): {e}")
+
+    async def fire(self, subscription_id: int, scheduled_at: float):
+        subscription = self.subscriptions.get(subscription_id)
+        if subscription is None or self.next_fire.get(subscription_id) != scheduled_at:
+            return  # Подписку удалили или изменили: этот таймер устарел, новый уже в колесе
+
+        # Сначала ставим на следующий день, чтобы ошибка отправки не потеряла подписку
+        self.next_fire[subscription_id] = scheduled_at + 86400
+        self.wheel.schedule(scheduled_at + 86400, (subscription_id, scheduled_at + 86400))
+        self.fired += 1
+        self.max_lag = max(self.max_lag, time.time() - scheduled_at)
+
+        context = self.families.get(subscription.family_id)
+        if context is None or self.bot is None:
+            return
+        # День — от времени срабатывания в UTC (как и расписание), а не от локальной даты сервера
+        day = datetime.fromtimestamp(scheduled_at, timezone.utc).date() + timedelta(days=subscription.days_before)
+        with self.families.use(context), session_scope("job:advance_reminder"):
+            birthdays, events, death_anniversaries = context.repository.events_on(day)
+            await self.notification_service.prefetch_genitives(birthdays)  # Склонение — в пуле
+            text = self.notification_service.format_advance_message(day, birthdays, events, death_anniversaries)
+        if text:
+            await self._send(subscription.chat_id, text)
+            if self.send_delay:
+                await asyncio.sleep(self.send_delay)
+
+    async def _send(self, chat_id: int, text: str):
+        for attempt in range(2):
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                if attempt:
+                    break
+                # Лимит Bot API: ждем, сколько просит Telegram, и пробуем еще раз
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                print(f"❌ Ошибка отправки напоминания в чат {chat_id}: {e}")
+                break
+        self.failed += 1
+
+    def report(self) -> str:
+        return (f"подписок={len(self.subscriptions)}, таймеров={len(self.wheel)}, срабатываний={self.fired}, "
+                f"отправлено={self.sent}, ошибок={self.failed}, макс. опоздание={self.max_lag:.1f}с")
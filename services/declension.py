@@ -0,0 +1,125 @@
+"""
+Склонение имен членов семьи.
+
+Формы имени (родительный, дательный, творительный падеж) вычисляются один
+раз при добавлении человека и хранятся в FamilyMember, поэтому при отправке
+уведомлений pymorphy3 не нужен вовсе. Если pymorphy3 ошибся (чаще всего на
+редких фамилиях), администратор исправляет формы командой /set_declension.
+
+Склонение — чистая работа процессора, поэтому из цикла событий оно
+вызывается через decline_many/name_forms_many: все имена одной рассылки или
+пакетного /add_member уходят в пул (MORPHOLOGY_EXECUTOR: thread, process или
+inline) одной задачей, а результаты возвращаются в исходном порядке.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import pymorphy3
+
+from config import Config
+from services.tracing import span
+
+# Падеж -> граммема pymorphy3
+CASES = {
+    "genitive": "gent",       # кого? чего? — «день рождения Ивана Петрова»
+    "dative": "datv",         # кому? чему? — «Ивану Петрову исполняется»
+    "instrumental": "ablt",   # кем? чем? — «гордимся Иваном Петровым»
+}
+
+_morph = None
+
+
+def get_morph():
+    """Один анализатор на процесс; словари загружаются при первом обращении."""
+    global _morph
+    if _morph is None:
+        _morph = pymorphy3.MorphAnalyzer()
+    return _morph
+
+
+def decline_name(name: str, case: str, gender: str | None = None, morph=None) -> str:
+    """Склоняет полное имя (Имя Фамилия) в падеж case ('genitive', 'dative', 'instrumental')."""
+    morph = morph or get_morph()
+    grammeme = CASES[case]
+    wanted_gender = {"F": "femn", "M": "masc"}.get(gender)
+
+    declined_words = []
+    with span("pymorphy.decline", case=case, words=len(name.split())):
+        for word in name.split():
+            parses = morph.parse(word)
+            parsed_word = parses[0]
+            # Для «Краснова» и подобных выбираем разбор нужного рода, если он есть
+            if wanted_gender:
+                parsed_word = next((parsed for parsed in parses if wanted_gender in parsed.tag), parsed_word)
+
+            declined_word = parsed_word.inflect({grammeme})
+            # Если склонение прошло успешно, используем его, иначе оставляем слово как есть
+            declined_words.append(declined_word.word.capitalize() if declined_word else word)
+
+    return " ".join(declined_words)
+
+
+def name_forms(name: str, gender: str | None = None, morph=None) -> dict:
+    """Все формы имени для колонок FamilyMember: {"name_genitive": ..., "name_dative": ..., ...}."""
+    return {f"name_{case}": decline_name(name, case, gender, morph) for case in CASES}
+
+
+# ----------------------------------------------------
+# --- СКЛОНЕНИЕ ВНЕ ЦИКЛА СОБЫТИЙ ---
+# ----------------------------------------------------
+
+_executor = None
+
+
+def get_executor():
+    """Пул для склонения (создается при первом обращении); None — склонять прямо в вызывающем потоке."""
+    global _executor
+    if _executor is None and Config.MORPHOLOGY_EXECUTOR != "inline":
+        if Config.MORPHOLOGY_EXECUTOR == "process":
+            # Каждый процесс загружает свои словари pymorphy3 один раз
+            _executor = ProcessPoolExecutor(max_workers=Config.MORPHOLOGY_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=Config.MORPHOLOGY_WORKERS, thread_name_prefix="morphology")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def decline_batch(requests: list) -> list:
+    """Склоняет пачку (name, case, gender) за один вызов; выполняется в пуле."""
+    return [decline_name(name, case, gender) for name, case, gender in requests]
+
+
+def name_forms_batch(requests: list) -> list:
+    """Формы имени для пачки (name, gender); выполняется в пуле."""
+    return [name_forms(name, gender) for name, gender in requests]
+
+
+async def _submit(function, requests: list) -> list:
+    if not requests:
+        return []
+    executor = get_executor()
+    if executor is None:
+        return function(requests)
+    if isinstance(executor, ThreadPoolExecutor):
+        # run_in_executor не переносит contextvars в поток: без copy_context спаны pymorphy
+        # теряют родителя (services/tracing.py), а семья и область сессий — свои значения
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(executor, context.run, function, requests)
+    return await asyncio.get_running_loop().run_in_executor(executor, function, requests)
+
+
+async def decline_many(requests: list) -> list:
+    """Склоняет все (name, case, gender) одной задачей в пуле; результаты — в порядке запросов."""
+    return await _submit(decline_batch, list(requests))
+
+
+async def name_forms_many(requests: list) -> list:
+    """Формы имен для всех (name, gender) одной задачей в пуле; результаты — в порядке запросов."""
+    return await _submit(name_forms_batch, list(requests))
@@ -0,0 +1,189 @@
+"""
+Дайджесты: одно сообщение со всеми датами семьи на неделю или месяц.
+
+Подписка — чат и период (таблица digest_subscriptions, команда /digest):
+"weekly" приходит по понедельникам, "monthly" — 1-го числа, в
+NOTIFICATION_TIME. Рассылка идет одним проходом:
+1. подписки периода группируются по семьям;
+2. для каждой семьи даты периода считаются один раз (events_between по
+   закэшированным спискам) и текст собирается один раз;
+3. готовые сообщения уходят во все чаты семьи с паузой между отправками
+   (DIGEST_SEND_DELAY), чтобы не упираться в лимиты Bot API.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter
+
+from config import Config
+from database.connection import SessionLocal
+from database.models import DigestSubscription
+from database.sessions import session_scope
+from services import milestones as ms
+
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+PERIODS = (WEEKLY, MONTHLY)
+
+PERIOD_NAMES = {WEEKLY: "еженедельный", MONTHLY: "ежемесячный"}
+
+
+@dataclass(frozen=True)
+class DigestSnapshot:
+    """Отсоединенная копия DigestSubscription."""
+    id: int
+    family_id: int
+    chat_id: int
+    period: str
+
+    @classmethod
+    def from_row(cls, row: DigestSubscription) -> "DigestSnapshot":
+        return cls(id=row.id, family_id=row.family_id, chat_id=row.chat_id, period=row.period)
+
+
+def period_range(period: str, today: date) -> tuple:
+    """[начало, конец) периода дайджеста, начиная с today: неделя или до конца месяца."""
+    if period == WEEKLY:
+        return today, today + timedelta(days=7)
+    next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return today, next_month
+
+
+def period_title(period: str, start: date, end: date) -> str:
+    last = end - timedelta(days=1)
+    if period == WEEKLY:
+        return f"Даты семьи на неделю ({start.strftime('%d.%m')}–{last.strftime('%d.%m')})"
+    return f"Даты семьи на месяц ({start.strftime('%d.%m')}–{last.strftime('%d.%m')})"
+
+
+class DigestService:
+    def __init__(self, families, notification_service, bot=None, send_delay: float = None):
+        self.families = families  # FamilyDirectory
+        self.notification_service = notification_service
+        self.bot = bot
+        self.send_delay = Config.DIGEST_SEND_DELAY if send_delay is None else send_delay
+        self.generated = 0
+        self.sent = 0
+        self.failed = 0
+
+    # --- ПОДПИСКИ ---
+
+    def for_chat(self, chat_id: int) -> list:
+        db = SessionLocal()
+        try:
+            rows = db.query(DigestSubscription).filter(DigestSubscription.chat_id == chat_id) \
+                .order_by(DigestSubscription.period.desc()).all()
+            return [DigestSnapshot.from_row(row) for row in rows]
+        finally:
+            db.close()
+
+    def subscribe(self, family_id: int, chat_id: int, period: str) -> DigestSnapshot:
+        db = SessionLocal()
+        try:
+            row = db.query(DigestSubscription).filter(
+                DigestSubscription.chat_id == chat_id,
+                DigestSubscription.period == period
+            ).first() or DigestSubscription(chat_id=chat_id, period=period)
+            row.family_id = family_id
+            db.add(row)
+            db.commit()
+            return DigestSnapshot.from_row(row)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def unsubscribe(self, chat_id: int, period: str) -> bool:
+        db = SessionLocal()
+        try:
+            removed = db.query(DigestSubscription).filter(
+                DigestSubscription.chat_id == chat_id,
+                DigestSubscription.period == period
+            ).delete(synchronize_session=False)
+            db.commit()
+            return bool(removed)
+        finally:
+            db.close()
+
+    def _subscriptions_by_family(self, period: str) -> dict:
+        db = SessionLocal()
+        try:
+            rows = db.query(DigestSubscription).filter(DigestSubscription.period == period).all()
+            subscriptions = [DigestSnapshot.from_row(row) for row in rows]
+        finally:
+            db.close()
+        by_family = {}
+        for subscription in subscriptions:
+            by_family.setdefault(subscription.family_id, []).append(subscription.chat_id)
+        return by_family
+
+    # --- ГЕНЕРАЦИЯ И ОТПРАВКА ---
+
+    async def render(self, family_id: int, period: str, today: date = None) -> list:
+        """Сообщения дайджеста семьи за период (пустой список — дат нет)."""
+        context = self.families.get(family_id)
+        if context is None:
+            return []
+        start, end = period_range(period, today or date.today())
+        with self.families.use(context), session_scope(f"job:digest_{period}"):
+            days = context.repository.events_between(start, end)
+            # Склонение имен — одним пакетом в пуле (services/declension.py), а не по одному при рендеринге
+            await self.notification_service.prefetch_genitives([member for _, birthdays, _, _ in days
+                                                                for member in birthdays])
+            milestones = []
+            for milestone in context.milestones.upcoming(start, (end - start).days):
+                # Юбилеи дней рождения и событий уже видны в строках дат — добавляем только
+                # круглые числа дней и юбилеи свадеб пар
+                if not (milestone.kind == ms.DAYS_ALIVE or isinstance(milestone.subject, tuple)):
+                    continue
+                brief = self.notification_service.format_milestone_brief(milestone)
+                if brief and start <= brief[0] < end:
+                    milestones.append(brief)
+            self.generated += 1
+            return self.notification_service.format_digest_message(
+                period_title(period, start, end), days, milestones)
+
+    async def run(self, period: str, today: date = None) -> int:
+        """Рассылка дайджеста периода всем подписанным чатам. Возвращает число отправленных сообщений."""
+        sent_before = self.sent
+        outbox = []  # (чат, сообщения): сначала собираем все, потом равномерно отправляем
+        for family_id, chat_ids in self._subscriptions_by_family(period).items():
+            try:
+                messages = await self.render(family_id, period, today)
+            except Exception as e:
+                print(f"❌ Ошибка сборки дайджеста ({period}) семьи {family_id}: {e}")
+                continue
+            if not messages:
+                print(f"ℹ️ Дайджест ({period}) семьи {family_id}: дат нет, не отправляем.")
+                continue
+            outbox.extend((chat_id, messages) for chat_id in chat_ids)
+
+        print(f"🗓️ Дайджест ({period}): сообщений к отправке в {len(outbox)} чатов.")
+        for chat_id, messages in outbox:
+            for text in messages:
+                await self._send(chat_id, text)
+                if self.send_delay:
+                    await asyncio.sleep(self.send_delay)
+        return self.sent - sent_before
+
+    async def _send(self, chat_id: int, text: str):
+        for attempt in range(2):
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                if attempt:
+                    break
+                # Лимит Bot API: ждем, сколько просит Telegram, и пробуем еще раз
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                print(f"❌ Ошибка отправки дайджеста в чат {chat_id}: {e}")
+                break
+        self.failed += 1
+
+    def report(self) -> str:
+        return f"собрано={self.generated}, отправлено={self.sent}, ошибок={self.failed}"
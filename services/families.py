@@ -0,0 +1,156 @@
+"""
+Семьи: один бот обслуживает несколько семей.
+
+У каждой семьи свой репозиторий (кэш, запросы только по ее family_id) и свой
+индекс вех. Хендлер получает семью по чату, из которого пришло обновление
+(families.chat_id); администратор в своем чате работает с семьей, выбранной
+командой /use_family. Текущая семья хранится в ContextVar на время обработки
+обновления или задачи, поэтому хендлеры просто берут bot.repository.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from config import Config
+from database.connection import SessionLocal
+from database.models import Family
+from services.family_repository import FamilyRepository
+from services.milestones import MilestoneIndex
+
+current_family = ContextVar("current_family", default=None)
+
+
+class FamilyNotConfigured(LookupError):
+    """Семья по умолчанию (DEFAULT_FAMILY_ID) не найдена в таблице families."""
+
+
+@dataclass(frozen=True)
+class FamilySnapshot:
+    """Отсоединенная копия Family."""
+    id: int
+    name: str
+    chat_id: int | None
+
+    @classmethod
+    def from_row(cls, row: Family) -> "FamilySnapshot":
+        return cls(id=row.id, name=row.name, chat_id=row.chat_id)
+
+
+@dataclass
+class FamilyContext:
+    """Все, что нужно хендлерам для работы с одной семьей."""
+    family: FamilySnapshot
+    repository: FamilyRepository
+    milestones: MilestoneIndex
+
+
+class FamilyDirectory:
+    def __init__(self, session_factory=SessionLocal, default_family_id: int = None):
+        self.session_factory = session_factory
+        self.default_family_id = default_family_id or Config.DEFAULT_FAMILY_ID
+        # Семья, с которой администратор работает в своем чате (/use_family)
+        self.admin_family_id = self.default_family_id
+        self.families = {}  # id -> FamilySnapshot
+        self.by_chat = {}   # chat_id -> id
+        self.contexts = {}  # id -> FamilyContext (создаются при первом обращении)
+        self.reload()
+        # Без семьи по умолчанию хендлерам некуда деваться — лучше не стартовать, чем падать на каждой команде
+        if self.default_family_id not in self.families:
+            raise FamilyNotConfigured(self._not_configured_message())
+
+    def reload(self):
+        """Перечитывает таблицу families (при старте и после /new_family)."""
+        db = self.session_factory()
+        try:
+            families = [FamilySnapshot.from_row(row) for row in db.query(Family).order_by(Family.id).all()]
+        finally:
+            db.close()
+        self.families = {family.id: family for family in families}
+        self.by_chat = {family.chat_id: family.id for family in families if family.chat_id is not None}
+        for family_id, context in self.contexts.items():
+            context.family = self.families.get(family_id, context.family)
+
+    def list_families(self) -> list:
+        return list(self.families.values())
+
+    def get(self, family_id: int) -> FamilyContext | None:
+        if family_id not in self.families:
+            return None
+        context = self.contexts.get(family_id)
+        if context is None:
+            repository = FamilyRepository(family_id=family_id)
+            context = FamilyContext(self.families[family_id], repository, MilestoneIndex(repository))
+            self.contexts[family_id] = context
+        return context
+
+    def for_chat(self, chat_id) -> FamilyContext | None:
+        """
+        Семья чата. Чат администратора — выбранная им семья; чат без своей
+        семьи — семья по умолчанию (как было до разделения на семьи).
+        """
+        if chat_id is not None and str(chat_id) == str(Config.ADMIN_CHAT_ID):
+            return self.get(self.admin_family_id)
+        family_id = self.by_chat.get(chat_id, self.default_family_id)
+        return self.get(family_id)
+
+    def current(self) -> FamilyContext:
+        """Семья текущего обновления или задачи; вне их — семья по умолчанию."""
+        context = current_family.get() or self.get(self.default_family_id)
+        if context is None:
+            raise FamilyNotConfigured(self._not_configured_message())
+        return context
+
+    def _not_configured_message(self) -> str:
+        return (f"Семья по умолчанию (DEFAULT_FAMILY_ID={self.default_family_id}) не найдена в таблице families. "
+                f"Укажите в DEFAULT_FAMILY_ID id существующей семьи или создайте ее.")
+
+    @contextmanager
+    def use(self, context: FamilyContext | None):
+        token = current_family.set(context)
+        try:
+            yield context
+        finally:
+            current_family.reset(token)
+
+    def notification_chat(self, family: FamilySnapshot):
+        """Куда отправлять ежедневную рассылку семьи: ее чат, для семьи по умолчанию — администратору."""
+        if family.chat_id is not None:
+            return family.chat_id
+        return Config.ADMIN_CHAT_ID if family.id == self.default_family_id else None
+
+    # --- ЗАПИСЬ ---
+
+    def create_family(self, name: str, chat_id: int | None = None) -> FamilySnapshot:
+        db = self.session_factory()
+        try:
+            family = Family(name=name, chat_id=chat_id)
+            db.add(family)
+            db.commit()
+            snapshot = FamilySnapshot.from_row(family)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.reload()
+        return snapshot
+
+    def select_admin_family(self, family_id: int) -> FamilySnapshot | None:
+        if family_id not in self.families:
+            return None
+        self.admin_family_id = family_id
+        return self.families[family_id]
+
+
+def ensure_default_family(db) -> Family:
+    """
+    Создает первую семью (чат администратора), если семей еще нет. На новой
+    базе она получает id=1 из последовательности — это DEFAULT_FAMILY_ID.
+    """
+    family = db.get(Family, Config.DEFAULT_FAMILY_ID)
+    if family is None and db.query(Family.id).first() is None:
+        chat_id = int(Config.ADMIN_CHAT_ID) if Config.ADMIN_CHAT_ID else None
+        family = Family(name="Наша семья", chat_id=chat_id)
+        db.add(family)
+        db.flush()
+    return family
@@ -0,0 +1,184 @@
+"""
+Семейное дерево: индекс смежности в памяти.
+
+Строится одним проходом по членам семьи и связям (family_relationships)
+и отвечает на вопросы «предки», «потомки», «кто родственник X» и
+«кто в каком поколении» обходом в ширину по словарям — без запросов к
+базе, поэтому даже граф на десятки тысяч человек обходится за миллисекунды.
+"""
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+
+from database.models import RelationType
+
+
+@dataclass(frozen=True)
+class RelationSnapshot:
+    """Отсоединенная копия FamilyRelationship."""
+    member_id: int
+    relative_id: int
+    relation_type: str
+    since_date: date | None
+
+    @classmethod
+    def from_row(cls, row) -> "RelationSnapshot":
+        return cls(
+            member_id=row.member_id,
+            relative_id=row.relative_id,
+            relation_type=row.relation_type,
+            since_date=row.since_date,
+        )
+
+
+# Названия поколений относительно выбранного человека
+GENERATION_NAMES = {
+    -3: "Прадеды", -2: "Бабушки и дедушки", -1: "Родители",
+    0: "Свое поколение", 1: "Дети", 2: "Внуки", 3: "Правнуки",
+}
+
+
+class FamilyGraph:
+    def __init__(self, members, relations):
+        self.members = {member.id: member for member in members}
+        self.by_name = {}
+        for member in self.members.values():
+            self.by_name.setdefault(member.name, member)
+        self.parents = {}   # id -> set(id родителей)
+        self.children = {}  # id -> set(id детей)
+        self.spouses = {}   # id -> {id супруга: дата свадьбы}
+        self.relations = list(relations)
+
+        for relation in self.relations:
+            if relation.member_id not in self.members or relation.relative_id not in self.members:
+                continue
+            if relation.relation_type == RelationType.PARENT.value:
+                self.children.setdefault(relation.member_id, set()).add(relation.relative_id)
+                self.parents.setdefault(relation.relative_id, set()).add(relation.member_id)
+            elif relation.relation_type == RelationType.SPOUSE.value:
+                self.spouses.setdefault(relation.member_id, {})[relation.relative_id] = relation.since_date
+                self.spouses.setdefault(relation.relative_id, {})[relation.member_id] = relation.since_date
+
+    # --- ПОИСК ---
+
+    def find(self, name: str):
+        """Ищет члена семьи по полному имени или (если он единственный) по первому слову."""
+        name = name.strip()
+        if name in self.by_name:
+            return self.by_name[name]
+
+        prefix = name.lower() + " "
+        candidates = [member for member in self.members.values() if member.name.lower().startswith(prefix)]
+        return candidates[0] if len(candidates) == 1 else None
+
+    # --- ОБХОДЫ ---
+
+    def _walk(self, start_id: int, edges: dict, max_depth: int = None) -> list:
+        """Обход в ширину: [(id, глубина)] без самого start_id."""
+        result = []
+        seen = {start_id}
+        queue = deque([(start_id, 0)])
+        while queue:
+            member_id, depth = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for next_id in edges.get(member_id, ()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    result.append((next_id, depth + 1))
+                    queue.append((next_id, depth + 1))
+        return result
+
+    def ancestors(self, member_id: int, max_depth: int = None) -> list:
+        """Предки: [(id, поколение вверх)]."""
+        return self._walk(member_id, self.parents, max_depth)
+
+    def descendants(self, member_id: int, max_depth: int = None) -> list:
+        """Потомки: [(id, поколение вниз)]."""
+        return self._walk(member_id, self.children, max_depth)
+
+    def generations(self, member_id: int) -> dict:
+        """
+        Все родственники X по поколениям относительно него:
+        {-1: [родители...], 0: [супруги, братья...], 1: [дети...]}.
+        """
+        offsets = {member_id: 0}
+        queue = deque([member_id])
+        while queue:
+            current = queue.popleft()
+            offset = offsets[current]
+            neighbours = (
+                [(parent_id, offset - 1) for parent_id in self.parents.get(current, ())]
+                + [(child_id, offset + 1) for child_id in self.children.get(current, ())]
+                + [(spouse_id, offset) for spouse_id in self.spouses.get(current, {})]
+            )
+            for next_id, next_offset in neighbours:
+                if next_id not in offsets:
+                    offsets[next_id] = next_offset
+                    queue.append(next_id)
+
+        result = {}
+        for relative_id, offset in offsets.items():
+            if relative_id != member_id:
+                result.setdefault(offset, []).append(relative_id)
+        return result
+
+    def related(self, member_id: int) -> set:
+        """Все, кто связан с X хоть какой-то цепочкой связей."""
+        return {relative_id for ids in self.generations(member_id).values() for relative_id in ids}
+
+    def is_ancestor(self, ancestor_id: int, member_id: int) -> bool:
+        return any(found_id == ancestor_id for found_id, _ in self.ancestors(member_id))
+
+    # --- ОТОБРАЖЕНИЕ ---
+
+    def label(self, member_id: int) -> str:
+        member = self.members[member_id]
+        years = str(member.birth_date.year) if member.birth_date else "?"
+        if member.death_date:
+            years += f"–{member.death_date.year}"
+        label = f"{member.name} ({years})"
+
+        spouses = self.spouses.get(member_id, {})
+        if spouses:
+            label += " ❤ " + ", ".join(self.members[spouse_id].name for spouse_id in spouses)
+        return label
+
+    def render_tree(self, member_id: int, max_depth: int = 6, max_lines: int = 80) -> str:
+        """Рисует поддерево потомков X (с предками одной строкой сверху)."""
+        lines = []
+
+        ancestor_ids = [found_id for found_id, depth in self.ancestors(member_id, max_depth=1)]
+        if ancestor_ids:
+            lines.append("⬆️ Родители: " + ", ".join(self.members[ancestor_id].name for ancestor_id in ancestor_ids))
+
+        lines.append(f"🌳 {self.label(member_id)}")
+
+        def children_sorted(parent_id):
+            return sorted(
+                self.children.get(parent_id, ()),
+                key=lambda child_id: self.members[child_id].birth_date or date.min
+            )
+
+        # Обход в глубину без рекурсии, чтобы длинные ветки не упирались в лимит стека
+        stack = [(child_id, "", index == 0)
+                 for index, child_id in enumerate(reversed(children_sorted(member_id)))]
+        truncated = False
+        while stack:
+            if len(lines) >= max_lines:
+                truncated = True
+                break
+            child_id, prefix, is_last = stack.pop()
+            lines.append(f"{prefix}{'└── ' if is_last else '├── '}{self.label(child_id)}")
+
+            depth = len(prefix) // 4 + 1
+            if depth >= max_depth:
+                continue
+            next_prefix = prefix + ("    " if is_last else "│   ")
+            grandchildren = children_sorted(child_id)
+            for index, grandchild_id in enumerate(reversed(grandchildren)):
+                stack.append((grandchild_id, next_prefix, index == 0))
+
+        if truncated:
+            lines.append("… (дерево слишком большое, показана только часть)")
+        return "\n".join(lines)
@@ -0,0 +1,632 @@
+"""
+Слой доступа к данным семьи между хендлерами и SQLAlchemy.
+
+Чтения возвращают «снимки» (отсоединенные от сессии неизменяемые копии
+строк) и кэшируются с ограничением по времени жизни и размеру. Все записи
+идут через этот же слой и сбрасывают кэш, поэтому после изменения данных
+хендлеры никогда не увидят устаревшие значения.
+
+Репозиторий с family_id видит и меняет только данные одной семьи
+(services/families.py держит по репозиторию на семью); без family_id —
+все строки, как до разделения на семьи.
+"""
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update
+
+from config import Config
+from database.connection import router as default_router
+from database.routing import SessionRouter
+from database.models import FamilyMember, FamilyEvent, FamilyRelationship, RelationType, DataVersion
+from services.notification_service import query_today_events, get_first_photo_id
+from services.family_graph import FamilyGraph, RelationSnapshot
+from services.occurrences import next_occurrence
+from services.declension import name_forms
+from services.family_stats import FamilyStats, apply_changes, member_counters, event_counters
+
+
+# ----------------------------------------------------
+# --- СНИМКИ СТРОК ---
+# ----------------------------------------------------
+
+@dataclass(frozen=True)
+class MemberSnapshot:
+    """Отсоединенная копия FamilyMember."""
+    id: int
+    name: str
+    birth_date: date
+    death_date: date | None
+    photo_file_id: str | None
+    gender: str | None
+    name_genitive: str | None = None
+    name_dative: str | None = None
+    name_instrumental: str | None = None
+
+    @classmethod
+    def from_row(cls, row: FamilyMember) -> "MemberSnapshot":
+        return cls(
+            id=row.id,
+            name=row.name,
+            birth_date=row.birth_date,
+            death_date=row.death_date,
+            photo_file_id=row.photo_file_id,
+            gender=row.gender,
+            name_genitive=row.name_genitive,
+            name_dative=row.name_dative,
+            name_instrumental=row.name_instrumental,
+        )
+
+
+@dataclass(frozen=True)
+class EventSnapshot:
+    """Отсоединенная копия FamilyEvent."""
+    id: int
+    title: str
+    event_date: date
+    event_type: object
+    description: str | None
+    photo_ids: object
+    recurring: bool | None
+    recurrence_rule: str | None = None
+    next_occurrence: date | None = None
+
+    @classmethod
+    def from_row(cls, row: FamilyEvent) -> "EventSnapshot":
+        return cls(
+            id=row.id,
+            title=row.title,
+            event_date=row.event_date,
+            event_type=row.event_type,
+            description=row.description,
+            photo_ids=list(row.photo_ids) if isinstance(row.photo_ids, list) else row.photo_ids,
+            recurring=row.recurring,
+            recurrence_rule=row.recurrence_rule,
+            next_occurrence=row.next_occurrence,
+        )
+
+
+# ----------------------------------------------------
+# --- КЭШ ---
+# ----------------------------------------------------
+
+class TTLCache:
+    """LRU-кэш с временем жизни записей и ограничением по количеству."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Возвращает (найдено?, значение)."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# Имя счетчика изменений в data_versions
+DATA_VERSION_NAME = "family"
+
+
+# ----------------------------------------------------
+# --- РЕПОЗИТОРИЙ ---
+# ----------------------------------------------------
+
+class FamilyRepository:
+    def __init__(self, session_factory=None, ttl: float = None, max_size: int = None, router: SessionRouter = None,
+                 family_id: int | None = None):
+        self.family_id = family_id
+        # Чтения идут через router (реплика, если задана), записи — в основную базу
+        self.router = router or (SessionRouter(session_factory) if session_factory else default_router)
+        self.cache = TTLCache(
+            ttl=Config.CACHE_TTL_SECONDS if ttl is None else ttl,
+            max_size=max_size or Config.CACHE_MAX_ENTRIES,
+        )
+        self.invalidations = 0
+        self._occurrences_advanced_on = None
+        # Подписчики на изменения: callback(entity, action, snapshot)
+        self.listeners = []
+
+    def subscribe(self, callback):
+        """
+        Подписывает callback на все записи. Вызывается после успешного commit с
+        аргументами (entity, action, snapshot), например ("member", "added", MemberSnapshot).
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, entity: str, action: str, snapshot):
+        for callback in self.listeners:
+            try:
+                callback(entity, action, snapshot)
+            except Exception as e:
+                print(f"❌ Ошибка подписчика на изменения ({entity}/{action}): {e}")
+
+    def _cached(self, key, loader):
+        """Возвращает значение из кэша или загружает его одной сессией."""
+        found, value = self.cache.get(key)
+        if found:
+            return value
+
+        db = self.router.read_session()
+        try:
+            value = loader(db)
+        finally:
+            db.close()
+        self.cache.set(key, value)
+        return value
+
+    def _members(self, db):
+        """Запрос членов семьи, ограниченный семьей репозитория."""
+        query = db.query(FamilyMember)
+        return query if self.family_id is None else query.filter(FamilyMember.family_id == self.family_id)
+
+    def _events(self, db, *columns):
+        """Запрос событий (или колонок событий), ограниченный семьей репозитория."""
+        query = db.query(*columns) if columns else db.query(FamilyEvent)
+        return query if self.family_id is None else query.filter(FamilyEvent.family_id == self.family_id)
+
+    def _owned(self, row: dict) -> dict:
+        """Строка для вставки с family_id репозитория."""
+        return row if self.family_id is None else dict(row, family_id=self.family_id)
+
+    def _count(self, db, snapshots: list, counters, sign: int = 1):
+        """Обновляет счетчики статистики семьи (family_stats) в транзакции записи."""
+        if self.family_id is None:
+            return
+        changes = Counter()
+        for snapshot in snapshots:
+            for counter in counters(snapshot):
+                changes[counter] += sign
+        apply_changes(db, self.family_id, changes)
+
+    def invalidate(self):
+        """Сбрасывает кэш после любой записи."""
+        self.cache.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Статистика кэша для логов и админских команд."""
+        return {
+            "entries": len(self.cache),
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "hit_ratio": self.cache.hit_ratio,
+            "evictions": self.cache.evictions,
+            "invalidations": self.invalidations,
+            "routing": self.router.stats(),
+        }
+
+    # --- ЧТЕНИЕ ---
+
+    def list_members(self) -> list:
+        return self._cached(
+            "members",
+            lambda db: [MemberSnapshot.from_row(row) for row in self._members(db).order_by(FamilyMember.id).all()]
+        )
+
+    def list_events(self) -> list:
+        return self._cached(
+            "events",
+            lambda db: [EventSnapshot.from_row(row) for row in self._events(db).order_by(FamilyEvent.id).all()]
+        )
+
+    def family_stats(self) -> FamilyStats:
+        """Статистика семьи из счетчиков family_stats — без перебора членов семьи и событий."""
+        return self._cached("family_stats", lambda db: FamilyStats.load(db, self.family_id))
+
+    def find_member(self, name: str) -> MemberSnapshot | None:
+        def load(db):
+            row = self._members(db).filter(FamilyMember.name == name).first()
+            return MemberSnapshot.from_row(row) if row else None
+        return self._cached(("member", name), load)
+
+    def find_event(self, title: str) -> EventSnapshot | None:
+        def load(db):
+            row = self._events(db).filter(FamilyEvent.title == title).first()
+            return EventSnapshot.from_row(row) if row else None
+        return self._cached(("event", title), load)
+
+    def family_graph(self) -> FamilyGraph:
+        """Индекс семейного дерева (строится двумя запросами и кэшируется до первой записи)."""
+        def load(db):
+            query = db.query(FamilyRelationship)
+            if self.family_id is not None:
+                # Связи своей семьи: обе стороны связи — члены этой семьи
+                query = query.join(FamilyMember, FamilyMember.id == FamilyRelationship.member_id).filter(
+                    FamilyMember.family_id == self.family_id
+                )
+            relations = [RelationSnapshot.from_row(row) for row in query.all()]
+            return FamilyGraph(self.list_members(), relations)
+        return self._cached("graph", load)
+
+    def get_today_events(self, day: date = None):
+        """То же, что NotificationService.get_today_events, но из кэша и в виде снимков."""
+        day = day or date.today()
+        if self._occurrences_advanced_on != day:
+            self.advance_occurrences(day)
+
+        def load(db):
+            birthdays, events, death_anniversaries = query_today_events(db, day, self.family_id)
+            return (
+                [MemberSnapshot.from_row(row) for row in birthdays],
+                [EventSnapshot.from_row(row) for row in events],
+                [MemberSnapshot.from_row(row) for row in death_anniversaries],
+            )
+        return self._cached(("today", day), load)
+
+    def events_on(self, day: date):
+        """
+        Дни рождения, события и годовщины смерти на любую дату (для напоминаний
+        заранее). Считается по закэшированным спискам, без запросов и без сдвига
+        next_occurrence; события с правилом повторения проверяются по правилу.
+        """
+        key = ("on_day", day)
+        found, value = self.cache.get(key)
+        if found:
+            return value
+
+        members = self.list_members()
+        birthdays = [member for member in members
+                     if (member.birth_date.month, member.birth_date.day) == (day.month, day.day)]
+        events = [event for event in self.list_events()
+                  if next_occurrence(event.event_date, event.recurrence_rule, event.recurring, day) == day]
+        death_anniversaries = [member for member in members if member.death_date
+                               and (member.death_date.month, member.death_date.day) == (day.month, day.day)]
+        value = (birthdays, events, death_anniversaries)
+        self.cache.set(key, value)
+        return value
+
+    def events_between(self, start: date, end: date) -> list:
+        """
+        Все даты периода [start, end) для дайджестов: [(день, дни рождения, события,
+        годовщины смерти)] только по дням, где что-то есть. Один проход по
+        закэшированным спискам на весь период (а не events_on на каждый день).
+        """
+        key = ("between", start, end)
+        found, value = self.cache.get(key)
+        if found:
+            return value
+
+        by_day = {}
+
+        def slot(day):
+            return by_day.setdefault(day, ([], [], []))
+
+        month_days = {}  # (месяц, число) -> день периода
+        day = start
+        while day < end:
+            month_days[(day.month, day.day)] = day
+            day += timedelta(days=1)
+
+        members = self.list_members()
+        for member in members:
+            day = month_days.get((member.birth_date.month, member.birth_date.day))
+            if day:
+                slot(day)[0].append(member)
+        for event in self.list_events():
+            occurrence = next_occurrence(event.event_date, event.recurrence_rule, event.recurring, start)
+            while occurrence and occurrence < end:
+                slot(occurrence)[1].append(event)
+                occurrence = next_occurrence(event.event_date, event.recurrence_rule, event.recurring,
+                                             occurrence + timedelta(days=1))
+        for member in members:
+            day = member.death_date and month_days.get((member.death_date.month, member.death_date.day))
+            if day:
+                slot(day)[2].append(member)
+
+        value = [(day, *by_day[day]) for day in sorted(by_day)]
+        self.cache.set(key, value)
+        return value
+
+    def upcoming_events(self, start: date, days: int) -> list:
+        """События с ближайшей датой в [start, start + days) — один индексный запрос."""
+        end = start + timedelta(days=days)
+
+        def load(db):
+            rows = self._events(db).filter(
+                FamilyEvent.next_occurrence >= start,
+                FamilyEvent.next_occurrence < end
+            ).order_by(FamilyEvent.next_occurrence).all()
+            return [EventSnapshot.from_row(row) for row in rows]
+        return self._cached(("upcoming_events", start, days), load)
+
+    # --- ЗАПИСЬ (каждая запись сбрасывает кэш) ---
+
+    def advance_occurrences(self, today: date = None) -> int:
+        """
+        Сдвигает next_occurrence у событий, чья дата уже прошла.
+        Трогает только прошедшие строки (по индексу), обычно их единицы в день.
+        """
+        today = today or date.today()
+
+        def action(db):
+            stale = self._events(db).filter(FamilyEvent.next_occurrence < today).all()
+            for event in stale:
+                event.next_occurrence = next_occurrence(
+                    event.event_date, event.recurrence_rule, event.recurring, today
+                )
+            return len(stale)
+
+        moved = self._write(action) if self._has_stale_occurrences(today) else 0
+        self._occurrences_advanced_on = today
+        return moved
+
+    def _has_stale_occurrences(self, today: date) -> bool:
+        db = self.router.write_session()  # Проверка перед записью — в основной базе
+        try:
+            return self._events(db, FamilyEvent.id).filter(FamilyEvent.next_occurrence < today).first() is not None
+        finally:
+            db.close()
+
+    def _write(self, action, entity: str = None, change: str = None, snapshot_of=None):
+        """
+        Выполняет запись одной транзакцией и сбрасывает кэш.
+        Если задан entity, подписчики получают (entity, change, snapshot_of(result)).
+        """
+        db = self.router.write_session()
+        try:
+            result = action(db)
+            self._bump_data_version(db)
+            db.commit()
+            self.router.note_write()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+            self.invalidate()
+
+        if entity and result:
+            self._notify(entity, change, snapshot_of(result) if snapshot_of else result)
+        return result
+
+    @staticmethod
+    def _bump_data_version(db):
+        """Увеличивает счетчик изменений в той же транзакции, что и запись."""
+        bumped = db.execute(
+            update(DataVersion).where(DataVersion.name == DATA_VERSION_NAME).values(version=DataVersion.version + 1)
+        ).rowcount
+        if not bumped:
+            db.add(DataVersion(name=DATA_VERSION_NAME, version=1))
+
+    def data_version(self) -> int:
+        """Текущее значение счетчика изменений (читается из основной базы, реплика может отставать)."""
+        db = self.router.write_session()
+        try:
+            row = db.get(DataVersion, DATA_VERSION_NAME)
+            return row.version if row else 0
+        finally:
+            db.close()
+
+    # --- СНИМОК ДЛЯ БЫСТРОГО ПЕРЕЗАПУСКА (services/warm_snapshot.py) ---
+
+    def export_state(self, day: date = None) -> dict:
+        """Горячие данные репозитория: члены семьи, события, связи и события на сегодня."""
+        day = day or date.today()
+        return {
+            "members": self.list_members(),
+            "events": self.list_events(),
+            "relations": self.family_graph().relations,
+            "today": (day, self.get_today_events(day)),
+        }
+
+    def import_state(self, state: dict, day: date = None):
+        """Заполняет кэш из снимка без единого запроса к базе."""
+        members = state["members"]
+        self.cache.set("members", members)
+        self.cache.set("events", state["events"])
+        self.cache.set("graph", FamilyGraph(members, state["relations"]))
+
+        today_day, today_events = state["today"]
+        if today_day == (day or date.today()):
+            self.cache.set(("today", today_day), today_events)
+            self._occurrences_advanced_on = today_day
+
+    def add_member(self, name: str, birth_date: date, death_date: date | None, gender: str,
+                   forms: dict | None = None) -> MemberSnapshot:
+        # Склоняем один раз при записи, а не при каждой отправке (forms — уже склоненные в пуле)
+        forms = forms or name_forms(name, gender)
+
+        def action(db):
+            member = FamilyMember(name=name, birth_date=birth_date, death_date=death_date, gender=gender,
+                                  family_id=self.family_id, **forms)
+            db.add(member)
+            db.flush()
+            snapshot = MemberSnapshot.from_row(member)
+            self._count(db, [snapshot], member_counters)
+            return snapshot
+        return self._write(action, "member", "added")
+
+    def add_members_bulk(self, rows: list) -> list:
+        """
+        Добавляет пачку членов семьи одним executemany (INSERT ... RETURNING) в одной транзакции.
+        rows — словари с name, birth_date, death_date, gender (и формами имени, если они уже вычислены).
+        """
+        rows = [
+            self._owned(row if "name_genitive" in row else dict(row, **name_forms(row["name"], row.get("gender"))))
+            for row in rows
+        ]
+
+        def action(db):
+            # render_nulls: у всех строк одинаковый набор колонок, поэтому весь пакет уходит одним executemany
+            created = db.scalars(insert(FamilyMember).returning(FamilyMember), rows,
+                                 execution_options={"render_nulls": True}).all()
+            snapshots = [MemberSnapshot.from_row(member) for member in created]
+            self._count(db, snapshots, member_counters)
+            return snapshots
+
+        snapshots = self._write(action)
+        for snapshot in snapshots:
+            self._notify("member", "added", snapshot)
+        return snapshots
+
+    def set_member_declension(self, name: str, forms: dict | None) -> MemberSnapshot | None:
+        """
+        Исправляет формы имени вручную. forms — {"name_genitive": ..., ...};
+        None — вернуть автоматическое склонение.
+        """
+        def action(db):
+            member = self._members(db).filter(FamilyMember.name == name).first()
+            if not member:
+                return None
+            for column, value in (forms or name_forms(member.name, member.gender)).items():
+                setattr(member, column, value)
+            member.name_forms_manual = forms is not None
+            return MemberSnapshot.from_row(member)
+        return self._write(action, "member", "updated")
+
+    def remove_member(self, name: str) -> MemberSnapshot | None:
+        def action(db):
+            member = self._members(db).filter(FamilyMember.name == name).first()
+            if not member:
+                return None
+            snapshot = MemberSnapshot.from_row(member)
+            db.delete(member)
+            self._count(db, [snapshot], member_counters, sign=-1)
+            return snapshot
+        return self._write(action, "member", "removed")
+
+    def set_member_photo(self, name: str, photo_file_id: str) -> MemberSnapshot | None:
+        def action(db):
+            member = self._members(db).filter(FamilyMember.name == name).first()
+            if not member:
+                return None
+            member.photo_file_id = photo_file_id
+            return MemberSnapshot.from_row(member)
+        return self._write(action, "member", "updated")
+
+    def add_event(self, title: str, event_date: date, event_type, description: str,
+                  recurrence_rule: str | None = None, recurring: bool = True) -> EventSnapshot:
+        def action(db):
+            event = FamilyEvent(
+                family_id=self.family_id,
+                title=title,
+                event_date=event_date,
+                event_type=event_type,
+                description=description,
+                photo_ids=[],  # Инициализируем пустым массивом для возможности дальнейшего добавления фото
+                recurring=recurring,
+                recurrence_rule=recurrence_rule,
+                next_occurrence=next_occurrence(event_date, recurrence_rule, recurring, date.today())
+            )
+            db.add(event)
+            db.flush()
+            snapshot = EventSnapshot.from_row(event)
+            self._count(db, [snapshot], event_counters)
+            return snapshot
+        return self._write(action, "event", "added")
+
+    def add_events_bulk(self, rows: list) -> list:
+        """Добавляет пачку событий одним executemany в одной транзакции (как add_members_bulk)."""
+        today = date.today()
+        rows = [
+            self._owned(dict(row, photo_ids=[], recurring=True, recurrence_rule=None,
+                             next_occurrence=next_occurrence(row["event_date"], None, True, today)))
+            for row in rows
+        ]
+
+        def action(db):
+            created = db.scalars(insert(FamilyEvent).returning(FamilyEvent), rows,
+                                 execution_options={"render_nulls": True}).all()
+            snapshots = [EventSnapshot.from_row(event) for event in created]
+            self._count(db, snapshots, event_counters)
+            return snapshots
+
+        snapshots = self._write(action)
+        for snapshot in snapshots:
+            self._notify("event", "added", snapshot)
+        return snapshots
+
+    def set_event_rule(self, title: str, recurrence_rule: str | None, recurring: bool = True):
+        """Меняет правило повторения события и пересчитывает ближайшую дату."""
+        def action(db):
+            event = self._events(db).filter(FamilyEvent.title == title).first()
+            if not event:
+                return None
+            event.recurrence_rule = recurrence_rule
+            event.recurring = recurring
+            event.next_occurrence = next_occurrence(event.event_date, recurrence_rule, recurring, date.today())
+            return EventSnapshot.from_row(event)
+        return self._write(action, "event", "updated")
+
+    def add_event_photo(self, title: str, photo_file_id: str):
+        """
+        Добавляет фото к событию.
+        Возвращает (снимок события, добавлено ли фото) или None, если событие не найдено.
+        """
+        def action(db):
+            event = self._events(db).filter(FamilyEvent.title == title).first()
+            if not event:
+                return None
+            if isinstance(event.photo_ids, list):
+                photo_ids = list(event.photo_ids)
+            else:
+                # Старые записи могут хранить photo_ids строкой
+                first_photo_id = get_first_photo_id(event.photo_ids)
+                photo_ids = [first_photo_id] if first_photo_id else []
+            if photo_file_id in photo_ids:
+                return EventSnapshot.from_row(event), False
+            # Присваиваем новый список: изменения внутри JSON-поля SQLAlchemy не отслеживает
+            event.photo_ids = photo_ids + [photo_file_id]
+            return EventSnapshot.from_row(event), True
+        return self._write(action, "event", "updated", snapshot_of=lambda result: result[0])
+
+    def add_relationship(self, member_id: int, relative_id: int, relation_type: RelationType,
+                         since_date: date | None = None) -> RelationSnapshot | None:
+        """
+        Добавляет связь. Для PARENT member — родитель, relative — ребенок.
+        Возвращает снимок связи или None, если такая связь уже есть.
+        """
+        def action(db):
+            exists = db.query(FamilyRelationship.id).filter(
+                FamilyRelationship.member_id == member_id,
+                FamilyRelationship.relative_id == relative_id,
+                FamilyRelationship.relation_type == relation_type.value
+            ).first()
+            if exists:
+                return None
+            relation = FamilyRelationship(
+                member_id=member_id,
+                relative_id=relative_id,
+                relation_type=relation_type.value,
+                since_date=since_date
+            )
+            db.add(relation)
+            db.flush()
+            return RelationSnapshot.from_row(relation)
+        return self._write(action, "relation", "added")
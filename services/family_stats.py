@@ -0,0 +1,144 @@
+"""
+Статистика семьи из таблицы счетчиков family_stats.
+
+Вместо COUNT(*) и перебора всех членов семьи при каждом /stats репозиторий
+при каждой записи (add_member, remove_member, add_event и пакетные варианты)
+меняет несколько счетчиков в той же транзакции. Чтение — одна выборка
+из family_stats по семье: строк в ней не больше, чем разных лет рождения
+плюс 36 месячных, сколько бы ни было членов семьи и событий.
+
+Счетчики:
+    living / deceased       — живые и ушедшие члены семьи
+    events                  — события
+    birth_year (год)        — живые по году рождения (из него — возрасты)
+    birthday_month (месяц)  — дни рождения всех членов семьи
+    memorial_month (месяц)  — дни памяти
+    event_month (месяц)     — события
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database.models import FamilyStat
+
+LIVING = "living"
+DECEASED = "deceased"
+EVENTS = "events"
+BIRTH_YEAR = "birth_year"
+BIRTHDAY_MONTH = "birthday_month"
+MEMORIAL_MONTH = "memorial_month"
+EVENT_MONTH = "event_month"
+
+MONTH_BUCKETS = (BIRTHDAY_MONTH, MEMORIAL_MONTH, EVENT_MONTH)
+
+MONTH_NAMES = {
+    1: "январь", 2: "февраль", 3: "март", 4: "апрель", 5: "май", 6: "июнь",
+    7: "июль", 8: "август", 9: "сентябрь", 10: "октябрь", 11: "ноябрь", 12: "декабрь",
+}
+
+# Возрастные группы: (подпись, от, до включительно)
+AGE_GROUPS = (
+    ("0–17", 0, 17), ("18–29", 18, 29), ("30–44", 30, 44),
+    ("45–59", 45, 59), ("60–74", 60, 74), ("75+", 75, 200),
+)
+
+
+def member_counters(member) -> list:
+    """Счетчики, в которые входит член семьи: [(bucket, key)]."""
+    counters = [(BIRTHDAY_MONTH, member.birth_date.month)]
+    if member.death_date:
+        counters += [(DECEASED, 0), (MEMORIAL_MONTH, member.death_date.month)]
+    else:
+        counters += [(LIVING, 0), (BIRTH_YEAR, member.birth_date.year)]
+    return counters
+
+
+def event_counters(event) -> list:
+    return [(EVENTS, 0), (EVENT_MONTH, event.event_date.month)]
+
+
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def apply_changes(db, family_id: int, changes: Counter):
+    """
+    Прибавляет изменения {(bucket, key): delta} к счетчикам семьи (в транзакции вызывающего).
+
+    Одним INSERT ... ON CONFLICT DO UPDATE: два писателя, которые одновременно
+    создают один и тот же счетчик, не падают на первичном ключе, а складываются.
+    Строки идут в порядке ключа, чтобы параллельные транзакции брали блокировки
+    в одном порядке.
+    """
+    rows = [{"family_id": family_id, "bucket": bucket, "key": key, "count": delta}
+            for (bucket, key), delta in sorted(changes.items()) if delta]
+    if not rows:
+        return
+    upsert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        statement = upsert(FamilyStat).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[FamilyStat.family_id, FamilyStat.bucket, FamilyStat.key],
+            set_={"count": FamilyStat.count + statement.excluded["count"]},
+        ))
+        return
+
+    # Другие СУБД: UPDATE, а если строки еще нет — INSERT
+    for row in rows:
+        bucket, key, delta = row["bucket"], row["key"], row["count"]
+        updated = db.execute(
+            update(FamilyStat)
+            .where(FamilyStat.family_id == family_id, FamilyStat.bucket == bucket, FamilyStat.key == key)
+            .values(count=FamilyStat.count + delta)
+        ).rowcount
+        if not updated:
+            db.execute(insert(FamilyStat).values(family_id=family_id, bucket=bucket, key=key, count=delta))
+
+
+@dataclass(frozen=True)
+class FamilyStats:
+    living: int = 0
+    deceased: int = 0
+    events: int = 0
+    birth_years: dict = field(default_factory=dict)  # год -> живых
+    months: dict = field(default_factory=dict)       # месяц -> дат (дни рождения, памяти, события)
+
+    @property
+    def members(self) -> int:
+        return self.living + self.deceased
+
+    @classmethod
+    def load(cls, db, family_id: int) -> "FamilyStats":
+        counters = {}
+        birth_years = {}
+        months = Counter()
+        for bucket, key, count in db.query(FamilyStat.bucket, FamilyStat.key, FamilyStat.count) \
+                .filter(FamilyStat.family_id == family_id):
+            if bucket == BIRTH_YEAR:
+                if count:
+                    birth_years[key] = count
+            elif bucket in MONTH_BUCKETS:
+                months[key] += count
+            else:
+                counters[bucket] = count
+        return cls(living=counters.get(LIVING, 0), deceased=counters.get(DECEASED, 0),
+                   events=counters.get(EVENTS, 0), birth_years=birth_years, months=dict(months))
+
+    def age_groups(self, today: date = None) -> list:
+        """[(подпись, живых)] по возрасту, который исполняется в этом году."""
+        year = (today or date.today()).year
+        groups = Counter()
+        for birth_year, count in self.birth_years.items():
+            age = year - birth_year
+            for label, low, high in AGE_GROUPS:
+                if low <= age <= high:
+                    groups[label] += count
+                    break
+        return [(label, groups[label]) for label, _, _ in AGE_GROUPS if groups[label]]
+
+    def busiest_months(self, limit: int = 3) -> list:
+        """[(месяц, число дат)] — самые насыщенные месяцы."""
+        ranked = sorted(((count, -month) for month, count in self.months.items() if count), reverse=True)
+        return [(-month, count) for count, month in ranked[:limit]]
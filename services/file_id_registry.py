@@ -0,0 +1,157 @@
+"""
+Реестр Telegram file_id.
+
+Хранит для каждой фотографии file_unique_id, время последней успешной
+отправки и число ошибок. Испорченные file_id известны заранее, поэтому
+отправитель сразу шлет текст без фото и не тратит запрос к API впустую.
+Полная проверка всех file_id выполняется ночью, вне горячего пути.
+"""
+import asyncio
+from datetime import datetime
+from telegram.error import BadRequest
+
+from config import Config
+from database.connection import SessionLocal
+from database.models import FamilyMember, FamilyEvent, TelegramFile
+from services.notification_service import get_first_photo_id
+
+# Ответы Telegram, которые означают, что испорчен сам file_id. Остальные BadRequest
+# (ошибка разметки подписи, чат не найден, слишком длинный текст) к файлу отношения не имеют.
+FILE_ERROR_MARKERS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+)
+# getFile для рабочего файла больше 20 МБ: file_id исправен, файл просто нельзя скачать ботом
+FILE_TOO_BIG_MARKER = "file is too big"
+
+
+class FileIdRegistry:
+    def __init__(self, session_factory=SessionLocal, max_failures: int = None):
+        self.session_factory = session_factory
+        self.max_failures = max_failures or Config.FILE_ID_MAX_FAILURES
+        self._bad = None  # Множество испорченных file_id (загружается лениво)
+        self._pending = {}  # file_id -> (успех?, file_unique_id, текст ошибки, время)
+
+    # --- ЧТЕНИЕ ---
+
+    def load(self):
+        """Загружает из базы список испорченных file_id."""
+        db = self.session_factory()
+        try:
+            rows = db.query(TelegramFile.file_id).filter(
+                TelegramFile.failure_count >= self.max_failures
+            ).all()
+            self._bad = {row.file_id for row in rows}
+        finally:
+            db.close()
+
+    def is_known_bad(self, file_id: str) -> bool:
+        """True, если file_id уже признан испорченным."""
+        if self._bad is None:
+            self.load()
+        return file_id in self._bad
+
+    # --- ЗАПИСЬ РЕЗУЛЬТАТОВ ---
+
+    def record_success(self, file_id: str, file_unique_id: str | None = None):
+        """Запоминает успешную отправку (запись в базу — при flush())."""
+        if self._bad is not None:
+            self._bad.discard(file_id)
+        self._pending[file_id] = (True, file_unique_id, None, datetime.utcnow())
+
+    def record_failure(self, file_id: str, error: str):
+        """Запоминает ошибку Telegram для file_id (запись в базу — при flush())."""
+        self._pending[file_id] = (False, None, error, datetime.utcnow())
+
+    @staticmethod
+    def is_file_error(error: Exception) -> bool:
+        """Ошибка относится к самому файлу (а не к сети, лимитам или тексту сообщения)."""
+        if not isinstance(error, BadRequest):
+            return False
+        message = str(error).lower()
+        return any(marker in message for marker in FILE_ERROR_MARKERS)
+
+    def flush(self):
+        """Одной транзакцией сохраняет накопленные результаты отправок."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        db = self.session_factory()
+        try:
+            existing = {
+                row.file_id: row
+                for row in db.query(TelegramFile).filter(TelegramFile.file_id.in_(list(pending))).all()
+            }
+            for file_id, (ok, file_unique_id, error, at) in pending.items():
+                row = existing.get(file_id)
+                if row is None:
+                    row = TelegramFile(file_id=file_id, failure_count=0)
+                    db.add(row)
+
+                if ok:
+                    row.last_success_at = at
+                    row.failure_count = 0
+                    row.last_error = None
+                    if file_unique_id:
+                        row.file_unique_id = file_unique_id
+                else:
+                    row.last_failure_at = at
+                    row.failure_count = (row.failure_count or 0) + 1
+                    row.last_error = error
+                    if row.failure_count >= self.max_failures and self._bad is not None:
+                        self._bad.add(file_id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Не удалось сохранить реестр file_id: {e}")
+        finally:
+            db.close()
+
+    # --- НОЧНАЯ ПРОВЕРКА ---
+
+    def collect_file_ids(self) -> set:
+        """Все file_id, которые бот может отправить: фото членов семьи и событий."""
+        db = self.session_factory()
+        try:
+            file_ids = {
+                row.photo_file_id
+                for row in db.query(FamilyMember.photo_file_id).filter(FamilyMember.photo_file_id != None).all()
+            }
+            for row in db.query(FamilyEvent.photo_ids).filter(FamilyEvent.photo_ids != None).all():
+                photo_id = get_first_photo_id(row.photo_ids)
+                if photo_id:
+                    file_ids.add(photo_id)
+            return file_ids
+        finally:
+            db.close()
+
+    async def validate_all(self, bot, delay: float = 0.1):
+        """
+        Проверяет все file_id через getFile.
+        Возвращает (число рабочих, число испорченных).
+        """
+        ok_count = bad_count = 0
+
+        for file_id in self.collect_file_ids():
+            try:
+                telegram_file = await bot.get_file(file_id)
+                self.record_success(file_id, telegram_file.file_unique_id)
+                ok_count += 1
+            except Exception as e:
+                if isinstance(e, BadRequest) and FILE_TOO_BIG_MARKER in str(e).lower():
+                    # Рабочий, но не скачиваемый через getFile — отправлять по file_id его можно
+                    self.record_success(file_id)
+                    ok_count += 1
+                elif not self.is_file_error(e):
+                    print(f"⚠️ Проверка file_id пропущена: {e}")
+                    continue
+                else:
+                    self.record_failure(file_id, str(e))
+                    bad_count += 1
+            await asyncio.sleep(delay)
+
+        self.flush()
+        print(f"✅ Проверка file_id завершена: рабочих={ok_count}, испорченных={bad_count}")
+        return ok_count, bad_count
@@ -0,0 +1,164 @@
+"""
+Календарь семьи в формате iCalendar (RFC 5545).
+
+Каждый день рождения, годовщина смерти и событие — один VEVENT на весь день
+с правилом повторения (RRULE), поэтому календарь телефона сам показывает
+все будущие даты. FamilyCalendar хранит готовый текст каждого VEVENT и при
+изменении данных (подписка на FamilyRepository) перестраивает только
+затронутые блоки; весь файл и его ETag собираются заново только при
+следующем запросе после изменения.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+from services.occurrences import ONCE, next_occurrence
+
+PRODID = "-//family-bot//Family Calendar//RU"
+
+
+def escape_text(value: str) -> str:
+    """Экранирует TEXT по RFC 5545 (обратная косая, ; , и переводы строк)."""
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold_line(line: str) -> str:
+    """Переносит строку длиннее 75 октетов (продолжение начинается с пробела)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    current = ""
+    limit = 75
+    for char in line:
+        if len((current + char).encode("utf-8")) > limit:
+            parts.append(current)
+            current = ""
+            limit = 74  # Пробел в начале продолжения тоже занимает октет
+        current += char
+    parts.append(current)
+    return "\r\n ".join(parts)
+
+
+def yearly_rule(day: date) -> str:
+    # 29 февраля: в невисокосные годы — последний день февраля
+    if (day.month, day.day) == (2, 29):
+        return "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=-1"
+    return "FREQ=YEARLY"
+
+
+def utc_stamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def vevent(uid: str, day: date, summary: str, rule: str | None, description: str | None = None,
+           stamp: str = None) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{stamp or utc_stamp()}",
+        f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}",
+        f"SUMMARY:{escape_text(summary)}",
+    ]
+    if rule:
+        lines.append(f"RRULE:{rule}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    lines.append("TRANSP:TRANSPARENT")  # Весь день, но не «занят»
+    lines.append("END:VEVENT")
+    return "\r\n".join(fold_line(line) for line in lines)
+
+
+def member_blocks(member, uid_domain: str) -> dict:
+    """VEVENT дня рождения и (для ушедших) годовщины смерти: {uid: текст}."""
+    name = member.name_genitive or member.name
+    female = member.gender == 'F'
+    blocks = {}
+    uid = f"member-{member.id}-birthday@{uid_domain}"
+    summary = f"🕯️ День рождения {name}" if member.death_date else f"🎂 День рождения {name}"
+    blocks[uid] = vevent(uid, member.birth_date, summary, yearly_rule(member.birth_date),
+                         f"{'Родилась' if female else 'Родился'} {member.birth_date.strftime('%d.%m.%Y')}")
+    if member.death_date:
+        uid = f"member-{member.id}-memorial@{uid_domain}"
+        blocks[uid] = vevent(uid, member.death_date, f"🕯️ День памяти {name}", yearly_rule(member.death_date),
+                             f"{'Ушла' if female else 'Ушел'} из жизни {member.death_date.strftime('%d.%m.%Y')}")
+    return blocks
+
+
+def event_blocks(event, uid_domain: str) -> dict:
+    uid = f"event-{event.id}@{uid_domain}"
+    once = event.recurrence_rule == ONCE or (event.recurrence_rule is None and event.recurring is False)
+    if once:
+        start, rule = event.event_date, None
+    elif event.recurrence_rule:
+        # Первое повторение по правилу (например, «последнее воскресенье мая»)
+        start = next_occurrence(event.event_date, event.recurrence_rule, event.recurring, event.event_date)
+        rule = event.recurrence_rule
+    else:
+        start, rule = event.event_date, yearly_rule(event.event_date)
+    return {uid: vevent(uid, start or event.event_date, f"🎉 {event.title}", rule, event.description)}
+
+
+class FamilyCalendar:
+    """Календарь одной семьи с пересборкой только измененных VEVENT."""
+
+    def __init__(self, repository, name: str, uid_domain: str = "family-bot"):
+        self.repository = repository
+        self.name = name
+        self.uid_domain = uid_domain
+        self.blocks = None          # OrderedDict uid -> VEVENT; None — еще не строился
+        self.owners = {}            # ("member"|"event", id) -> [uid]
+        self._body = None
+        self._etag = None
+        self.generations = 0        # Сколько раз файл собирался целиком
+        self.block_updates = 0      # Сколько VEVENT перестроено по изменениям
+        repository.subscribe(self.on_change)
+
+    def _set_owner(self, key, blocks: dict):
+        for uid in self.owners.pop(key, []):
+            self.blocks.pop(uid, None)
+        self.blocks.update(blocks)
+        self.owners[key] = list(blocks)
+        self.block_updates += len(blocks)
+
+    def _build(self):
+        self.blocks = OrderedDict()
+        self.owners = {}
+        for member in self.repository.list_members():
+            self._set_owner(("member", member.id), member_blocks(member, self.uid_domain))
+        for event in self.repository.list_events():
+            self._set_owner(("event", event.id), event_blocks(event, self.uid_domain))
+
+    def on_change(self, entity: str, action: str, snapshot):
+        """Подписчик FamilyRepository: перестраивает VEVENT только измененной строки."""
+        if self.blocks is None or entity not in ("member", "event"):
+            return
+        key = (entity, snapshot.id)
+        if action == "removed":
+            self._set_owner(key, {})
+        elif entity == "member":
+            self._set_owner(key, member_blocks(snapshot, self.uid_domain))
+        else:
+            self._set_owner(key, event_blocks(snapshot, self.uid_domain))
+        self._body = None
+
+    def render(self) -> tuple:
+        """(тело файла в байтах, сильный ETag). Собирается заново только после изменений."""
+        if self.blocks is None:
+            self._build()
+        if self._body is None:
+            header = [
+                "BEGIN:VCALENDAR",
+                "VERSION:2.0",
+                f"PRODID:{PRODID}",
+                "CALSCALE:GREGORIAN",
+                fold_line(f"X-WR-CALNAME:{escape_text(self.name)}"),
+                "X-PUBLISHED-TTL:PT15M",
+            ]
+            body = "\r\n".join(header + list(self.blocks.values()) + ["END:VCALENDAR"]) + "\r\n"
+            self._body = body.encode("utf-8")
+            self._etag = '"' + hashlib.sha256(self._body).hexdigest()[:32] + '"'
+            self.generations += 1
+            print(f"📅 Календарь «{self.name}» собран: {len(self.blocks)} событий, {len(self._body)} байт.")
+        return self._body, self._etag
@@ -0,0 +1,149 @@
+"""
+Монитор здоровья цикла событий.
+
+- Каждые LOOP_MONITOR_INTERVAL секунд измеряет задержку цикла (насколько
+  позже запланированного проснулась задача-сэмплер).
+- Сторожевой поток замечает, что цикл не отвечает дольше LOOP_LAG_WARN_MS,
+  и печатает стек потока цикла в этот момент — видно, какой хендлер
+  (list_members, handle_photo_reply, ...) и какая строка его держат.
+- В отладочном режиме (LOOP_DEBUG=1) включается asyncio debug с порогом
+  медленных колбэков и сообщается о каждом синхронном SQL-запросе,
+  выполненном прямо в потоке цикла (по одному разу на место вызова).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def project_frames(frames) -> list:
+    """Кадры стека из кода проекта (без библиотек и самого монитора)."""
+    return [
+        frame for frame in frames
+        if frame.filename.startswith(PROJECT_ROOT)
+        and "site-packages" not in frame.filename
+        and not frame.filename.endswith("loop_monitor.py")
+    ]
+
+
+def format_frames(frames, limit: int = 8) -> str:
+    frames = project_frames(frames) or list(frames)[-5:]
+    return "".join(traceback.format_list(frames[-limit:])).rstrip()
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, warn_ms: float = 200, debug: bool = False):
+        self.interval = interval
+        self.warn_seconds = warn_ms / 1000
+        self.debug = debug
+
+        self.samples = deque(maxlen=max(1, int(60 / interval)))  # Последняя минута
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall_stack = None
+        self.sql_on_loop = Counter()  # место вызова -> число запросов
+
+        self.loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._reported_heartbeat = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    # --- ЗАПУСК ---
+
+    def start(self):
+        """Вызывается из работающего цикла (post_init)."""
+        loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = loop.create_task(self._sample())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.warn_seconds
+        print(f"✅ Монитор цикла событий запущен (порог {self.warn_seconds * 1000:.0f}ms"
+              f"{', отладка' if self.debug else ''}).")
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _sample(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - started - self.interval
+            self._heartbeat = now
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.warn_seconds:
+                self.stalls += 1
+                print(f"⚠️ Цикл событий задержан на {lag * 1000:.0f}ms.")
+
+    def _watchdog(self):
+        """Отдельный поток: если цикл не отвечает, снимает стек потока цикла."""
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat < self.warn_seconds or self._reported_heartbeat == heartbeat:
+                continue
+            self._reported_heartbeat = heartbeat  # Один стек на одну остановку
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = format_frames(traceback.extract_stack(frame))
+            self.last_stall_stack = stack
+            print(f"🧵 Цикл событий заблокирован дольше {self.warn_seconds * 1000:.0f}ms. Сейчас выполняется:\n{stack}")
+
+    # --- СИНХРОННЫЙ SQL В ЦИКЛЕ (только LOOP_DEBUG) ---
+
+    def install_sql_detector(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() != self.loop_thread_id:
+                return
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return  # Поток цикла, но вне цикла (запуск, остановка)
+
+            frames = project_frames(traceback.extract_stack())
+            site = f"{frames[-1].filename[len(PROJECT_ROOT) + 1:]}:{frames[-1].lineno} {frames[-1].name}" \
+                if frames else "?"
+            self.sql_on_loop[site] += 1
+            if self.sql_on_loop[site] == 1:
+                print(f"🐌 Синхронный SQL в цикле событий ({site}): {' '.join(statement.split())[:150]}")
+
+    # --- СТАТИСТИКА ---
+
+    def stats(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0.0
+
+        return {
+            "p50_ms": percentile(50) * 1000,
+            "p99_ms": percentile(99) * 1000,
+            "max_ms": self.max_lag * 1000,
+            "stalls": self.stalls,
+            "sql_on_loop": sum(self.sql_on_loop.values()),
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        line = (f"задержка цикла p50={stats['p50_ms']:.1f}ms, p99={stats['p99_ms']:.1f}ms, "
+                f"макс.={stats['max_ms']:.0f}ms, остановок={stats['stalls']}")
+        if self.debug:
+            line += f", синхронных SQL в цикле={stats['sql_on_loop']} (мест: {len(self.sql_on_loop)})"
+        return line
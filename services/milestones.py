@@ -0,0 +1,235 @@
+"""
+Производные памятные даты (вехи), вычисленные из уже известных дат:
+- круглое число прожитых дней (5 000, 10 000, ...);
+- юбилейные дни рождения (50 лет и т.д.) — заранее (в сам день и так
+  приходит поздравление с днем рождения);
+- юбилеи свадеб по связям супругов (family_relationships.since_date)
+  и по событиям-годовщинам (ANNIVERSARY).
+
+Вехи заранее раскладываются в таблицу «день → вехи» на горизонт
+MILESTONE_HORIZON_DAYS. Поиск на сегодня — одно обращение к словарю, а при
+записи (новый член семьи, связь, событие) пересчитываются только вехи
+затронутого человека или пары.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from config import Config
+from database.models import EventType, RelationType
+
+
+# Виды вех
+DAYS_ALIVE = "days_alive"
+JUBILEE_BIRTHDAY_AHEAD = "jubilee_birthday_ahead"
+WEDDING_JUBILEE = "wedding_jubilee"
+WEDDING_JUBILEE_AHEAD = "wedding_jubilee_ahead"
+
+DAYS_ALIVE_STEP = 5000
+
+# Названия юбилеев свадьбы
+WEDDING_NAMES = {
+    1: "ситцевая", 5: "деревянная", 10: "оловянная", 15: "хрустальная",
+    20: "фарфоровая", 25: "серебряная", 30: "жемчужная", 35: "коралловая",
+    40: "рубиновая", 45: "сапфировая", 50: "золотая", 55: "изумрудная",
+    60: "бриллиантовая", 65: "железная", 70: "благодатная", 75: "коронная",
+}
+
+
+@dataclass(frozen=True)
+class Milestone:
+    """Одна веха на конкретный день."""
+    day: date
+    kind: str
+    value: int  # Число дней или лет
+    subject: object  # MemberSnapshot, EventSnapshot или (MemberSnapshot, MemberSnapshot)
+    photo_id: str | None = None
+    days_ahead: int = 0  # Для заблаговременных напоминаний
+
+
+def add_years(day: date, years: int) -> date:
+    """Та же дата через years лет (29 февраля → 28 февраля)."""
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28)
+
+
+def _jubilee_years(since: date, start: date, end: date, step_filter):
+    """Годовщины since, попадающие в [start, end), для которых step_filter(годы) истинно."""
+    for year in range(start.year, end.year + 1):
+        years = year - since.year
+        if years <= 0 or not step_filter(years):
+            continue
+        anniversary = add_years(since, years)
+        yield years, anniversary
+
+
+def member_milestones(member, start: date, end: date, notice_days: int) -> list:
+    """Вехи одного члена семьи в окне [start, end)."""
+    result = []
+    if not member.birth_date:
+        return result
+
+    # 🌟 Круглое число прожитых дней (только для живых)
+    if member.death_date is None:
+        # Первое кратное DAYS_ALIVE_STEP число дней, которое наступает не раньше start
+        first = -(-(start - member.birth_date).days // DAYS_ALIVE_STEP)
+        count = max(first, 1) * DAYS_ALIVE_STEP
+        while True:
+            day = member.birth_date + timedelta(days=count)
+            if day >= end:
+                break
+            if day >= start:
+                result.append(Milestone(day, DAYS_ALIVE, count, member, member.photo_file_id))
+            count += DAYS_ALIVE_STEP
+
+    # 🎊 Юбилейные дни рождения: за notice_days до дня рождения
+    for years, anniversary in _jubilee_years(member.birth_date, start, end + timedelta(days=notice_days),
+                                             lambda years: years % 10 == 0):
+        ahead = anniversary - timedelta(days=notice_days)
+        if notice_days and member.death_date is None and start <= ahead < end:
+            result.append(Milestone(ahead, JUBILEE_BIRTHDAY_AHEAD, years, member, member.photo_file_id,
+                                    days_ahead=notice_days))
+    return result
+
+
+def couple_milestones(first, second, since: date, start: date, end: date, notice_days: int) -> list:
+    """Юбилеи свадьбы пары (по связи супругов с датой свадьбы)."""
+    result = []
+    couple = (first, second)
+    for years, anniversary in _jubilee_years(since, start, end + timedelta(days=notice_days),
+                                             lambda years: years in WEDDING_NAMES):
+        if start <= anniversary < end:
+            result.append(Milestone(anniversary, WEDDING_JUBILEE, years, couple))
+        ahead = anniversary - timedelta(days=notice_days)
+        if notice_days and start <= ahead < end:
+            result.append(Milestone(ahead, WEDDING_JUBILEE_AHEAD, years, couple, days_ahead=notice_days))
+    return result
+
+
+def event_milestones(event, start: date, end: date, notice_days: int) -> list:
+    """
+    Заблаговременные напоминания о юбилеях событий-годовщин.
+    В сам день о событии и так приходит обычное уведомление.
+    """
+    result = []
+    if event.event_type != EventType.ANNIVERSARY or not notice_days:
+        return result
+    for years, anniversary in _jubilee_years(event.event_date, start, end + timedelta(days=notice_days),
+                                             lambda years: years in WEDDING_NAMES):
+        ahead = anniversary - timedelta(days=notice_days)
+        if start <= ahead < end:
+            result.append(Milestone(ahead, WEDDING_JUBILEE_AHEAD, years, event, days_ahead=notice_days))
+    return result
+
+
+class MilestoneIndex:
+    """
+    Таблица «день → вехи» с точечным пересчетом при записи.
+    Подписывается на изменения FamilyRepository; полностью перестраивается
+    только раз в сутки (первым обращением нового дня), чтобы сдвинуть окно.
+    """
+
+    def __init__(self, repository, horizon_days: int = None, notice_days: int = None):
+        self.repository = repository
+        repository.subscribe(self.on_change)
+        self.horizon_days = horizon_days or Config.MILESTONE_HORIZON_DAYS
+        self.notice_days = Config.MILESTONE_NOTICE_DAYS if notice_days is None else notice_days
+        self.by_day = {}      # date -> [Milestone]
+        self.by_subject = {}  # ключ субъекта -> [Milestone]
+        self.start = None
+        self.end = None
+
+    # --- ПОСТРОЕНИЕ ---
+
+    def rebuild(self, today: date = None):
+        """Полная перестройка (при старте и раз в сутки, чтобы сдвинуть окно)."""
+        members = self.repository.list_members()
+        events = self.repository.list_events()
+        graph = self.repository.family_graph()
+
+        self.start = today or date.today()
+        self.end = self.start + timedelta(days=self.horizon_days)
+        self.by_day = {}
+        self.by_subject = {}
+
+        for member in members:
+            self.update_member(member)
+        for event in events:
+            self.update_event(event)
+        for relation in graph.relations:
+            self.update_relation(relation, graph)
+
+    def _replace(self, key, milestones):
+        for milestone in self.by_subject.pop(key, []):
+            day_list = self.by_day.get(milestone.day, [])
+            if milestone in day_list:
+                day_list.remove(milestone)
+            if not day_list:
+                self.by_day.pop(milestone.day, None)
+
+        if milestones:
+            self.by_subject[key] = milestones
+            for milestone in milestones:
+                self.by_day.setdefault(milestone.day, []).append(milestone)
+
+    @property
+    def built(self) -> bool:
+        return self.start is not None
+
+    def ensure_current(self, today: date = None):
+        """Перестраивает таблицу, если наступил новый день."""
+        today = today or date.today()
+        if self.start != today:
+            self.rebuild(today)
+
+    def on_change(self, entity: str, action: str, snapshot):
+        """Подписчик FamilyRepository: пересчитывает только затронутые вехи."""
+        if not self.built:
+            return
+        if entity == "member" and action == "removed":
+            self.remove_member(snapshot.id)
+        elif entity == "member":
+            self.update_member(snapshot)
+        elif entity == "event":
+            self.update_event(snapshot)
+        elif entity == "relation":
+            self.update_relation(snapshot, self.repository.family_graph())
+
+    # --- ТОЧЕЧНЫЕ ОБНОВЛЕНИЯ ---
+
+    def update_member(self, member):
+        if self.built:
+            self._replace(("member", member.id), member_milestones(member, self.start, self.end, self.notice_days))
+
+    def remove_member(self, member_id: int):
+        self._replace(("member", member_id), [])
+        for key in [key for key in self.by_subject if key[0] == "couple" and member_id in key[1:]]:
+            self._replace(key, [])
+
+    def update_event(self, event):
+        if self.built:
+            self._replace(("event", event.id), event_milestones(event, self.start, self.end, self.notice_days))
+
+    def update_relation(self, relation, graph):
+        if not self.built or relation.relation_type != RelationType.SPOUSE.value or not relation.since_date:
+            return
+        first = graph.members.get(relation.member_id)
+        second = graph.members.get(relation.relative_id)
+        if first and second:
+            key = ("couple", relation.member_id, relation.relative_id)
+            self._replace(key, couple_milestones(first, second, relation.since_date,
+                                                 self.start, self.end, self.notice_days))
+
+    # --- ЧТЕНИЕ ---
+
+    def for_day(self, day: date = None) -> list:
+        self.ensure_current()
+        return list(self.by_day.get(day or date.today(), []))
+
+    def upcoming(self, start: date, days: int) -> list:
+        self.ensure_current()
+        result = []
+        for offset in range(days):
+            result.extend(self.by_day.get(start + timedelta(days=offset), []))
+        return result
@@ -0,0 +1,372 @@
+"""
+Единый конвейер ежедневных уведомлений.
+
+Этапы построены как цепочка генераторов:
+    query → classify → render → batch → dispatch
+
+Каждый этап можно запускать и замерять отдельно (например, в бенчмарке
+прогнать query → render без отправки), а отправка идет в подключаемый
+«сток» (sink): Telegram, консоль или память.
+
+При отправке (run) работа процессора уходит из цикла событий: имена всего
+дня склоняются одной задачей в пуле (services/declension.py), затем все
+тексты формируются одной задачей в пуле потоков; порядок уведомлений
+сохраняется.
+"""
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from telegram.constants import ParseMode
+
+from config import Config
+from services.declension import get_executor
+
+
+# Виды уведомлений
+KIND_BIRTHDAY = "birthday"
+KIND_EVENT = "event"
+KIND_DEATH = "death"
+KIND_MILESTONE = "milestone"
+
+NO_EVENTS_TEXT = "📅 Сегодня нет знаменательных дат"
+
+
+@dataclass
+class Notification:
+    """Одно уведомление, проходящее через конвейер."""
+    kind: str
+    subject: object  # FamilyMember, FamilyEvent или Milestone
+    photo_id: str | None = None
+    text: str = ""
+    preface: str | None = None  # Короткое сообщение перед основным (анимация 🎂)
+
+
+@dataclass
+class DispatchResult:
+    """Итог отправки."""
+    sent: int = 0
+    failed: int = 0
+
+
+# ----------------------------------------------------
+# --- ЗАМЕРЫ ЭТАПОВ ---
+# ----------------------------------------------------
+
+class StageTimings:
+    """
+    Собирает время работы каждого этапа.
+
+    Генераторы ленивые, поэтому время next() у этапа включает время всех
+    этапов выше по течению. Собственное время этапа считается как разница
+    с предыдущим этапом.
+    """
+
+    def __init__(self):
+        self.inclusive = {}
+        self.order = []
+        # Этапы, замеренные напрямую (не через wrap): их время не включает этапы выше
+        self.direct = {"dispatch"}
+
+    def add(self, stage: str, seconds: float, direct: bool = False):
+        if direct:
+            self.direct.add(stage)
+        if stage not in self.inclusive:
+            self.inclusive[stage] = 0.0
+            self.order.append(stage)
+        self.inclusive[stage] += seconds
+
+    def wrap(self, stage: str, iterable):
+        """Оборачивает этап-генератор и замеряет время его next()."""
+        # Регистрируем этап сразу: генераторы стартуют с конца цепочки
+        self.add(stage, 0.0)
+        return self._timed(stage, iter(iterable))
+
+    def _timed(self, stage: str, iterator):
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - started)
+                return
+            self.add(stage, time.perf_counter() - started)
+            yield item
+
+    def exclusive(self) -> dict:
+        """Собственное время каждого этапа (без времени этапов выше по течению)."""
+        result = {}
+        previous = 0.0
+        for stage in self.order:
+            total = self.inclusive[stage]
+            # dispatch (и этапы в пуле) замеряются напрямую, а не через wrap()
+            if stage in self.direct:
+                result[stage] = total
+                continue
+            result[stage] = max(total - previous, 0.0)
+            previous = total
+        return result
+
+    def report(self) -> str:
+        return ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.exclusive().items())
+
+
+# ----------------------------------------------------
+# --- ЭТАПЫ КОНВЕЙЕРА ---
+# ----------------------------------------------------
+
+def query_stage(source, milestones=None):
+    """
+    Этап 1: получает события на сегодня из источника (NotificationService или
+    FamilyRepository) и вехи из MilestoneIndex (если он задан).
+    """
+    birthdays, events, death_anniversaries = source.get_today_events()
+
+    for member in birthdays:
+        yield KIND_BIRTHDAY, member
+    for event in events:
+        yield KIND_EVENT, event
+    for member in death_anniversaries:
+        yield KIND_DEATH, member
+
+    if milestones is not None:
+        for milestone in milestones.for_day():
+            yield KIND_MILESTONE, milestone
+
+
+def classify_stage(items, service, registry=None):
+    """
+    Этап 2: определяет вид уведомления и фотографию к нему.
+    Заведомо испорченные file_id (по реестру) сразу отбрасываются.
+    """
+    for kind, subject in items:
+        if kind == KIND_EVENT:
+            photo_id = service.get_event_photo_id(subject)
+        elif kind == KIND_MILESTONE:
+            photo_id = subject.photo_id
+        else:
+            photo_id = subject.photo_file_id
+
+        if not (isinstance(photo_id, str) and photo_id.strip()):
+            photo_id = None
+        elif registry is not None and registry.is_known_bad(photo_id):
+            photo_id = None
+
+        yield Notification(
+            kind=kind,
+            subject=subject,
+            photo_id=photo_id,
+            preface="🎂" if kind == KIND_BIRTHDAY else None,  # Запускает полноэкранную анимацию
+        )
+
+
+def render_stage(notifications, service):
+    """Этап 3: формирует текст уведомления."""
+    formatters = {
+        KIND_BIRTHDAY: service.format_birthday_message,
+        KIND_EVENT: service.format_event_message,
+        KIND_DEATH: service.format_death_anniversary_message,
+        KIND_MILESTONE: service.format_milestone_message,
+    }
+    for notification in notifications:
+        notification.text = formatters[notification.kind](notification.subject)
+        yield notification
+
+
+def batch_stage(notifications, size: int):
+    """Этап 4: группирует уведомления в пачки; между пачками делается пауза."""
+    batch = []
+    for notification in notifications:
+        batch.append(notification)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def send_with_photo(sink, notification: Notification, registry=None):
+    """
+    Отправляет уведомление с фото. Если Telegram отверг file_id,
+    ошибка записывается в реестр, а уведомление сразу уходит текстом.
+    """
+    try:
+        message = await sink.send_photo(notification.photo_id, notification.text)
+    except Exception as e:
+        if registry is None or not registry.is_file_error(e):
+            raise
+        print(f"⚠️ file_id не принят Telegram, отправляем текст: {e}")
+        registry.record_failure(notification.photo_id, str(e))
+        return await sink.send_text(notification.text)
+
+    if registry is not None:
+        photos = getattr(message, "photo", None)
+        registry.record_success(notification.photo_id, photos[-1].file_unique_id if photos else None)
+    return message
+
+
+async def dispatch_stage(batches, sink, delay: float, timings: StageTimings, registry=None) -> DispatchResult:
+    """
+    Этап 5: отправляет пачки в сток.
+
+    Ошибка одного уведомления не прерывает отправку остальных.
+    """
+    result = DispatchResult()
+
+    for batch in batches:
+        for notification in batch:
+            started = time.perf_counter()
+            try:
+                if notification.preface:
+                    try:
+                        await sink.send_text(notification.preface, parse_mode=None)
+                    except Exception as e:
+                        print(f"❌ Предупреждение: Не удалось отправить эмодзи-анимацию: {e}")
+
+                if notification.photo_id:
+                    await send_with_photo(sink, notification, registry)
+                else:
+                    await sink.send_text(notification.text)
+                result.sent += 1
+            except Exception as e:
+                result.failed += 1
+                print(f"❌ Ошибка при отправке уведомления ({notification.kind}): {e}")
+            finally:
+                timings.add("dispatch", time.perf_counter() - started)
+
+        if delay:
+            await asyncio.sleep(delay)
+
+    return result
+
+
+# ----------------------------------------------------
+# --- СТОКИ (КУДА ОТПРАВЛЯТЬ) ---
+# ----------------------------------------------------
+
+class TelegramSink:
+    """Отправляет уведомления в чат Telegram."""
+
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+
+    async def send_text(self, text: str, parse_mode=ParseMode.MARKDOWN):
+        return await self.bot.send_message(chat_id=self.chat_id, text=text, parse_mode=parse_mode)
+
+    async def send_photo(self, photo: str, caption: str):
+        return await self.bot.send_photo(
+            chat_id=self.chat_id,
+            photo=photo,
+            caption=caption,
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+
+class ConsoleSink:
+    """Печатает уведомления в консоль (для отладки без Telegram)."""
+
+    async def send_text(self, text: str, parse_mode=ParseMode.MARKDOWN):
+        print(f"💬 {text}")
+
+    async def send_photo(self, photo: str, caption: str):
+        print(f"🖼️ [{photo}] {caption}")
+
+
+class MemorySink:
+    """Складывает уведомления в список (для бенчмарков и проверки)."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, text: str, parse_mode=ParseMode.MARKDOWN):
+        self.messages.append(("text", None, text))
+
+    async def send_photo(self, photo: str, caption: str):
+        self.messages.append(("photo", photo, caption))
+
+
+# ----------------------------------------------------
+# --- ДВИЖОК ---
+# ----------------------------------------------------
+
+class NotificationEngine:
+    """Собирает этапы в конвейер и запускает его для одного стока."""
+
+    def __init__(self, service, batch_size: int = None, delay: float = None, registry=None, source=None,
+                 milestones=None):
+        self.service = service
+        self.milestones = milestones  # MilestoneIndex (необязательно)
+        # Откуда брать события: по умолчанию сам сервис, либо FamilyRepository (кэш)
+        self.source = source or service
+        self.registry = registry  # FileIdRegistry (необязательно)
+        self.batch_size = batch_size or Config.NOTIFICATION_BATCH_SIZE
+        self.delay = Config.NOTIFICATION_SEND_DELAY if delay is None else delay
+        self.timings = StageTimings()
+
+    def subjects(self, notifications) -> list:
+        """Люди, чьи имена понадобятся при формировании текстов (включая героев вех)."""
+        return [
+            notification.subject.subject if notification.kind == KIND_MILESTONE else notification.subject
+            for notification in notifications
+        ]
+
+    async def prepare_offloaded(self) -> list:
+        """
+        Как prepare(), но склонение и формирование текстов — вне цикла событий:
+        query → classify в цикле (данные из кэша), склонение всех имен дня одной
+        задачей в пуле, render всех уведомлений одной задачей в пуле потоков.
+        """
+        timed = self.timings.wrap
+        notifications = list(timed("classify", classify_stage(
+            timed("query", query_stage(self.source, self.milestones)), self.service, self.registry
+        )))
+        if not notifications:
+            return []
+
+        started = time.perf_counter()
+        await self.service.prefetch_genitives(self.subjects(notifications))
+        self.timings.add("morphology", time.perf_counter() - started, direct=True)
+
+        started = time.perf_counter()
+        executor = get_executor()
+        if executor is None:
+            # MORPHOLOGY_EXECUTOR=inline: и склонение, и формирование текстов — прямо в цикле
+            rendered = list(render_stage(notifications, self.service))
+        else:
+            # Формирование текстов не переносится в процесс (сервису нужен общий кэш склонений):
+            # при пуле процессов — стандартный пул потоков цикла
+            if not isinstance(executor, ThreadPoolExecutor):
+                executor = None
+            # copy_context: спаны рендеринга и текущая семья видны и в потоке пула
+            context = contextvars.copy_context()
+            rendered = await asyncio.get_running_loop().run_in_executor(
+                executor, context.run, lambda: list(render_stage(notifications, self.service))
+            )
+        self.timings.add("render", time.perf_counter() - started, direct=True)
+        return list(batch_stage(rendered, self.batch_size))
+
+    def prepare(self):
+        """Этапы query → classify → render → batch (без отправки)."""
+        timed = self.timings.wrap
+        items = timed("query", query_stage(self.source, self.milestones))
+        notifications = timed("classify", classify_stage(items, self.service, self.registry))
+        rendered = timed("render", render_stage(notifications, self.service))
+        return timed("batch", batch_stage(rendered, self.batch_size))
+
+    async def run(self, sink, empty_text: str | None = NO_EVENTS_TEXT) -> DispatchResult:
+        """Запускает весь конвейер. Если событий нет, отправляет empty_text (если задан)."""
+        batches = await self.prepare_offloaded()
+        if not batches:
+            if empty_text:
+                await sink.send_text(empty_text, parse_mode=None)
+            return DispatchResult()
+
+        try:
+            result = await dispatch_stage(batches, sink, self.delay, self.timings, self.registry)
+        finally:
+            if self.registry is not None:
+                self.registry.flush()
+        print(f"INFO: Уведомления: отправлено={result.sent}, ошибок={result.failed}; {self.timings.report()}")
+        return result
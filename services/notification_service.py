@@ -1,14 +1,29 @@
 import json
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from sqlalchemy import extract
 from sqlalchemy.orm import Session
-# 1. НОВЫЙ ИМПОРТ
-import pymorphy3 
 
 # Убедитесь, что импорты ниже верны для ваших моделей
 from database.models import FamilyMember, FamilyEvent, EventType
+from services.declension import decline_name, decline_many, get_morph
+from services import milestones as ms
+
+# Короткие названия дней недели для дайджестов
+WEEKDAY_NAMES = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+
 
 # 🎯 ФУНКЦИЯ ДЛЯ ПРАВИЛЬНОГО СКЛОНЕНИЯ
+def pluralize_days(days: int) -> str:
+    """Возвращает число и правильно склоненное слово 'день'/'дня'/'дней'."""
+    if days % 100 in (11, 12, 13, 14):
+        return f"{days} дней"
+    if days % 10 == 1:
+        return f"{days} день"
+    if days % 10 in (2, 3, 4):
+        return f"{days} дня"
+    return f"{days} дней"
+
+
 def pluralize_years(years: int) -> str:
     """Возвращает число и правильно склоненное слово 'год'/'года'/'лет'."""
     if years % 100 in (11, 12, 13, 14):
@@ -20,64 +35,115 @@ def pluralize_years(years: int) -> str:
     return f"{years} лет"
 
 
+def get_first_photo_id(photo_ids) -> str | None:
+    """
+    Извлекает первый ID фотографии из значения поля photo_ids,
+    обрабатывая случай, когда photo_ids — список или строка.
+    """
+    if not photo_ids:
+        return None
+
+    # 1. Если photo_ids уже является списком
+    if isinstance(photo_ids, list) and photo_ids:
+        if isinstance(photo_ids[0], str):
+            return photo_ids[0]
+
+    # 2. Если photo_ids является строкой, пытаемся распарсить или вернуть как есть
+    if isinstance(photo_ids, str):
+        try:
+            # Убираем внешние кавычки, если есть, и заменяем одинарные на двойные
+            cleaned_ids = photo_ids.strip().replace("'", "\"")
+            photo_list = json.loads(cleaned_ids)
+
+            # Если успешно распарсили список, возвращаем первый элемент (строку)
+            if photo_list and isinstance(photo_list, list) and isinstance(photo_list[0], str):
+                return photo_list[0]
+
+        except (json.JSONDecodeError, IndexError, TypeError):
+            # Если парсинг не удался, возвращаем исходную строку.
+            return photo_ids.strip()
+
+    return None
+
+
+def query_today_events(db: Session, day: date, family_id: int | None = None):
+    """
+    Запрашивает из базы дни рождения, события и годовщины смерти на дату day.
+    С family_id — только одной семьи (индексы family_id + месяц/день).
+    """
+    members = db.query(FamilyMember)
+    events = db.query(FamilyEvent)
+    if family_id is not None:
+        members = members.filter(FamilyMember.family_id == family_id)
+        events = events.filter(FamilyEvent.family_id == family_id)
+
+    # 🎂 Дни рождения сегодня (для всех, и живых, и ушедших)
+    birthdays = members.filter(
+        extract('month', FamilyMember.birth_date) == day.month,
+        extract('day', FamilyMember.birth_date) == day.day
+    ).all()
+
+    # 🎉 События сегодня: ближайшая дата заранее вычислена по правилу повторения
+    events = events.filter(FamilyEvent.next_occurrence == day).all()
+
+    # 🕯️ Годовщины смерти сегодня
+    death_anniversaries = members.filter(
+        FamilyMember.death_date != None,
+        extract('month', FamilyMember.death_date) == day.month,
+        extract('day', FamilyMember.death_date) == day.day
+    ).all()
+
+    return birthdays, events, death_anniversaries
+
+
 class NotificationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, family_id: int | None = None):
         self.db = db
-        # 2. ИНИЦИАЛИЗАЦИЯ PYMORPHY3
-        self.morph = pymorphy3.MorphAnalyzer()
+        self.family_id = family_id
+        # Имена, склоненные на лету (только для строк без сохраненных форм)
+        self.genitive_cache = {}
 
-    # 3. НОВЫЙ МЕТОД СКЛОНЕНИЯ
-    def get_genitive_name(self, name: str) -> str:
+    @property
+    def morph(self):
+        return get_morph()
+
+    # 3. СКЛОНЕНИЕ
+    def get_genitive_name(self, name: str, gender: str | None = None) -> str:
         """Склоняет полное имя (Имя Фамилия) в Родительный падеж (кого? чего?)."""
-        words = name.split()
-        
-        # Склоняем каждое слово в Родительный падеж
-        declined_words = []
-        for word in words:
-            parsed_word = self.morph.parse(word)[0]
-            # 'gent' - это Родительный падеж (Genitive)
-            declined_word = parsed_word.inflect({'gent'})
-            
-            # Если склонение прошло успешно, используем его, иначе оставляем слово как есть
-            if declined_word:
-                # Капитализируем первое слово, чтобы гарантировать правильный регистр
-                declined_words.append(declined_word.word.capitalize())
-            else:
-                declined_words.append(word)
-                
-        return " ".join(declined_words)
+        if name not in self.genitive_cache:
+            self.genitive_cache[name] = decline_name(name, "genitive", gender)
+        return self.genitive_cache[name]
 
+    def member_genitive(self, member) -> str:
+        """Родительный падеж из колонки name_genitive (вычислена при записи), иначе — на лету."""
+        return getattr(member, "name_genitive", None) or self.get_genitive_name(member.name, member.gender)
+
+    async def prefetch_genitives(self, subjects) -> int:
+        """
+        Склоняет заранее (одной задачей в пуле, вне цикла событий) имена людей
+        из subjects, у которых нет сохраненного родительного падежа. После этого
+        format_* берут имена из кэша и не вызывают pymorphy3. Возвращает число имен.
+        """
+        missing = {}
+        for subject in subjects:
+            if getattr(subject, "name_genitive", None) or not hasattr(subject, "gender"):
+                continue
+            if subject.name not in self.genitive_cache:
+                missing.setdefault(subject.name, subject.gender)
+
+        requests = [(name, "genitive", gender) for name, gender in missing.items()]
+        for (name, _, _), declined in zip(requests, await decline_many(requests)):
+            self.genitive_cache[name] = declined
+        return len(requests)
 
     def get_today_events(self):
-        # ... (метод get_today_events остается без изменений)
         """
         Получаем события на сегодня:
         - Дни рождения (для всех, и живых, и ушедших).
         - Другие повторяющиеся события.
         - Годовщины смерти.
         """
-        today = date.today()
-
-        # 🎂 Дни рождения сегодня (для всех, и живых, и ушедших)
-        birthdays = self.db.query(FamilyMember).filter(
-            extract('month', FamilyMember.birth_date) == today.month,
-            extract('day', FamilyMember.birth_date) == today.day
-        ).all()
-
-        # 🎉 Другие повторяющиеся события сегодня
-        events = self.db.query(FamilyEvent).filter(
-            extract('month', FamilyEvent.event_date) == today.month,
-            extract('day', FamilyEvent.event_date) == today.day
-        ).all()
-
-        # 🕯️ Годовщины смерти сегодня
-        death_anniversaries = self.db.query(FamilyMember).filter(
-            FamilyMember.death_date != None, 
-            extract('month', FamilyMember.death_date) == today.month,
-            extract('day', FamilyMember.death_date) == today.day
-        ).all()
-
-        return birthdays, events, death_anniversaries
+        return query_today_events(self.db, date.today(), self.family_id)
 
     def calculate_age(self, birth_date):
         """Вычисляем возраст (или возраст, который был бы)"""
@@ -98,7 +164,7 @@ class NotificationService:
         age_str = pluralize_years(age)
         
         # 4. ИСПОЛЬЗУЕМ СКЛОНЕНИЕ: Получаем "Кирилла Краснова"
-        declined_name = self.get_genitive_name(member.name)
+        declined_name = self.member_genitive(member)
         
         # Определение местоимений
         if member.gender == 'F':
@@ -129,6 +195,10 @@ class NotificationService:
         
         years_passed = self.calculate_years_passed(event.event_date)
         years_str = pluralize_years(years_passed)
+
+        # Событие происходит впервые (или однократное) — «0 лет» не пишем
+        if years_passed <= 0:
+            return f"🎉 **Сегодня**: **{event.title}**!"
         
         message = (
             f"🎉 **Сегодня {years_str}** со **знаменательной** даты: **{event.title}**! \n"
@@ -155,35 +225,117 @@ class NotificationService:
             f"Светлая память. 🙏"
         )
 
+    def format_milestone_message(self, milestone: ms.Milestone) -> str:
+        """Форматирует сообщение о вехе (10 000 дней, будущий юбилей, юбилей свадьбы)."""
+        if milestone.kind == ms.DAYS_ALIVE:
+            count_str = f"{milestone.value:,}".replace(",", " ")
+            return (
+                f"🌟 Сегодня **{count_str} дней** со дня рождения "
+                f"**{self.member_genitive(milestone.subject)}**!"
+            )
+
+        if milestone.kind == ms.JUBILEE_BIRTHDAY_AHEAD:
+            member = milestone.subject
+            birthday = ms.add_years(member.birth_date, milestone.value)
+            return (
+                f"🎊 Через {pluralize_days(milestone.days_ahead)} — юбилей "
+                f"**{self.member_genitive(member)}**: исполнится **{pluralize_years(milestone.value)}** "
+                f"({birthday.strftime('%d.%m')})!"
+            )
+
+        # Юбилеи свадьбы: пара из связи супругов или событие-годовщина
+        if isinstance(milestone.subject, tuple):
+            first, second = milestone.subject
+            title = f"свадьбы **{first.name}** и **{second.name}**"
+        else:
+            title = f"события **{milestone.subject.title}**"
+        wedding_name = ms.WEDDING_NAMES.get(milestone.value)
+        wedding_info = f" — {wedding_name} свадьба" if wedding_name else ""
+
+        if milestone.kind == ms.WEDDING_JUBILEE:
+            return f"💍 Сегодня **{pluralize_years(milestone.value)}** со дня {title}{wedding_info}!"
+        return (
+            f"💍 Через {pluralize_days(milestone.days_ahead)} — **{pluralize_years(milestone.value)}** "
+            f"со дня {title}{wedding_info}."
+        )
+
+    def format_milestone_brief(self, milestone: ms.Milestone) -> tuple | None:
+        """(день вехи, короткое описание) для списка ближайших вех в /stats. Напоминания о свадьбах — None."""
+        if milestone.kind == ms.DAYS_ALIVE:
+            count_str = f"{milestone.value:,}".replace(",", " ")
+            return milestone.day, f"{count_str} дней со дня рождения {self.member_genitive(milestone.subject)}"
+        if milestone.kind == ms.JUBILEE_BIRTHDAY_AHEAD:
+            # Напоминание приходит заранее; сам юбилей — через days_ahead
+            day = milestone.day + timedelta(days=milestone.days_ahead)
+            return day, f"юбилей {self.member_genitive(milestone.subject)}: {pluralize_years(milestone.value)}"
+        if milestone.kind == ms.WEDDING_JUBILEE:
+            if isinstance(milestone.subject, tuple):
+                first, second = milestone.subject
+                title = f"свадьбы {first.name} и {second.name}"
+            else:
+                title = f"события {milestone.subject.title}"
+            return milestone.day, f"{pluralize_years(milestone.value)} со дня {title}"
+        return None
+
+    def format_date_lines(self, day: date, birthdays, events, death_anniversaries) -> list:
+        """Строки о датах дня day (общие для напоминаний заранее и дайджестов)."""
+        lines = []
+        for member in birthdays:
+            if member.death_date:
+                lines.append(f"🕯️ день рождения **{member.name}** (было бы {pluralize_years(day.year - member.birth_date.year)})")
+            else:
+                lines.append(f"🎂 день рождения **{self.member_genitive(member)}** — исполнится "
+                             f"**{pluralize_years(day.year - member.birth_date.year)}**")
+        for event in events:
+            years = day.year - event.event_date.year
+            years_info = f" — **{pluralize_years(years)}**" if years > 0 else ""
+            lines.append(f"🎉 **{event.title}**{years_info}")
+        for member in death_anniversaries:
+            lines.append(f"🕯️ {pluralize_years(day.year - member.death_date.year)} со дня ухода из жизни **{member.name}**")
+        return lines
+
+    def format_advance_message(self, day: date, birthdays, events, death_anniversaries) -> str | None:
+        """Одно сообщение-напоминание о датах дня day (заранее). None — напоминать не о чем."""
+        lines = self.format_date_lines(day, birthdays, events, death_anniversaries)
+        if not lines:
+            return None
+
+        days_ahead = (day - date.today()).days
+        header = "⏰ **Завтра**" if days_ahead == 1 else f"⏰ **Через {pluralize_days(days_ahead)}**"
+        return f"{header} ({day.strftime('%d.%m')}):\n" + "\n".join(f"• {line}" for line in lines)
+
+    def format_digest_message(self, title: str, days: list, milestones: list = (), limit: int = 4000) -> list:
+        """
+        Дайджест за период: days — [(день, дни рождения, события, дни памяти)],
+        milestones — [(день, описание)] из format_milestone_brief. Возвращает
+        список сообщений (обычно одно; длинный дайджест делится по дням).
+        """
+        extra = {}
+        for day, text in milestones:
+            extra.setdefault(day, []).append(f"🌟 {text}")
+
+        dates = {day: (birthdays, events, death_anniversaries) for day, birthdays, events, death_anniversaries in days}
+        sections = []
+        for day in sorted(set(dates) | set(extra)):
+            lines = self.format_date_lines(day, *dates.get(day, ((), (), ()))) + extra.get(day, [])
+            if lines:
+                sections.append(f"**{day.strftime('%d.%m')}, {WEEKDAY_NAMES[day.weekday()]}**\n"
+                                + "\n".join(f"• {line}" for line in lines))
+        if not sections:
+            return []
+
+        messages = [f"🗓️ **{title}**"]
+        for section in sections:
+            if len(messages[-1]) + len(section) + 2 > limit:
+                messages.append(section)
+            else:
+                messages[-1] += "\n\n" + section
+        return messages
+
     # 🚀 ИСПРАВЛЕННЫЙ МЕТОД ДЛЯ ОБРАБОТКИ СПИСКОВ И СТРОК
     def get_event_photo_id(self, event: FamilyEvent) -> str | None:
         """
         Извлекает первый ID фотографии из поля photo_ids события,
         обрабатывая случай, когда photo_ids — список или строка.
         """
-        if not event.photo_ids:
-            return None
-            
-        photo_ids = event.photo_ids
-        
-        # 1. Если photo_ids уже является списком
-        if isinstance(photo_ids, list) and photo_ids:
-            if isinstance(photo_ids[0], str):
-                return photo_ids[0]
-
-        # 2. Если photo_ids является строкой, пытаемся распарсить или вернуть как есть
-        if isinstance(photo_ids, str):
-            try:
-                # Убираем внешние кавычки, если есть, и заменяем одинарные на двойные
-                cleaned_ids = photo_ids.strip().replace("'", "\"")
-                photo_list = json.loads(cleaned_ids)
-                
-                # Если успешно распарсили список, возвращаем первый элемент (строку)
-                if photo_list and isinstance(photo_list, list) and isinstance(photo_list[0], str):
-                    return photo_list[0]
-                
-            except (json.JSONDecodeError, IndexError, TypeError):
-                # Если парсинг не удался, возвращаем исходную строку.
-                return photo_ids.strip()
-                
-        return None
+        return get_first_photo_id(event.photo_ids)
@@ -0,0 +1,118 @@
+"""
+Расписание повторения событий.
+
+Правило хранится в FamilyEvent.recurrence_rule в виде подмножества RRULE
+(RFC 5545), которое понимают и календари:
+    (пусто) + recurring=True   — ежегодно в дату события;
+    (пусто) + recurring=False  — однократно;
+    FREQ=YEARLY;INTERVAL=5     — раз в 5 лет от даты события;
+    FREQ=YEARLY;BYMONTH=5;BYDAY=-1SU — последнее воскресенье мая (2SU — второе).
+
+Ближайшая дата заранее сохраняется в FamilyEvent.next_occurrence (с индексом),
+поэтому поиск «на сегодня» и «на ближайшие дни» — один индексный запрос,
+а правила вычисляются только при записи и при сдвиге прошедших дат.
+"""
+import calendar
+from datetime import date
+
+ONCE = "ONCE"
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+
+def parse_rule(rule: str) -> dict:
+    """Разбирает строку RRULE в словарь. Бросает ValueError на неподдерживаемых правилах."""
+    parts = {}
+    for part in rule.strip().upper().split(";"):
+        if not part:
+            continue
+        key, _, value = part.partition("=")
+        parts[key] = value
+
+    if parts.get("FREQ") != "YEARLY":
+        raise ValueError("поддерживается только FREQ=YEARLY")
+
+    interval = int(parts.get("INTERVAL", "1"))
+    if interval < 1:
+        raise ValueError("INTERVAL должен быть положительным")
+
+    parsed = {"interval": interval, "month": None, "weekday": None, "nth": None}
+    if "BYDAY" in parts:
+        byday = parts["BYDAY"]
+        weekday = byday[-2:]
+        if weekday not in WEEKDAYS or "BYMONTH" not in parts:
+            raise ValueError("BYDAY требует BYMONTH и день недели (MO..SU)")
+        nth = int(byday[:-2] or "1")
+        if nth == 0 or not -5 <= nth <= 5:
+            raise ValueError("номер недели в BYDAY должен быть от -5 до 5")
+        parsed.update(month=int(parts["BYMONTH"]), weekday=WEEKDAYS[weekday], nth=nth)
+        if not 1 <= parsed["month"] <= 12:
+            raise ValueError("BYMONTH должен быть от 1 до 12")
+    return parsed
+
+
+def normalize_rule(rule: str | None) -> str | None:
+    """Проверяет правило и приводит его к каноническому виду (пусто и YEARLY → None)."""
+    if rule is None or rule.strip().upper() in ("", "YEARLY"):
+        return None
+    if rule.strip().upper() == ONCE:
+        return ONCE
+    parse_rule(rule)
+    return rule.strip().upper()
+
+
+def nth_weekday(year: int, month: int, weekday: int, nth: int) -> date | None:
+    """N-й (или с конца при nth < 0) день недели месяца; None, если такого нет."""
+    days_in_month = calendar.monthrange(year, month)[1]
+    days = [day for day in range(1, days_in_month + 1) if date(year, month, day).weekday() == weekday]
+    index = nth - 1 if nth > 0 else nth
+    if -len(days) <= index < len(days):
+        return date(year, month, days[index])
+    return None
+
+
+def _anniversary(event_date: date, year: int) -> date:
+    try:
+        return event_date.replace(year=year)
+    except ValueError:  # 29 февраля в невисокосный год
+        return event_date.replace(year=year, day=28)
+
+
+def next_occurrence(event_date: date, rule: str | None, recurring: bool | None, after: date) -> date | None:
+    """
+    Первая дата события не раньше after.
+    None — событие однократное и уже прошло.
+    """
+    if rule == ONCE or (rule is None and recurring is False):
+        return event_date if event_date >= after else None
+
+    parsed = parse_rule(rule) if rule else {"interval": 1, "month": None, "weekday": None, "nth": None}
+    interval = parsed["interval"]
+
+    # Первый год, кратный интервалу от года события, не раньше after.year - 1
+    year = max(event_date.year, after.year - 1)
+    year += (event_date.year - year) % interval
+
+    for _ in range(8):  # 5-го дня недели в месяце может не быть несколько лет подряд
+        if parsed["weekday"] is None:
+            candidate = _anniversary(event_date, year)
+        else:
+            candidate = nth_weekday(year, parsed["month"], parsed["weekday"], parsed["nth"])
+        if candidate is not None and candidate >= after and candidate >= event_date:
+            return candidate
+        year += interval
+    return None
+
+
+def describe_rule(rule: str | None, recurring: bool | None) -> str:
+    """Человекочитаемое описание правила."""
+    if rule == ONCE or (rule is None and recurring is False):
+        return "однократно"
+    if not rule:
+        return "ежегодно"
+    parsed = parse_rule(rule)
+    text = "ежегодно" if parsed["interval"] == 1 else f"раз в {parsed['interval']} г."
+    if parsed["weekday"] is not None:
+        weekday_names = ["пн", "вт", "ср", "чт", "пт", "сб", "вс"]
+        position = "последний" if parsed["nth"] == -1 else f"{parsed['nth']}-й"
+        text += f", {position} {weekday_names[parsed['weekday']]} месяца {parsed['month']}"
+    return text
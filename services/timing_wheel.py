@@ -0,0 +1,74 @@
+"""
+Иерархическое колесо таймеров.
+
+Вместо отдельной задачи планировщика на каждое напоминание все таймеры
+лежат в нескольких «колесах» (по умолчанию: тики внутри часа, часы, дни).
+Добавление — O(1), продвижение на тик — O(число таймеров в слоте); таймер
+опускается на колесо ниже, когда до него остается меньше одного оборота
+этого колеса. Память — один кортеж на таймер, независимо от срока.
+"""
+import math
+import time
+
+
+class TimingWheel:
+    def __init__(self, tick_seconds: float = 30, sizes: tuple = None, now: float = None):
+        self.tick_seconds = tick_seconds
+        # Колесо 0: тики в пределах часа; колесо 1: часы в сутках; колесо 2: дни (больше года)
+        self.sizes = sizes or (max(1, int(3600 // tick_seconds)), 24, 400)
+        self.spans = [1]  # Сколько тиков в одном слоте каждого колеса
+        for size in self.sizes[:-1]:
+            self.spans.append(self.spans[-1] * size)
+        self.wheels = [[[] for _ in range(size)] for size in self.sizes]
+        self.overflow = []  # Таймеры дальше последнего колеса
+        self.current = int((time.time() if now is None else now) // tick_seconds)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, fire_at: float, item):
+        """Добавляет таймер на момент fire_at (unix-время). Прошедшие сработают на следующем тике."""
+        deadline = max(math.ceil(fire_at / self.tick_seconds), self.current + 1)
+        self._place(deadline, item)
+        self.count += 1
+
+    def _place(self, deadline: int, item):
+        for level, (size, span) in enumerate(zip(self.sizes, self.spans)):
+            if deadline // span - self.current // span < size:
+                self.wheels[level][(deadline // span) % size].append((deadline, item))
+                return
+        self.overflow.append((deadline, item))
+
+    def advance(self, now: float = None) -> list:
+        """Продвигает колесо до момента now и возвращает сработавшие таймеры (по порядку сроков)."""
+        target = int((time.time() if now is None else now) // self.tick_seconds)
+        due = []
+        while self.current < target:
+            self.current += 1
+            self._cascade()
+            slot = self.wheels[0][self.current % self.sizes[0]]
+            if slot:
+                self.wheels[0][self.current % self.sizes[0]] = []
+                due.extend(item for _, item in slot)
+        self.count -= len(due)
+        return due
+
+    def _cascade(self):
+        """На границе слота старшего колеса опускает его таймеры на колеса ниже."""
+        for level in range(len(self.sizes) - 1, 0, -1):
+            span = self.spans[level]
+            if self.current % span:
+                continue
+            if level == len(self.sizes) - 1 and self.overflow:
+                overflow, self.overflow = self.overflow, []
+                for deadline, item in overflow:
+                    self._place(deadline, item)
+            index = (self.current // span) % self.sizes[level]
+            slot, self.wheels[level][index] = self.wheels[level][index], []
+            for deadline, item in slot:
+                self._place(deadline, item)
+
+    def seconds_until_next_tick(self, now: float = None) -> float:
+        now = time.time() if now is None else now
+        return (self.current + 1) * self.tick_seconds - now
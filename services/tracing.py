@@ -0,0 +1,183 @@
+"""
+Трассировка обработки обновлений (спаны).
+
+API совместим с OpenTelemetry: tracer.start_as_current_span(name, attributes=...)
+и tracer.start_span(...). Если установлен пакет opentelemetry-sdk, используется
+он (ConsoleSpanExporter в консоль или в файл). Иначе работает встроенный
+трассировщик, который пишет спаны в формате JSON Lines с теми же полями
+(trace_id, span_id, parent_id, name, start/end, attributes).
+
+Включается переменной TRACING_EXPORTER=console|file (файл — TRACING_FILE).
+"""
+import json
+import secrets
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import Config
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:  # opentelemetry-sdk не обязателен
+    TracerProvider = None
+
+
+# ----------------------------------------------------
+# --- ВСТРОЕННЫЙ ТРАССИРОВЩИК ---
+# ----------------------------------------------------
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class SimpleSpan:
+    """Спан встроенного трассировщика."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time", "end_time", "attributes", "_exporter")
+
+    def __init__(self, name, parent, attributes, exporter):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.attributes = dict(attributes or {})
+        self._exporter = exporter
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exception):
+        self.attributes["exception.type"] = type(exception).__name__
+        self.attributes["exception.message"] = str(exception)
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            self._exporter(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round((self.end_time - self.start_time) / 1e6, 3),
+            "attributes": self.attributes,
+        }
+
+
+class NoopSpan:
+    """Пустой спан: трассировка выключена."""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class SimpleTracer:
+    """Встроенный трассировщик с API, как у opentelemetry.trace.Tracer."""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter  # None — трассировка выключена
+
+    def start_span(self, name, attributes=None):
+        if self.exporter is None:
+            return NOOP_SPAN
+        return SimpleSpan(name, _current_span.get(), attributes, self.exporter)
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = self.start_span(name, attributes)
+        if span is NOOP_SPAN:
+            yield span
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+def json_lines_exporter(stream):
+    """Экспортер: по одной JSON-строке на каждый завершенный спан."""
+    def export(span: SimpleSpan):
+        stream.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        stream.flush()
+    return export
+
+
+# ----------------------------------------------------
+# --- НАСТРОЙКА ---
+# ----------------------------------------------------
+
+def _open_output():
+    if Config.TRACING_EXPORTER == "file":
+        return open(Config.TRACING_FILE, "a", encoding="utf-8")
+    return sys.stdout
+
+
+TRACING_ENABLED = Config.TRACING_EXPORTER in ("console", "file")
+
+
+def _build_tracer():
+    if not TRACING_ENABLED:
+        return SimpleTracer()
+
+    output = _open_output()
+    if TracerProvider is not None:
+        provider = TracerProvider(resource=Resource.create({"service.name": "family-bot"}))
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(out=output)))
+        print(f"✅ Трассировка OpenTelemetry включена ({Config.TRACING_EXPORTER}).")
+        return provider.get_tracer("family_bot")
+
+    print(f"✅ Встроенная трассировка включена ({Config.TRACING_EXPORTER}).")
+    return SimpleTracer(json_lines_exporter(output))
+
+
+tracer = _build_tracer()
+
+
+def span(name, **attributes):
+    """Короткая запись: with span("pymorphy.parse", words=2): ..."""
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+def instrument_engine(engine):
+    """Добавляет спан на каждый SQL-запрос engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        db_span = tracer.start_span("db.query", attributes={"db.statement": " ".join(statement.split())[:500]})
+        conn.info.setdefault("trace_spans", []).append(db_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("trace_spans"):
+            db_span = conn.info["trace_spans"].pop()
+            db_span.record_exception(context.original_exception)
+            db_span.end()
@@ -0,0 +1,115 @@
+"""
+Снимок горячего состояния для быстрого перезапуска.
+
+При остановке бота и по таймеру (WARM_SNAPSHOT_INTERVAL_MINUTES) в файл
+WARM_SNAPSHOT_PATH пишется компактный двоичный снимок: члены семьи, события,
+связи и события на сегодня каждой загруженной семьи и кэш склонений имен. При запуске файл читается
+через mmap и сразу заполняет кэш репозитория и склонений — без запросов к
+базе и без загрузки словарей pymorphy3 (если все имена уже склонены).
+
+Снимок годится, только если счетчик изменений в базе (data_versions) не
+изменился с момента записи; иначе он отбрасывается и все строится как обычно.
+
+Формат: заголовок (магическая строка, версия данных, время записи, CRC32,
+длина) + pickle. Файл пишет только сам бот, во временный файл с атомарной
+заменой, поэтому оборванная запись не оставит битый снимок.
+"""
+import mmap
+import os
+import pickle
+import struct
+import time
+import zlib
+
+MAGIC = b"FBSNAP1\0"
+HEADER = struct.Struct("<8sqdIQ")  # magic, data_version, created_at, crc32, length
+
+
+def save_snapshot(path: str, data_version: int, state: dict) -> int:
+    """Записывает снимок атомарно. Возвращает размер в байтах."""
+    payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    header = HEADER.pack(MAGIC, data_version, time.time(), zlib.crc32(payload), len(payload))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return HEADER.size + len(payload)
+
+
+def load_snapshot(path: str, data_version: int) -> dict | None:
+    """
+    Читает снимок через mmap. Возвращает состояние или None, если файла нет,
+    он поврежден или записан для другой версии данных.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        return None
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        magic, snapshot_version, created_at, checksum, length = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            print(f"⚠️ Снимок {path}: неизвестный формат, пропускаем.")
+            return None
+        if snapshot_version != data_version:
+            print(f"ℹ️ Снимок {path} устарел (версия {snapshot_version}, в базе {data_version}), пропускаем.")
+            return None
+
+        payload = memoryview(mapped)[HEADER.size:HEADER.size + length]
+        try:
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                print(f"⚠️ Снимок {path} поврежден, пропускаем.")
+                return None
+            state = pickle.loads(payload)
+        finally:
+            payload.release()
+
+    age_minutes = (time.time() - created_at) / 60
+    print(f"✅ Снимок {path} загружен (версия данных {data_version}, возраст {age_minutes:.0f} мин.).")
+    return state
+
+
+class WarmSnapshot:
+    """Связывает снимок с репозиториями семей (services/families.py) и кэшем склонений бота."""
+
+    def __init__(self, path: str, families, notification_service):
+        self.path = path
+        self.families = families
+        self.notification_service = notification_service
+
+    def data_version(self) -> int:
+        # Счетчик изменений общий для всех семей
+        return self.families.current().repository.data_version()
+
+    def save(self) -> int:
+        # Версию читаем до выгрузки: если запись случится посередине, снимок просто не подойдет при запуске
+        data_version = self.data_version()
+        state = {
+            "families": {
+                family_id: context.repository.export_state()
+                for family_id, context in list(self.families.contexts.items())
+            },
+            "genitive": dict(self.notification_service.genitive_cache),
+        }
+        return save_snapshot(self.path, data_version, state)
+
+    def restore(self) -> bool:
+        try:
+            state = load_snapshot(self.path, self.data_version())
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать снимок {self.path}: {e}")
+            return False
+        if state is None:
+            return False
+
+        if "families" not in state:
+            return False  # Снимок записан до разделения на семьи
+
+        for family_id, repository_state in state["families"].items():
+            context = self.families.get(family_id)
+            if context is not None:
+                context.repository.import_state(repository_state)
+        self.notification_service.genitive_cache.update(state["genitive"])
+        return True